@@ -0,0 +1,260 @@
+#
+#
+#
+
+"""
+Benchmarks every searcher returned by `loadFsSearchers` through the
+`IFsSearchable.search` API and writes the results as JSON, to keep
+track of regressions over time. Run it from the application root:
+
+    python -m benchmarks.run_bench --shape wide --scale 100000
+
+Every measurement runs in a fresh child process so that peak RSS and
+warm caches of one searcher do not leak into the others.
+"""
+
+import argparse
+import json
+import os
+from pathlib import Path
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+from time import perf_counter, time
+
+from benchmarks.tree_gen import NEEDLE, SHAPES, generateTree
+
+
+_APP_DIR = Path(__file__).resolve().parent.parent
+"""The root directory of the application."""
+
+_METRICS = (
+    "time_to_first_match", "wall_time", "entries_per_sec",
+    "peak_rss_kb", "stop_latency",)
+"""The metrics summarized by their median over the repeats."""
+
+
+class _ProbeQueue:
+    """
+    Stands in for the results queue of a searcher, recording when the
+    first match arrives and counting matches and locations.
+    """
+
+    def __init__(self) -> None:
+        from megacodist.fs import FsSearchMatch
+        self._matchType = FsSearchMatch
+        self._lock = threading.Lock()
+        self.start = perf_counter()
+        self.firstMatch: float | None = None
+        """The time of the first match since `start`, in seconds."""
+        self.nMatches = 0
+        self.nLocations = 0
+
+    def put(self, item, block: bool = True, timeout=None) -> None:
+        with self._lock:
+            if isinstance(item, self._matchType):
+                if self.firstMatch is None:
+                    self.firstMatch = perf_counter() - self.start
+                self.nMatches += 1
+            else:
+                self.nLocations += 1
+
+    put_nowait = put
+
+
+def _loadSearchers():
+    from utils.fs_search import loadFsSearchers
+    searchers = loadFsSearchers(Path("megacodist/fs"))
+    searchers.update(loadFsSearchers(Path("searchers")))
+    return searchers
+
+
+def _runWorker(args: argparse.Namespace) -> dict:
+    """Measures one searcher once, in this process."""
+    # Declaring variables ---------------------------------
+    import resource
+    from megacodist.fs import FsSearchOptions
+    searcherCls = _loadSearchers()[args.searcher[0]]
+    options = FsSearchOptions.FILES_INCLUDED | FsSearchOptions.DIRS_INCLUDED
+    # Measuring a full search -----------------------------
+    q = _ProbeQueue()
+    searcherCls().search(Path(args.root), args.search, q, options)
+    wallTime = perf_counter() - q.start
+    peakRss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peakRss //= 1024
+    # Measuring how long a stop request takes -------------
+    stopQ = _ProbeQueue()
+    searcher = searcherCls()
+    searchThread = threading.Thread(
+        target=searcher.search,
+        args=(Path(args.root), args.search, stopQ, options),
+        daemon=True,)
+    searchThread.start()
+    searchThread.join(args.stop_after)
+    if searchThread.is_alive():
+        stopStart = perf_counter()
+        searcher.stopSearch()
+        searchThread.join()
+        stopLatency = perf_counter() - stopStart
+    else:
+        stopLatency = None
+    return {
+        "time_to_first_match": q.firstMatch,
+        "wall_time": wallTime,
+        "entries_per_sec": (
+            args.entries / wallTime if args.entries and wallTime else None),
+        "peak_rss_kb": peakRss,
+        "stop_latency": stopLatency,
+        "matches": q.nMatches,
+        "locations": q.nLocations,}
+
+
+def _runInChild(args: argparse.Namespace, searcher: str) -> dict:
+    """Runs one measurement of the searcher in a child process."""
+    cmd = [
+        sys.executable, "-m", "benchmarks.run_bench", "--worker",
+        "--searcher", searcher,
+        "--root", str(args.root),
+        "--search", args.search,
+        "--stop-after", str(args.stop_after),
+        "--entries", str(args.entries),]
+    try:
+        proc = subprocess.run(
+            cmd,
+            cwd=_APP_DIR,
+            capture_output=True,
+            text=True,
+            timeout=args.timeout,)
+    except subprocess.TimeoutExpired:
+        return {"error": f"timed out after {args.timeout} s"}
+    if proc.returncode != 0:
+        return {"error": proc.stderr.strip().splitlines()[-1:]}
+    return json.loads(proc.stdout)
+
+
+def _median(runs: list[dict], metric: str) -> float | None:
+    values = [run[metric] for run in runs if run.get(metric) is not None]
+    return statistics.median(values) if values else None
+
+
+def _countEntries(root: Path) -> int:
+    nEntries = 0
+    for _, dirNames, fileNames in os.walk(root):
+        nEntries += len(dirNames) + len(fileNames)
+    return nEntries
+
+
+def _parseArgs(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Benchmarks the file system searchers.")
+    parser.add_argument(
+        "--shape",
+        choices=SHAPES,
+        default="small-files",
+        help="the shape of the synthetic tree (default: small-files)")
+    parser.add_argument(
+        "--scale",
+        type=int,
+        default=100_000,
+        help="the approximate number of entries of the synthetic tree")
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="the seed of the synthetic tree")
+    parser.add_argument(
+        "--root",
+        type=Path,
+        help="benchmark an existing tree instead of a synthetic one")
+    parser.add_argument(
+        "--search",
+        default=NEEDLE,
+        help=f"the text to search for (default: {NEEDLE})")
+    parser.add_argument(
+        "--searcher",
+        action="append",
+        help="only benchmark this searcher; may be repeated")
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="the number of measurements per searcher (default: 3)")
+    parser.add_argument(
+        "--stop-after",
+        type=float,
+        default=0.05,
+        help="seconds before stopping the search whose stop latency is "
+            "measured (default: 0.05)")
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=600.0,
+        help="seconds after which a measurement is abandoned")
+    parser.add_argument(
+        "--out",
+        type=Path,
+        help="write the JSON report to this file instead of stdout")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--entries", type=int, default=0, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = _parseArgs(argv)
+    if args.worker:
+        json.dump(_runWorker(args), sys.stdout)
+        return 0
+    # Preparing the tree ----------------------------------
+    isSynthetic = args.root is None
+    with tempfile.TemporaryDirectory(prefix="fs-bench-") as tmpDir:
+        if isSynthetic:
+            args.root = Path(tmpDir) / "tree"
+            treeStats = generateTree(
+                args.root,
+                args.shape,
+                args.scale,
+                args.seed).toDict()
+            args.entries = treeStats["entries"]
+        else:
+            args.entries = _countEntries(args.root)
+            treeStats = {"entries": args.entries}
+        # Running the searchers -----------------------------
+        names = args.searcher or list(_loadSearchers())
+        results = []
+        for name in names:
+            runs = [_runInChild(args, name) for _ in range(args.repeat)]
+            results.append({
+                "searcher": name,
+                "median": {
+                    metric: _median(runs, metric)
+                    for metric in _METRICS},
+                "runs": runs,})
+            print(f"{name}: {results[-1]['median']}", file=sys.stderr)
+    # Writing the report ----------------------------------
+    report = {
+        "timestamp": time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "tree": {
+            "shape": args.shape if isSynthetic else None,
+            "scale": args.scale,
+            "seed": args.seed,
+            "root": str(args.root),
+            **treeStats,},
+        "search": args.search,
+        "results": results,}
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fileObj:
+            json.dump(report, fileObj, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+#
+#
+#
+
+"""
+Generates deterministic synthetic directory trees for benchmarking the
+searchers. The same shape, scale and seed always produce the same tree.
+"""
+
+from collections import deque
+import os
+from pathlib import Path
+from random import Random
+
+
+SHAPES = ("deep", "wide", "small-files", "symlinks")
+"""The shapes of tree the generator can produce."""
+
+NEEDLE = "needle"
+"""The token embedded in a fraction of the names, to search for."""
+
+_SYLLABLES = (
+    "ab", "ar", "ba", "co", "de", "el", "fa", "go", "in", "ka", "lo",
+    "ma", "ne", "or", "pu", "ra", "si", "ta", "ul", "ve", "xo", "zu",)
+
+_EXTENSIONS = (".txt", ".log", ".py", ".json", ".dat", ".md", "")
+
+
+class TreeStats:
+    """The number of entries of each kind in a generated tree."""
+
+    def __init__(self) -> None:
+        self.dirs = 0
+        self.files = 0
+        self.links = 0
+        self.needles = 0
+        """The number of entries whose name contains `NEEDLE`."""
+
+    @property
+    def entries(self) -> int:
+        return self.dirs + self.files + self.links
+
+    def toDict(self) -> dict[str, int]:
+        return {
+            "dirs": self.dirs,
+            "files": self.files,
+            "links": self.links,
+            "entries": self.entries,
+            "needles": self.needles,}
+
+
+class _Namer:
+    """Makes unique, deterministic entry names."""
+
+    def __init__(
+            self,
+            rnd: Random,
+            stats: TreeStats,
+            needle_ratio: float,
+            ) -> None:
+        self._rnd = rnd
+        self._stats = stats
+        self._needleRatio = needle_ratio
+        self._count = 0
+
+    def __call__(self, is_dir: bool) -> str:
+        self._count += 1
+        stem = "".join(
+            self._rnd.choice(_SYLLABLES)
+            for _ in range(self._rnd.randint(2, 5)))
+        if self._rnd.random() < self._needleRatio:
+            stem = f"{stem}_{NEEDLE}"
+            self._stats.needles += 1
+        ext = "" if is_dir else self._rnd.choice(_EXTENSIONS)
+        return f"{stem}{self._count}{ext}"
+
+
+def _makeFile(path: Path, rnd: Random, max_size: int) -> None:
+    with open(path, "wb") as fileObj:
+        if max_size:
+            fileObj.write(rnd.randbytes(rnd.randint(0, max_size)))
+
+
+def generateTree(
+        root: Path,
+        shape: str,
+        scale: int = 10_000,
+        seed: int = 0,
+        needle_ratio: float = 0.001,
+        ) -> TreeStats:
+    """
+    Generates a tree of the shape under the root, which must not exist.
+
+    Args:
+        root:
+            The directory to create the tree in.
+        shape:
+            One of `SHAPES`: `deep` makes long chains of directories,
+            `wide` a few directories with very many files each,
+            `small-files` a balanced tree of small non-empty files and
+            `symlinks` a balanced tree where every directory also holds
+            symbolic links to other files and directories, ancestors
+            included, so following them leads into cycles.
+        scale:
+            The approximate number of entries to create.
+        seed:
+            The seed of the pseudo-random generator.
+        needle_ratio:
+            The fraction of names that embed `NEEDLE`.
+
+    Returns:
+        The number of entries of each kind that were created.
+    """
+    # Declaring variables ---------------------------------
+    rnd = Random(seed)
+    stats = TreeStats()
+    name = _Namer(rnd, stats, needle_ratio)
+    # Generating the tree ---------------------------------
+    root.mkdir(parents=True)
+    match shape:
+        case "deep":
+            depth = 200
+            for _ in range(max(1, scale // (2 * depth))):
+                pthDir = root
+                for _ in range(depth):
+                    pthDir = pthDir / name(True)
+                    pthDir.mkdir()
+                    _makeFile(pthDir / name(False), rnd, 0)
+                    stats.dirs += 1
+                    stats.files += 1
+        case "wide":
+            for _ in range(4):
+                pthDir = root / name(True)
+                pthDir.mkdir()
+                stats.dirs += 1
+                for _ in range(scale // 4):
+                    _makeFile(pthDir / name(False), rnd, 0)
+                    stats.files += 1
+        case "small-files" | "symlinks":
+            fanout, filesPerDir = 8, 16
+            frontier = deque([root])
+            allDirs: list[Path] = []
+            allFiles: list[Path] = []
+            while frontier and stats.entries < scale:
+                pthParent = frontier.popleft()
+                for _ in range(filesPerDir):
+                    pthFile = pthParent / name(False)
+                    _makeFile(
+                        pthFile,
+                        rnd,
+                        512 if shape == "small-files" else 0)
+                    allFiles.append(pthFile)
+                    stats.files += 1
+                for _ in range(fanout):
+                    pthDir = pthParent / name(True)
+                    pthDir.mkdir()
+                    frontier.append(pthDir)
+                    allDirs.append(pthDir)
+                    stats.dirs += 1
+                if shape == "symlinks" and allDirs:
+                    for _ in range(4):
+                        target = rnd.choice(
+                            allDirs if rnd.random() < 0.5 else allFiles)
+                        os.symlink(target, pthParent / name(False))
+                        stats.links += 1
+        case _:
+            raise ValueError(f"unknown tree shape '{shape}'")
+    return stats
@@ -21,6 +21,7 @@ def main() -> None:
     # Loading FS searchers...
     from utils.fs_search import loadFsSearchers
     searchers = loadFsSearchers(Path('megacodist/fs'))
+    searchers.update(loadFsSearchers(Path('searchers')))
     print(searchers)
     # Loading application settings...
     #spinner.start(_('LOADING_SETTINGS'))
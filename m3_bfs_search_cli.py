@@ -0,0 +1,407 @@
+#
+#
+#
+
+"""
+The headless command-line front end of the application. It never
+imports tkinter, and streams the matches to stdout as they are found.
+"""
+
+import argparse
+import json
+import logging
+import os
+from pathlib import Path
+import re
+import sys
+
+
+def _parseArgs(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Searches a folder for files and folders by name.")
+    parser.add_argument(
+        "search",
+        nargs="?",
+        help="the text to search for")
+    parser.add_argument(
+        "folder",
+        nargs="?",
+        default=".",
+        help="the folder to search in (default: current folder)")
+    parser.add_argument(
+        "-s", "--searcher",
+        help="the name of the searcher algorithm to use")
+    parser.add_argument(
+        "--list-searchers",
+        action="store_true",
+        help="list the available searchers and exit")
+    parser.add_argument(
+        "-c", "--match-case",
+        action="store_true",
+        help="match case")
+    parser.add_argument(
+        "-w", "--match-whole",
+        action="store_true",
+        help="match whole word")
+    parser.add_argument(
+        "-m", "--mode",
+        choices=("substring", "glob", "regex", "fuzzy", "any-of"),
+        default="substring",
+        help="how the search text is matched (default: substring); "
+            "any-of matches any of the ';'-separated patterns, ';;' "
+            "standing for a ';' within a pattern")
+    parser.add_argument(
+        "-f", "--patterns-file",
+        type=Path,
+        help="match any of the patterns in this file, one per line, "
+            "instead of the search text")
+    parser.add_argument(
+        "-t", "--type",
+        choices=("f", "d"),
+        help="only report files (f) or folders (d)")
+    parser.add_argument(
+        "-E", "--exclude",
+        action="append",
+        default=[],
+        metavar="GLOB",
+        help="leave out entries matching this glob; may be repeated")
+    parser.add_argument(
+        "-u", "--unrestricted",
+        action="store_true",
+        help="do not leave out the folders excluded by default, such "
+            "as .git and node_modules")
+    parser.add_argument(
+        "--gitignore",
+        action="store_true",
+        help="leave out what .gitignore files of the folder ignore")
+    parser.add_argument(
+        "-x", "--one-file-system",
+        action="store_true",
+        help="do not descend into folders on other file systems")
+    parser.add_argument(
+        "-L", "--follow-links",
+        action="store_true",
+        help="descend into symbolic links to folders, visiting every "
+            "folder once")
+    parser.add_argument(
+        "-e", "--ext",
+        action="append",
+        default=[],
+        metavar="EXT",
+        help="only report files with this extension; may be repeated")
+    parser.add_argument(
+        "--min-size",
+        default="",
+        metavar="SIZE",
+        help="only report files of at least this size, such as 100M")
+    parser.add_argument(
+        "--max-size",
+        default="",
+        metavar="SIZE",
+        help="only report files of at most this size")
+    parser.add_argument(
+        "--newer",
+        default="",
+        metavar="AGE",
+        help="only report entries modified within this age, such as "
+            "7d, 12h or 30min")
+    parser.add_argument(
+        "--older",
+        default="",
+        metavar="AGE",
+        help="only report entries modified longer than this age ago")
+    parser.add_argument(
+        "-n", "--limit",
+        type=int,
+        default=0,
+        help="stop after this many matches (default: no limit)")
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=0.0,
+        help="stop after this many seconds (default: no timeout)")
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=0,
+        metavar="K",
+        help="rank the matches by how well they match, how deep and how "
+            "recent they are, and report the best K once the search ends")
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="checkpoint the progress, and resume an interrupted run "
+            "of the same search, reporting its matches first")
+    parser.add_argument(
+        "--stats",
+        type=Path,
+        metavar="FILE",
+        help="write the counters of the search to this file as JSON")
+    parser.add_argument(
+        "--profile",
+        choices=("cprofile", "sampling"),
+        help="profile the search; cProfile statistics go to the cache "
+            "folder and samples into the --stats file")
+    fmtGroup = parser.add_mutually_exclusive_group()
+    fmtGroup.add_argument(
+        "--ndjson",
+        action="store_true",
+        help="write one JSON object per match")
+    fmtGroup.add_argument(
+        "-0", "--null",
+        action="store_true",
+        help="separate paths by NUL instead of newline")
+    fmtGroup.add_argument(
+        "-o", "--output",
+        type=Path,
+        metavar="FILE",
+        help="write the matches to this CSV, NDJSON or SQLite file, "
+            "chosen by its suffix, instead of stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    """
+    Runs the command line and returns the exit status: `0` on success,
+    `1` if the output file cannot be written, `2` on bad arguments,
+    `124` if the timeout expired and `130` if interrupted.
+    """
+    # Declaring variables ---------------------------------
+    # Importing only what the arguments call for, as the start-up time
+    # of the command line is mostly that of its imports...
+    from utils.fs_search import loadFsSearchers
+    # Loading FS searchers --------------------------------
+    args = _parseArgs(argv)
+    searchers = loadFsSearchers(Path("megacodist/fs"))
+    searchers.update(loadFsSearchers(Path("searchers")))
+    if args.list_searchers:
+        for name in searchers:
+            print(name)
+        return 0
+    from queue import Empty
+    import threading
+    from time import monotonic
+    from megacodist.fs import FsSearchOptions
+    from utils.batching import BatchingQueue
+    from utils.listing_cache import LISTING_CACHE
+    from utils.matcher import (
+        MatchMode, NameMatcher, joinPatterns, splitPatterns)
+    from utils.meta_filter import MetaFilter
+    from utils.pruning import DEFAULT_EXCLUDES, Pruner, PruneRules
+    from utils.search_context import SearchContext, runSearch
+    patterns: list[str] = []
+    if args.patterns_file is not None:
+        # The search text, if any, is then the folder...
+        if args.search and args.folder == ".":
+            args.folder = args.search
+        try:
+            lines = args.patterns_file.read_text(
+                encoding="utf-8").splitlines()
+        except OSError as err:
+            print(f"error: cannot read the patterns: {err}", file=sys.stderr)
+            return 2
+        patterns = [line.strip() for line in lines if line.strip()]
+        args.mode = "any-of"
+        args.search = joinPatterns(patterns)
+    elif args.mode == "any-of" and args.search:
+        patterns = splitPatterns(args.search)
+        args.search = joinPatterns(patterns)
+    if not args.search:
+        print("error: the search text is required", file=sys.stderr)
+        return 2
+    if args.searcher is None:
+        args.searcher = "BFS" if "BFS" in searchers else next(iter(searchers))
+    if args.searcher not in searchers:
+        print(f"error: unknown searcher '{args.searcher}'", file=sys.stderr)
+        return 2
+    folder = Path(args.folder)
+    if not folder.is_dir():
+        print(f"error: '{folder}' is not a folder", file=sys.stderr)
+        return 2
+    # Building options ------------------------------------
+    options = FsSearchOptions.NONE
+    if args.match_case:
+        options |= FsSearchOptions.MATCH_CASE
+    if args.match_whole:
+        options |= FsSearchOptions.MATCH_WHOLE
+    if args.type != "d":
+        options |= FsSearchOptions.FILES_INCLUDED
+    if args.type != "f":
+        options |= FsSearchOptions.DIRS_INCLUDED
+    pruneRules = PruneRules(
+        (() if args.unrestricted else DEFAULT_EXCLUDES) + tuple(args.exclude),
+        args.gitignore,
+        args.one_file_system,
+        args.follow_links)
+    pruner = Pruner(pruneRules)
+    try:
+        filters = MetaFilter.fromText(
+            " ".join(args.ext),
+            args.min_size,
+            args.max_size,
+            args.newer,
+            args.older)
+    except ValueError as err:
+        print(f"error: {err}", file=sys.stderr)
+        return 2
+    mode = MatchMode[args.mode.upper().replace("-", "_")]
+    checkpoint = None
+    if args.resume and not getattr(
+            searchers[args.searcher], "resumable", False):
+        print(
+            f"note: '{args.searcher}' cannot resume; not checkpointing",
+            file=sys.stderr)
+        args.resume = False
+    if args.resume:
+        from utils.checkpoint import SearchCheckpoint
+        checkpoint = SearchCheckpoint((
+            str(folder.resolve()),
+            args.searcher,
+            args.search,
+            mode.value,
+            int(options),
+            (" ".join(args.ext), args.min_size, args.max_size, args.newer,
+                args.older),
+            pruneRules,))
+    context = SearchContext(
+        mode,
+        patterns,
+        pruner,
+        None,
+        filters,
+        checkpoint)
+    try:
+        NameMatcher(args.search, options, mode, patterns)
+    except re.error as err:
+        print(f"error: invalid regular expression: {err}", file=sys.stderr)
+        return 2
+    sink = None
+    if args.output is not None:
+        from utils.export import openSink
+        try:
+            sink = openSink(args.output)
+        except (ValueError, OSError) as err:
+            print(f"error: cannot export: {err}", file=sys.stderr)
+            return 2
+    # Running the search ----------------------------------
+    # A single search lists every folder once, so caching the listings
+    # would only cost memory...
+    LISTING_CACHE.configure(0, 0.0)
+    searcher = searchers[args.searcher]()
+    if args.stats or args.profile:
+        from utils.search_stats import InstrumentedSearcher
+        searcher = InstrumentedSearcher(
+            searcher,
+            args.stats,
+            args.profile or "none")
+    topK = None
+    if args.top > 0:
+        from utils.ranking import RankedSearcher, TopK
+        topK = TopK(args.top)
+        searcher = RankedSearcher(searcher, topK)
+    q = BatchingQueue(batch_size=256, max_delay=0.02)
+    def searchInThread() -> None:
+        try:
+            runSearch(
+                searcher,
+                folder,
+                args.search,
+                q, # type: ignore
+                options,
+                context)
+        except RuntimeError as err:
+            logging.error(err)
+        finally:
+            q.flush()
+    searchThread = threading.Thread(target=searchInThread, daemon=True)
+    searchThread.start()
+    # Streaming the matches -------------------------------
+    out = sys.stdout.buffer
+    deadline = monotonic() + args.timeout if args.timeout > 0 else None
+    nMatches = 0
+    status = 0
+    try:
+        while True:
+            finished = not searchThread.is_alive()
+            try:
+                # A finished search has flushed its last batch, so
+                # waiting for more would only delay the exit...
+                batch = q.get_nowait() if finished else q.get(timeout=0.05)
+            except Empty:
+                if finished:
+                    break
+                if deadline is not None and monotonic() >= deadline:
+                    status = 124
+                    break
+                continue
+            matches = batch.matches
+            if args.limit:
+                matches = matches[:args.limit - nMatches]
+            if sink:
+                sink.writeMatches(matches)
+            else:
+                for match in matches:
+                    out.write(_formatMatch(match, args))
+                out.flush()
+            nMatches += len(matches)
+            if args.limit and nMatches >= args.limit:
+                break
+            if deadline is not None and monotonic() >= deadline:
+                status = 124
+                break
+        if topK is not None:
+            # Reporting the best matches, found so far if timed out...
+            matches = [match for _, match in topK.snapshot()]
+            if args.limit:
+                matches = matches[:args.limit]
+            if sink:
+                sink.writeMatches(matches)
+            else:
+                for match in matches:
+                    out.write(_formatMatch(match, args))
+                out.flush()
+    except BrokenPipeError:
+        # The reader went away, e.g. `| head`; exiting quietly...
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    except OSError as err:
+        print(f"error: cannot export: {err}", file=sys.stderr)
+        status = 1
+    except KeyboardInterrupt:
+        status = 130
+    finally:
+        searcher.stopSearch()
+        q.close()
+        if sink:
+            try:
+                sink.close()
+            except OSError as err:
+                print(f"error: cannot export: {err}", file=sys.stderr)
+                status = 1
+    if args.stats or args.profile or args.resume:
+        # Letting the stopped search write its statistics and its
+        # checkpoint...
+        searchThread.join()
+    if summary := pruner.summary():
+        print(f"note: {summary}", file=sys.stderr)
+    for note in context.notes:
+        print(f"note: {note}", file=sys.stderr)
+    return status
+
+
+def _formatMatch(match, args: argparse.Namespace) -> bytes:
+    """Formats a match as a record of the selected output format."""
+    if args.ndjson:
+        record: dict[str, object] = {"path": str(match.path)}
+        if hasattr(match, "patterns"):
+            record["patterns"] = list(match.patterns)
+        for attr in ("line", "offset", "text", "size", "digest"):
+            if hasattr(match, attr):
+                record[attr] = getattr(match, attr)
+        return json.dumps(record, ensure_ascii=False).encode(
+            "utf-8", "surrogateescape") + b"\n"
+    sep = b"\0" if args.null else b"\n"
+    return bytes(match.path) + sep
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,332 @@
+#
+#
+#
+
+from bisect import bisect_left
+import heapq
+import json
+import logging
+import os
+from pathlib import Path
+from queue import Queue
+import threading
+from time import perf_counter, time
+
+from megacodist.fs import FsSearchOptions, FsSearchLocation, FsSearchMatch
+
+from utils.listing_cache import LISTING_CACHE
+from utils.matcher import NameMatcher
+from utils.pruning import PruneScope
+from utils.search_context import IContextSearchable, SearchContext
+from utils.settings import CACHE_DIR
+
+
+HOT_DIRS_PATH = CACHE_DIR / "hot_dirs.json"
+"""
+The weights of the directories that held matches in past searches:
+`directory => weight`
+"""
+
+
+_STAT_IS_FREE = os.name == "nt"
+"""
+Whether `os.DirEntry.stat` is answered from the listing, without a
+system call, as on Windows.
+"""
+
+
+def _trigrams(text: str) -> set[str]:
+    """Returns the set of all 3-character substrings of the text."""
+    return {text[idx:idx + 3] for idx in range(len(text) - 2)}
+
+
+class BestFirstSearcher(IContextSearchable):
+    """
+    Visits directories in order of promise rather than depth, to cut
+    the time to the first matches. The frontier is a heap scored by
+    depth, the similarity of the directory name to the query, whether
+    the directory holds or leads to directories where past searches
+    found matches, and how recently it was modified. Scoring a
+    directory costs no system call, so the ordering adds little to a
+    full traversal: the recency is that of its own `stat` only if the
+    traversal took it anyway, and otherwise that of its parent, whose
+    `stat` the listing cache took. Every directory is still visited
+    eventually. Symbolic links are followed only if the
+    pruning rules of the query say so. With a
+    `SearchCheckpoint` in the context the traversal can be resumed after
+    it is stopped, the resumed frontier being scored by depth alone.
+    """
+
+    name = "Best-first"
+
+    resumable = True
+    """It saves and resumes its progress with a `SearchCheckpoint`."""
+
+    DEPTH_WEIGHT = 1.0
+    """The cost of every level below the root."""
+
+    SIMILARITY_WEIGHT = 4.0
+    """
+    The bonus of a directory whose name contains the query, in levels;
+    names sharing only some trigrams with it get a share.
+    """
+
+    HOT_WEIGHT = 64.0
+    """
+    The bonus of a directory that held matches in past searches, or one
+    of its ancestors, in levels. Such directories are scored by the
+    depth of the nearest past hit below them rather than their own, so
+    the chain leading to the shallowest one is followed down at once.
+    """
+
+    RECENCY_WEIGHT = 1.0
+    """
+    The bonus of a directory modified just now, in levels, fading over
+    `RECENCY_SPAN`.
+    """
+
+    RECENCY_SPAN = 30 * 24 * 3600
+    """The age in seconds past which a directory gets no recency bonus."""
+
+    MAX_HOT_DIRS = 4096
+    """The number of past hit directories remembered at most."""
+
+    HOT_DECAY = 0.8
+    """The factor weights of past hit directories decay by per search."""
+
+    _STOP_CHECK_ENTRIES = 1024
+    """How many entries of a directory are read between stop checks."""
+
+    def __init__(self) -> None:
+        self._evtStop = threading.Event()
+        """Set when the current search has been asked to stop."""
+
+    def search(
+            self,
+            root_dir: str | Path,
+            search: str,
+            q: Queue[FsSearchLocation | FsSearchMatch],
+            options: FsSearchOptions = (
+                FsSearchOptions.FILES_INCLUDED
+                | FsSearchOptions.DIRS_INCLUDED),
+            context: SearchContext | None = None,
+            ) -> None:
+        # Declaring variables ---------------------------------
+        self._evtStop.clear()
+        root = Path(root_dir)
+        context = context or SearchContext()
+        matcher = NameMatcher(search, options, context.mode, context.patterns)
+        pruner = context.pruner
+        stats = context.stats
+        filters = context.filters
+        followLinks = pruner.rules.followLinks
+        includeFiles = bool(options & FsSearchOptions.FILES_INCLUDED)
+        includeDirs = bool(options & FsSearchOptions.DIRS_INCLUDED)
+        literals = [literal.casefold() for literal in matcher.literals or ()]
+        gramSets = [_trigrams(literal) for literal in literals]
+        hotDirs = _readHotDirs()
+        hotUnder = _HotDirs(root, hotDirs)
+        now = time()
+        statsDirs = _STAT_IS_FREE or pruner.statsDirs
+        frontier: list[tuple[float, int, str, int, PruneScope]] = [
+            (0.0, 0, str(root), 0, pruner.begin(root))]
+        """The directories to visit: `(score, sequence, path, depth, scope)`"""
+        checkpoint = context.checkpoint
+        if checkpoint:
+            pending = checkpoint.begin(str(root), pruner, q)
+            frontier = []
+            for seq, pthDir in enumerate(pending):
+                depth = len(Path(pthDir).relative_to(root).parts)
+                frontier.append((
+                    self.DEPTH_WEIGHT * depth,
+                    seq,
+                    pthDir,
+                    depth,
+                    pruner.scopeOf(pthDir)))
+            heapq.heapify(frontier)
+        seq = len(frontier)
+        hitDirs: set[str] = set()
+        # Visiting the most promising directory first -----------
+        while frontier:
+            if self._evtStop.is_set():
+                break
+            _, _, pthDir, depth, scope = heapq.heappop(frontier)
+            q.put(FsSearchLocation(Path(pthDir)))
+            scanStart = perf_counter()
+            try:
+                listing, dirMtime = LISTING_CACHE.scanWithMtime(
+                    pthDir,
+                    self._evtStop.is_set,
+                    self._STOP_CHECK_ENTRIES)
+            except OSError as err:
+                logging.debug(f"Cannot scan '{pthDir}': {err}")
+                if checkpoint:
+                    checkpoint.complete(pthDir, [], [])
+                continue
+            if self._evtStop.is_set():
+                # The listing may be partial, so leaving the directory
+                # for a resumed search to scan...
+                break
+            matchStart = perf_counter()
+            nListed = len(listing)
+            listing, subdirs, scope = pruner.prune(pthDir, listing, scope)
+            # Filtering by extension before the costlier name match,
+            # then matching the names of the whole directory at once...
+            candidates = filters.filterNames(listing, pruner.isDir)
+            matched = matcher.matchMany([entry.name for entry in candidates])
+            stats.addDir(
+                nListed,
+                matchStart - scanStart,
+                perf_counter() - matchStart,
+                len(subdirs))
+            matches: list[FsSearchMatch] = []
+            for entIdx in matched:
+                entry = candidates[entIdx]
+                isDir = pruner.isDir(entry)
+                if ((includeDirs if isDir else includeFiles)
+                        and filters.acceptsEntry(entry, isDir, followLinks)):
+                    matches.append(matcher.makeMatch(Path(entry.path)))
+            if checkpoint:
+                checkpoint.complete(
+                    pthDir,
+                    [entry.path for entry in subdirs],
+                    matches)
+            if matches:
+                hitDirs.add(pthDir)
+            for match in matches:
+                q.put(match)
+            # Scoring the subdirectories...
+            for entry in subdirs:
+                hitDepth = hotUnder.getHitDepth(entry.path)
+                if hitDepth is None:
+                    score = self.DEPTH_WEIGHT * (depth + 1)
+                else:
+                    score = self.DEPTH_WEIGHT * hitDepth - self.HOT_WEIGHT
+                score -= self.SIMILARITY_WEIGHT * _similarity(
+                    entry.name.casefold(),
+                    literals,
+                    gramSets)
+                mtime = dirMtime
+                if statsDirs:
+                    try:
+                        stat = entry.stat(follow_symlinks=followLinks)
+                        mtime = stat.st_mtime
+                    except OSError:
+                        pass
+                if mtime is not None:
+                    score -= self.RECENCY_WEIGHT * max(
+                        0.0,
+                        1.0 - (now - mtime) / self.RECENCY_SPAN)
+                heapq.heappush(
+                    frontier,
+                    (score, seq, entry.path, depth + 1, scope))
+                seq += 1
+        if checkpoint:
+            checkpoint.finish(not self._evtStop.is_set())
+        # Remembering where matches were found ------------------
+        if hitDirs:
+            self._saveHitDirs(root, hotDirs, hitDirs)
+
+    def stopSearch(self) -> None:
+        self._evtStop.set()
+
+    def _saveHitDirs(
+            self,
+            root: Path,
+            hot_dirs: dict[str, float],
+            hit_dirs: set[str],
+            ) -> None:
+        """
+        Decays the past weights of the directories under the root, the
+        only ones the search could hit again, adds the hits and persists
+        them.
+        """
+        rootPrefix = os.path.join(str(root), "")
+        weights = {
+            pthDir: (
+                weight * self.HOT_DECAY
+                if pthDir.startswith(rootPrefix) or pthDir == str(root)
+                else weight)
+            for pthDir, weight in hot_dirs.items()}
+        for pthDir in hit_dirs:
+            weights[pthDir] = weights.get(pthDir, 0.0) + 1.0
+        kept = sorted(weights.items(), key=lambda item: item[1], reverse=True)
+        _writeHotDirs(dict(kept[:self.MAX_HOT_DIRS]))
+
+
+class _HotDirs:
+    """
+    Finds the shallowest past hit directory at or below a directory.
+    The hit directories are kept sorted, so those below a directory form
+    a contiguous run found by bisection; only directories actually
+    scored are looked up.
+    """
+
+    def __init__(self, root: Path, hot_dirs: dict[str, float]) -> None:
+        self._rootPrefix = os.path.join(str(root), "")
+        self._dirs = sorted(
+            pthDir for pthDir in hot_dirs
+            if pthDir.startswith(self._rootPrefix))
+        """The past hit directories under the root, sorted."""
+
+    def getHitDepth(self, path: str) -> int | None:
+        """
+        Returns the depth below the root of the shallowest past hit
+        directory at or below the path, or `None` if there is none.
+        """
+        if not self._dirs:
+            return None
+        prefix = os.path.join(path, "")
+        idx = bisect_left(self._dirs, path)
+        if idx < len(self._dirs) and self._dirs[idx] == path:
+            return path.count(os.sep, len(self._rootPrefix)) + 1
+        idx = bisect_left(self._dirs, prefix, idx)
+        hitDepth: int | None = None
+        while idx < len(self._dirs) and self._dirs[idx].startswith(prefix):
+            depth = self._dirs[idx].count(os.sep, len(self._rootPrefix)) + 1
+            if hitDepth is None or depth < hitDepth:
+                hitDepth = depth
+            idx += 1
+        return hitDepth
+
+
+def _similarity(
+        name: str,
+        literals: list[str],
+        gram_sets: list[set[str]],
+        ) -> float:
+    """
+    Returns how much the case-folded name resembles any of the literals
+    of the query, from 0 to 1: 1 if it contains one, otherwise the
+    largest share of the trigrams of a literal it contains.
+    """
+    best = 0.0
+    for literal, grams in zip(literals, gram_sets):
+        if literal and literal in name:
+            return 1.0
+        if grams:
+            nameGrams = _trigrams(name)
+            best = max(best, len(grams & nameGrams) / len(grams))
+    return best
+
+
+def _readHotDirs() -> dict[str, float]:
+    try:
+        with open(HOT_DIRS_PATH, "r", encoding="utf-8") as fileObj:
+            return json.load(fileObj)
+    except FileNotFoundError:
+        return {}
+    except Exception as err:
+        logging.debug(f"Ignoring the past hit directories: {err}")
+        return {}
+
+
+def _writeHotDirs(hot_dirs: dict[str, float]) -> None:
+    try:
+        HOT_DIRS_PATH.parent.mkdir(parents=True, exist_ok=True)
+        pthTemp = HOT_DIRS_PATH.with_suffix(".tmp")
+        with open(pthTemp, "w", encoding="utf-8") as fileObj:
+            fileObj.write(json.dumps(hot_dirs))
+        os.replace(pthTemp, HOT_DIRS_PATH)
+    except OSError as err:
+        logging.debug(f"Cannot write the past hit directories: {err}")
@@ -0,0 +1,216 @@
+#
+#
+#
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import mmap
+import os
+from pathlib import Path
+from queue import Queue
+import threading
+from time import perf_counter
+
+from megacodist.fs import FsSearchOptions, FsSearchLocation, FsSearchMatch
+
+from utils.listing_cache import LISTING_CACHE
+from utils.matcher import ContentMatcher, FsContentMatch
+from utils.pruning import PruneScope
+from utils.search_context import IContextSearchable, SearchContext
+from utils.search_stats import SearchStats
+
+
+class ContentSearcher(IContextSearchable):
+    """
+    Searches the contents of the files of the tree rather than their
+    names, reporting every matching line as an `FsContentMatch`. The
+    tree is traversed breadth-first on the search thread while a pool
+    of workers reads and searches the files, so the latency of reads
+    overlaps. Small files are read at once and large ones memory-mapped;
+    files that look binary or exceed `MAX_FILE_SIZE` are skipped.
+    Symbolic links are followed only if the pruning rules of the query
+    say so.
+    """
+
+    name = "Content"
+
+    cacheable = False
+    """
+    Its results depend on the contents of the files, which can change
+    without changing the mtime of their folder.
+    """
+
+    MAX_FILE_SIZE = 64 * 1024 * 1024
+    """The size of the largest file searched, in bytes."""
+
+    MMAP_MIN_SIZE = 256 * 1024
+    """The size from which a file is memory-mapped instead of read."""
+
+    SNIFF_SIZE = 8192
+    """
+    The number of leading bytes sniffed for binary content: a file
+    containing a NUL byte there is taken as binary, as grep does.
+    """
+
+    MAX_LINES_PER_FILE = 1000
+    """The number of matching lines reported per file at most."""
+
+    MAX_LINE_LENGTH = 200
+    """The number of characters of a matching line kept as its text."""
+
+    def __init__(self, n_workers: int | None = None) -> None:
+        self._nWorkers = n_workers or min(32, (os.cpu_count() or 1) * 2)
+        """The number of threads reading files."""
+        self._evtStop = threading.Event()
+        """Set when the current search has been asked to stop."""
+
+    def search(
+            self,
+            root_dir: str | Path,
+            search: str,
+            q: Queue[FsSearchLocation | FsSearchMatch],
+            options: FsSearchOptions = (
+                FsSearchOptions.FILES_INCLUDED
+                | FsSearchOptions.DIRS_INCLUDED),
+            context: SearchContext | None = None,
+            ) -> None:
+        # Declaring variables ---------------------------------
+        self._evtStop.clear()
+        context = context or SearchContext()
+        matcher = ContentMatcher(
+            search,
+            options,
+            context.mode,
+            context.patterns)
+        pruner = context.pruner
+        stats = context.stats
+        filters = context.filters
+        followLinks = pruner.rules.followLinks
+        dirs: deque[tuple[Path, PruneScope]] = deque(
+            [(Path(root_dir), pruner.begin(root_dir))])
+        # Bounding the files waiting for a worker, so the traversal
+        # does not run arbitrarily far ahead of the reads...
+        slots = threading.BoundedSemaphore(self._nWorkers * 4)
+        # Traversing the tree and dispatching files -----------
+        with ThreadPoolExecutor(
+                max_workers=self._nWorkers,
+                thread_name_prefix="content-search") as executor:
+            while dirs and not self._evtStop.is_set():
+                pthDir, scope = dirs.popleft()
+                q.put(FsSearchLocation(pthDir))
+                scanStart = perf_counter()
+                try:
+                    listing = LISTING_CACHE.scan(pthDir)
+                except OSError as err:
+                    logging.debug(f"Cannot scan '{pthDir}': {err}")
+                    continue
+                scanTime = perf_counter() - scanStart
+                nListed = len(listing)
+                listing, subdirs, scope = pruner.prune(
+                    str(pthDir),
+                    listing,
+                    scope)
+                dirs.extend((Path(entry.path), scope) for entry in subdirs)
+                nStats = 0
+                for entry in listing:
+                    if self._evtStop.is_set():
+                        break
+                    # Filtering by extension before statting...
+                    if not filters.acceptsName(entry.name, False):
+                        continue
+                    try:
+                        if not entry.is_file(follow_symlinks=followLinks):
+                            continue
+                        nStats += 1
+                        stat = entry.stat(follow_symlinks=followLinks)
+                    except OSError:
+                        continue
+                    size = stat.st_size
+                    if not 0 < size <= self.MAX_FILE_SIZE:
+                        continue
+                    if not filters.acceptsStat(size, stat.st_mtime, False):
+                        continue
+                    while not slots.acquire(timeout=0.05):
+                        if self._evtStop.is_set():
+                            break
+                    else:
+                        future = executor.submit(
+                            self._searchFile,
+                            Path(entry.path),
+                            size,
+                            matcher,
+                            stats,
+                            q)
+                        future.add_done_callback(lambda _: slots.release())
+                # The contents are matched by the workers, adding their
+                # own time...
+                stats.addDir(nListed, scanTime, 0.0, nStats)
+            if self._evtStop.is_set():
+                executor.shutdown(wait=True, cancel_futures=True)
+
+    def stopSearch(self) -> None:
+        self._evtStop.set()
+
+    def _searchFile(
+            self,
+            path: Path,
+            size: int,
+            matcher: ContentMatcher,
+            stats: SearchStats,
+            q: Queue[FsSearchLocation | FsSearchMatch],
+            ) -> None:
+        """Searches the content of the file and reports matching lines."""
+        if self._evtStop.is_set():
+            return
+        start = perf_counter()
+        try:
+            with open(path, "rb") as fileObj:
+                if size < self.MMAP_MIN_SIZE:
+                    self._searchBuffer(path, fileObj.read(), matcher, q)
+                    return
+                with mmap.mmap(
+                        fileObj.fileno(),
+                        0,
+                        access=mmap.ACCESS_READ) as buffer:
+                    self._searchBuffer(path, buffer, matcher, q)
+        except (OSError, ValueError) as err:
+            logging.debug(f"Cannot search '{path}': {err}")
+        finally:
+            stats.addDir(0, 0.0, perf_counter() - start)
+
+    def _searchBuffer(
+            self,
+            path: Path,
+            buffer: bytes | mmap.mmap,
+            matcher: ContentMatcher,
+            q: Queue[FsSearchLocation | FsSearchMatch],
+            ) -> None:
+        """Reports the lines of the buffer having a match."""
+        # Skipping binary files...
+        if buffer.find(b"\0", 0, self.SNIFF_SIZE) != -1:
+            return
+        # Reporting one match per line, counting lines incrementally...
+        lineNum = 1
+        lineStart = 0
+        nextLine = 0
+        nLines = 0
+        for match in matcher.finditer(buffer):
+            offset = match.start()
+            if offset < nextLine:
+                continue
+            lineNum += buffer[lineStart:offset].count(b"\n")
+            lineStart = buffer.rfind(b"\n", 0, offset) + 1
+            lineEnd = buffer.find(b"\n", offset)
+            if lineEnd == -1:
+                lineEnd = len(buffer)
+            nextLine = lineEnd + 1
+            text = buffer[lineStart:lineEnd].decode("utf-8", "replace")
+            q.put(FsContentMatch(
+                path,
+                lineNum,
+                offset,
+                text.strip()[:self.MAX_LINE_LENGTH]))
+            nLines += 1
+            if nLines == self.MAX_LINES_PER_FILE or self._evtStop.is_set():
+                return
@@ -0,0 +1,336 @@
+#
+#
+#
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import blake2b
+import logging
+import os
+from pathlib import Path
+from queue import Queue
+import threading
+from time import perf_counter
+
+from megacodist.fs import FsSearchOptions, FsSearchLocation, FsSearchMatch
+
+from utils.listing_cache import LISTING_CACHE
+from utils.matcher import NameMatcher
+from utils.pruning import PruneScope
+from utils.search_context import IContextSearchable, SearchContext
+from utils.search_stats import SearchStats
+
+
+class FsDuplicateMatch(FsSearchMatch):
+    """A file whose content is the same as that of another file."""
+
+    refinable = False
+    """
+    Whether a file is a duplicate depends on the others compared, so the
+    matches of a narrower query cannot be told by name from these.
+    """
+
+    def __init__(self, path: Path, size: int, digest: str) -> None:
+        super().__init__(path)
+        self.size = size
+        """The size of the file in bytes."""
+        self.digest = digest
+        """The hexadecimal hash of the content, shared by the group."""
+
+    @property
+    def details(self) -> str:
+        # Leading with the hash, so sorting by details groups the copies...
+        return f"{self.digest[:16]} ({self.size:,} bytes)"
+
+
+class _DuplicateGroups:
+    """
+    The files of a duplicate search grouped by size, then by the hash
+    of their head and tail, then by the hash of their content. Each
+    `add` method returns what the caller has to do next: the files of
+    the group to hash at the next stage, or the confirmed duplicates to
+    report. A file is only passed on once its group has another file,
+    so a file of a unique size is never read. Safe to use from several
+    threads.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._bySize: dict[int, list[str]] = {}
+        self._bySample: dict[tuple[int, bytes], list[str]] = {}
+        self._byContent: dict[tuple[int, bytes], list[str]] = {}
+        self._fileIds: set[tuple[int, int]] = set()
+        """The `(st_dev, st_ino)` of the files added, to skip hard links."""
+        self.nGroups = 0
+        """The number of groups of duplicates confirmed."""
+
+    def _join(self, groups: dict, key, path: str) -> list[str]:
+        """
+        Adds the file to its group and returns the files to pass on: none
+        while it is alone, both once it has a pair, then each new one.
+        The lock must be held.
+        """
+        paths = groups.setdefault(key, [])
+        paths.append(path)
+        if len(paths) == 1:
+            return []
+        if len(paths) == 2:
+            return list(paths)
+        return [path]
+
+    def addSized(
+            self,
+            path: str,
+            size: int,
+            file_id: tuple[int, int] | None,
+            ) -> list[str]:
+        """
+        Adds a file of the size and returns the files to sample. Hard
+        links to a file added before are left out.
+        """
+        with self._lock:
+            if file_id is not None:
+                if file_id in self._fileIds:
+                    return []
+                self._fileIds.add(file_id)
+            return self._join(self._bySize, size, path)
+
+    def addSampled(self, path: str, size: int, digest: bytes) -> list[str]:
+        """Adds a sampled file and returns the files to hash in full."""
+        with self._lock:
+            return self._join(self._bySample, (size, digest), path)
+
+    def addHashed(self, path: str, size: int, digest: bytes) -> list[str]:
+        """Adds a file hashed in full and returns the newly confirmed."""
+        with self._lock:
+            confirmed = self._join(self._byContent, (size, digest), path)
+            if len(confirmed) == 2:
+                self.nGroups += 1
+            return confirmed
+
+
+class DuplicateSearcher(IContextSearchable):
+    """
+    Finds the files of the tree having the same content, reporting each
+    copy as an `FsDuplicateMatch` as soon as its group is confirmed. The
+    search text narrows the files compared by name, so `*` in glob mode
+    compares them all; empty files and folders are never reported, and
+    nothing is if files are not included.
+
+    Files are grouped in stages of increasing cost: by size, which the
+    traversal gets from `stat`, then by a hash of their first and last
+    `SAMPLE_SIZE` bytes, then by a hash of their whole content, so most
+    files that differ are told apart by their size or their ends. A
+    file of a size no other file has is never opened. The tree is
+    traversed breadth-first on the search thread while a pool of
+    workers hashes, reading in chunks of `CHUNK_SIZE` bytes. Hard links
+    to the same file count once.
+    """
+
+    name = "Duplicates"
+
+    refinable = False
+    """Its results cannot be narrowed by name; see `FsDuplicateMatch`."""
+
+    cacheable = False
+    """
+    Its results depend on the contents of the files, which can change
+    without changing the mtime of their folder.
+    """
+
+    SAMPLE_SIZE = 64 * 1024
+    """The number of bytes hashed at each end of a file when sampling."""
+
+    CHUNK_SIZE = 1024 * 1024
+    """The number of bytes read at once when hashing a whole file."""
+
+    def __init__(self, n_workers: int | None = None) -> None:
+        self._nWorkers = n_workers or min(16, (os.cpu_count() or 1) * 2)
+        """The number of threads hashing files."""
+        self._evtStop = threading.Event()
+        """Set when the current search has been asked to stop."""
+        self._local = threading.local()
+        """The read buffer of each worker."""
+
+    def search(
+            self,
+            root_dir: str | Path,
+            search: str,
+            q: Queue[FsSearchLocation | FsSearchMatch],
+            options: FsSearchOptions = (
+                FsSearchOptions.FILES_INCLUDED
+                | FsSearchOptions.DIRS_INCLUDED),
+            context: SearchContext | None = None,
+            ) -> None:
+        # Declaring variables ---------------------------------
+        self._evtStop.clear()
+        if not options & FsSearchOptions.FILES_INCLUDED:
+            return
+        context = context or SearchContext()
+        matcher = NameMatcher(search, options, context.mode, context.patterns)
+        pruner = context.pruner
+        stats = context.stats
+        filters = context.filters
+        followLinks = pruner.rules.followLinks
+        groups = _DuplicateGroups()
+        dirs: deque[tuple[Path, PruneScope]] = deque(
+            [(Path(root_dir), pruner.begin(root_dir))])
+        # Bounding the files waiting for a worker, so the traversal
+        # does not run arbitrarily far ahead of the reads...
+        slots = threading.BoundedSemaphore(self._nWorkers * 4)
+        # Traversing the tree and dispatching files -----------
+        with ThreadPoolExecutor(
+                max_workers=self._nWorkers,
+                thread_name_prefix="duplicate-search") as executor:
+            while dirs and not self._evtStop.is_set():
+                pthDir, scope = dirs.popleft()
+                q.put(FsSearchLocation(pthDir))
+                scanStart = perf_counter()
+                try:
+                    listing = LISTING_CACHE.scan(pthDir)
+                except OSError as err:
+                    logging.debug(f"Cannot scan '{pthDir}': {err}")
+                    continue
+                matchStart = perf_counter()
+                nListed = len(listing)
+                listing, subdirs, scope = pruner.prune(
+                    str(pthDir),
+                    listing,
+                    scope)
+                dirs.extend((Path(entry.path), scope) for entry in subdirs)
+                candidates = [
+                    entry for entry in filters.filterNames(
+                        listing,
+                        pruner.isDir)
+                    if not pruner.isDir(entry)]
+                matched = matcher.matchMany(
+                    [entry.name for entry in candidates])
+                nStats = 0
+                toSample: list[tuple[str, int]] = []
+                for entIdx in matched:
+                    entry = candidates[entIdx]
+                    try:
+                        if not entry.is_file(follow_symlinks=followLinks):
+                            continue
+                        nStats += 1
+                        stat = entry.stat(follow_symlinks=followLinks)
+                    except OSError:
+                        continue
+                    if stat.st_size == 0:
+                        continue
+                    if not filters.acceptsStat(
+                            stat.st_size,
+                            stat.st_mtime,
+                            False):
+                        continue
+                    # Windows leaves the IDs of `DirEntry.stat` zero, so
+                    # hard links are only told apart elsewhere...
+                    fileId = None
+                    if stat.st_ino:
+                        fileId = (stat.st_dev, stat.st_ino)
+                    toSample.extend(
+                        (path, stat.st_size)
+                        for path in groups.addSized(
+                            entry.path,
+                            stat.st_size,
+                            fileId))
+                stats.addDir(
+                    nListed,
+                    matchStart - scanStart,
+                    perf_counter() - matchStart,
+                    nStats)
+                for path, size in toSample:
+                    while not slots.acquire(timeout=0.05):
+                        if self._evtStop.is_set():
+                            break
+                    else:
+                        future = executor.submit(
+                            self._compare,
+                            path,
+                            size,
+                            groups,
+                            stats,
+                            q)
+                        future.add_done_callback(lambda _: slots.release())
+                        continue
+                    break
+            if self._evtStop.is_set():
+                executor.shutdown(wait=True, cancel_futures=True)
+
+    def stopSearch(self) -> None:
+        self._evtStop.set()
+
+    def _compare(
+            self,
+            path: str,
+            size: int,
+            groups: _DuplicateGroups,
+            stats: SearchStats,
+            q: Queue[FsSearchLocation | FsSearchMatch],
+            ) -> None:
+        """
+        Samples the file, hashes in full the files of its group that the
+        sample leaves in doubt, and reports the duplicates confirmed.
+        """
+        if self._evtStop.is_set():
+            return
+        start = perf_counter()
+        try:
+            sample, complete = self._hashSample(path, size)
+            if complete:
+                # The sample covered the file, so it is its full hash...
+                hashed = [(path, sample)]
+            else:
+                hashed = []
+                for pthFile in groups.addSampled(path, size, sample):
+                    if self._evtStop.is_set():
+                        return
+                    try:
+                        hashed.append((pthFile, self._hashFull(pthFile)))
+                    except OSError as err:
+                        logging.debug(f"Cannot hash '{pthFile}': {err}")
+            for pthFile, digest in hashed:
+                for pthDup in groups.addHashed(pthFile, size, digest):
+                    q.put(FsDuplicateMatch(Path(pthDup), size, digest.hex()))
+        except OSError as err:
+            logging.debug(f"Cannot hash '{path}': {err}")
+        finally:
+            stats.addDir(0, 0.0, perf_counter() - start)
+
+    def _getBuffer(self) -> memoryview:
+        """Returns the read buffer of the calling worker."""
+        try:
+            return self._local.buffer
+        except AttributeError:
+            self._local.buffer = memoryview(bytearray(self.CHUNK_SIZE))
+            return self._local.buffer
+
+    def _hashSample(self, path: str, size: int) -> tuple[bytes, bool]:
+        """
+        Hashes the first and last `SAMPLE_SIZE` bytes of the file, and
+        tells whether that covered all of it.
+        """
+        hasher = blake2b(digest_size=32)
+        with open(path, "rb", buffering=0) as fileObj:
+            if size <= 2 * self.SAMPLE_SIZE:
+                self._hashChunks(fileObj, hasher)
+                return hasher.digest(), True
+            hasher.update(fileObj.read(self.SAMPLE_SIZE))
+            fileObj.seek(-self.SAMPLE_SIZE, os.SEEK_END)
+            hasher.update(fileObj.read(self.SAMPLE_SIZE))
+        return hasher.digest(), False
+
+    def _hashFull(self, path: str) -> bytes:
+        """Hashes the whole content of the file."""
+        hasher = blake2b(digest_size=32)
+        with open(path, "rb", buffering=0) as fileObj:
+            self._hashChunks(fileObj, hasher)
+        return hasher.digest()
+
+    def _hashChunks(self, file_obj, hasher) -> None:
+        """Feeds the rest of the file to the hasher, a chunk at a time."""
+        buffer = self._getBuffer()
+        while nRead := file_obj.readinto(buffer):
+            hasher.update(buffer[:nRead])
+            if self._evtStop.is_set():
+                raise InterruptedError("the search was stopped")
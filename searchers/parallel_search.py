@@ -0,0 +1,214 @@
+#
+#
+#
+
+from collections import deque
+import logging
+import os
+from pathlib import Path
+from queue import Queue
+import threading
+from time import perf_counter
+from typing import TYPE_CHECKING
+
+from megacodist.fs import FsSearchOptions, FsSearchLocation, FsSearchMatch
+
+from utils.listing_cache import LISTING_CACHE
+from utils.matcher import NameMatcher
+from utils.meta_filter import MetaFilter
+from utils.pruning import Pruner, PruneScope
+from utils.search_context import IContextSearchable, SearchContext
+from utils.search_stats import SearchStats
+
+if TYPE_CHECKING:
+    # Imported by the searches resuming only...
+    from utils.checkpoint import SearchCheckpoint
+
+
+class ParallelSearcher(IContextSearchable):
+    """
+    Traverses the tree on several threads so that the latency of one
+    directory listing overlaps the others, which pays off on NVMe and
+    network file systems. Every worker owns a deque of directories: it
+    pushes and pops its own work at the right end, and once it runs dry
+    it steals from the left end of the others, where the shallowest and
+    so the largest subtrees wait. With a `SearchCheckpoint` in the
+    context the traversal can be resumed after it is stopped.
+    """
+
+    name = "Parallel"
+
+    resumable = True
+    """It saves and resumes its progress with a `SearchCheckpoint`."""
+
+    _MAX_IDLE_WAIT = 0.02
+    """
+    The longest an idle worker sleeps before looking for work again, in
+    seconds. It also bounds how late idle workers notice `stopSearch`.
+    """
+
+    _STOP_CHECK_ENTRIES = 1024
+    """How many entries of a directory are read between stop checks."""
+
+    def __init__(self, n_workers: int | None = None) -> None:
+        self._nWorkers = n_workers or min(32, (os.cpu_count() or 1) * 4)
+        """The number of worker threads."""
+        self._evtStop = threading.Event()
+        """Set when the current search has been asked to stop."""
+        self._deques: list[deque[tuple[Path, PruneScope]]] = []
+        """
+        The directories waiting to be scanned with their pruning scopes,
+        one deque per worker.
+        """
+        self._lckPending = threading.Lock()
+        self._nPending = 0
+        """
+        The number of directories pushed but not yet fully scanned. The
+        traversal is over when it drops to zero.
+        """
+
+    def search(
+            self,
+            root_dir: str | Path,
+            search: str,
+            q: Queue[FsSearchLocation | FsSearchMatch],
+            options: FsSearchOptions = (
+                FsSearchOptions.FILES_INCLUDED
+                | FsSearchOptions.DIRS_INCLUDED),
+            context: SearchContext | None = None,
+            ) -> None:
+        self._evtStop.clear()
+        self._deques = [deque() for _ in range(self._nWorkers)]
+        context = context or SearchContext()
+        pruner = context.pruner
+        rootScope = pruner.begin(root_dir)
+        checkpoint = context.checkpoint
+        if checkpoint is None:
+            self._deques[0].append((Path(root_dir), rootScope))
+        else:
+            self._deques[0].extend(
+                (Path(pthDir), pruner.scopeOf(pthDir))
+                for pthDir in checkpoint.begin(str(Path(root_dir)), pruner, q))
+        self._nPending = len(self._deques[0])
+        matcher = NameMatcher(search, options, context.mode, context.patterns)
+        stats = context.stats
+        filters = context.filters
+        workers = [
+            threading.Thread(
+                target=self._work,
+                args=(
+                    idx,
+                    matcher,
+                    pruner,
+                    filters,
+                    checkpoint,
+                    stats,
+                    q,
+                    options),
+                daemon=True,)
+            for idx in range(self._nWorkers)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        if checkpoint:
+            checkpoint.finish(not self._evtStop.is_set())
+
+    def stopSearch(self) -> None:
+        self._evtStop.set()
+
+    def _steal(self, idx: int) -> tuple[Path, PruneScope] | None:
+        """Takes the oldest directory from the other workers' deques."""
+        nWorkers = len(self._deques)
+        for offset in range(1, nWorkers):
+            try:
+                return self._deques[(idx + offset) % nWorkers].popleft()
+            except IndexError:
+                continue
+        return None
+
+    def _work(
+            self,
+            idx: int,
+            matcher: NameMatcher,
+            pruner: Pruner,
+            filters: MetaFilter,
+            checkpoint: "SearchCheckpoint | None",
+            stats: SearchStats,
+            q: Queue[FsSearchLocation | FsSearchMatch],
+            options: FsSearchOptions,
+            ) -> None:
+        # Declaring variables ---------------------------------
+        own = self._deques[idx]
+        item: tuple[Path, PruneScope] | None
+        idleWait = 0.001
+        includeFiles = bool(options & FsSearchOptions.FILES_INCLUDED)
+        includeDirs = bool(options & FsSearchOptions.DIRS_INCLUDED)
+        followLinks = pruner.rules.followLinks
+        # Scanning until no directory is pending ----------------
+        while not self._evtStop.is_set():
+            try:
+                item = own.pop()
+            except IndexError:
+                item = self._steal(idx)
+            if item is None:
+                if self._nPending == 0:
+                    return
+                self._evtStop.wait(idleWait)
+                idleWait = min(idleWait * 2, self._MAX_IDLE_WAIT)
+                continue
+            idleWait = 0.001
+            pthDir, scope = item
+            q.put(FsSearchLocation(pthDir))
+            subdirs: list[tuple[Path, PruneScope]] = []
+            try:
+                scanStart = perf_counter()
+                listing = LISTING_CACHE.scan(
+                    pthDir,
+                    self._evtStop.is_set,
+                    self._STOP_CHECK_ENTRIES)
+                if self._evtStop.is_set():
+                    return
+                matchStart = perf_counter()
+                nListed = len(listing)
+                listing, dirEntries, scope = pruner.prune(
+                    str(pthDir),
+                    listing,
+                    scope)
+                # Filtering by extension before the costlier name match,
+                # then matching the names of the whole directory at once...
+                candidates = filters.filterNames(listing, pruner.isDir)
+                matched = matcher.matchMany(
+                    [entry.name for entry in candidates])
+                stats.addDir(
+                    nListed,
+                    matchStart - scanStart,
+                    perf_counter() - matchStart)
+                matches: list[FsSearchMatch] = []
+                for entIdx in matched:
+                    entry = candidates[entIdx]
+                    isDir = pruner.isDir(entry)
+                    if not (includeDirs if isDir else includeFiles):
+                        continue
+                    if filters.acceptsEntry(entry, isDir, followLinks):
+                        matches.append(matcher.makeMatch(Path(entry.path)))
+                subdirs = [(Path(entry.path), scope) for entry in dirEntries]
+                # Checkpointing the directory with its matches before
+                # publishing them, so a resumed search replays them...
+                if checkpoint:
+                    checkpoint.complete(
+                        str(pthDir),
+                        [str(pthSubdir) for pthSubdir, _ in subdirs],
+                        matches)
+                for match in matches:
+                    q.put(match)
+            except OSError as err:
+                logging.debug(f"Cannot scan '{pthDir}': {err}")
+                if checkpoint:
+                    checkpoint.complete(str(pthDir), [], [])
+            finally:
+                # Counting the subdirectories before publishing them, so
+                # the count never drops to zero while work remains...
+                with self._lckPending:
+                    self._nPending += len(subdirs) - 1
+                own.extend(subdirs)
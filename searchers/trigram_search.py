@@ -0,0 +1,137 @@
+#
+#
+#
+
+import os
+from pathlib import Path
+from queue import Queue
+import threading
+from time import localtime, perf_counter, strftime
+from typing import Callable
+
+from megacodist.fs import FsSearchOptions, FsSearchLocation, FsSearchMatch
+
+from utils.matcher import NameMatcher
+from utils.search_context import IContextSearchable, SearchContext
+from utils.trigram_index import TrigramIndex
+
+
+class TrigramIndexSearcher(IContextSearchable):
+    """
+    Answers searches from a persistent trigram index of the root
+    directory. The first search over a root builds the index, reporting
+    the directories being indexed as `FsSearchLocation` items; later
+    searches only query the index, refreshing it only if the root
+    changed. As changes deeper down go unnoticed, the results are then
+    noted as possibly stale. The index is kept by the resolved root,
+    but paths are reported under the root as given.
+    """
+
+    name = "Trigram index"
+
+    REFRESH = False
+    """Whether to re-scan the changed directories before querying."""
+    WATCH = False
+    """
+    Whether to keep the index current with an inotify watcher once it
+    is up to date. Only honoured on Linux.
+    """
+
+    def __init__(self) -> None:
+        self._evtStop = threading.Event()
+        """Set when the current search has been asked to stop."""
+
+    def search(
+            self,
+            root_dir: str | Path,
+            search: str,
+            q: Queue[FsSearchLocation | FsSearchMatch],
+            options: FsSearchOptions = (
+                FsSearchOptions.FILES_INCLUDED
+                | FsSearchOptions.DIRS_INCLUDED),
+            context: SearchContext | None = None,
+            ) -> None:
+        self._evtStop.clear()
+        root = Path(root_dir).resolve()
+        context = context or SearchContext()
+        stats = context.stats
+        rebase = self._getRebaser(root, Path(root_dir))
+        # Loading, building or refreshing the index...
+        loadStart = perf_counter()
+        onDir = lambda pthDir: q.put(FsSearchLocation(rebase(pthDir)))
+        index = TrigramIndex.open(root)
+        if index is None:
+            index = TrigramIndex(root)
+            if not index.build(onDir, self._evtStop.is_set):
+                return
+        elif not (index.watcher and index.watcher.isAlive()):
+            if self.REFRESH or index.isRootChanged():
+                if not index.refresh(onDir, self._evtStop.is_set):
+                    return
+            else:
+                context.notes.append(self._getStaleNote(root))
+        if index.dirty:
+            index.save()
+        if self.WATCH:
+            index.startWatcher()
+        loadTime = perf_counter() - loadStart
+        # Querying the index, leaving out what the pruning rules
+        # exclude as the index covers the whole tree...
+        matcher = NameMatcher(search, options, context.mode, context.patterns)
+        pruner = context.pruner
+        pruner.begin(root)
+        paths = index.search(
+            matcher,
+            include_files=bool(options & FsSearchOptions.FILES_INCLUDED),
+            include_dirs=bool(options & FsSearchOptions.DIRS_INCLUDED),
+            accept=pruner.allowsPath,
+            filters=context.filters)
+        # Timing the lookups apart from the puts...
+        queryTime = 0.0
+        while not self._evtStop.is_set():
+            queryStart = perf_counter()
+            path = next(paths, None)
+            queryTime += perf_counter() - queryStart
+            if path is None:
+                break
+            q.put(matcher.makeMatch(rebase(path)))
+        stats.addDir(len(index), loadTime, queryTime)
+
+    def stopSearch(self) -> None:
+        self._evtStop.set()
+
+    def _getStaleNote(self, root: Path) -> str:
+        """Tells how old the index answering the search may be."""
+        try:
+            saved = os.stat(TrigramIndex.getPath(root)).st_mtime
+        except OSError:
+            return "stale: the index may miss recent changes"
+        asOf = strftime("%Y-%m-%d %H:%M", localtime(saved))
+        return f"stale: the index is as of {asOf}"
+
+    def _getRebaser(
+            self,
+            root: Path,
+            root_dir: Path,
+            ) -> Callable[[Path], Path]:
+        """
+        Returns a function moving the paths under the resolved root to
+        the same place under the root as given.
+        """
+        if root == root_dir:
+            return lambda path: path
+        return lambda path: root_dir / Path(path).relative_to(root)
+
+
+class TrigramRefreshSearcher(TrigramIndexSearcher):
+    """
+    Like `TrigramIndexSearcher`, but first re-scans the directories
+    whose mtime or inode changed since the index was saved, reporting
+    them as `FsSearchLocation` items. On Linux it then watches the tree
+    with inotify so that later searches can skip the refresh.
+    """
+
+    name = "Trigram index (refresh)"
+
+    REFRESH = True
+    WATCH = True
@@ -0,0 +1,11 @@
+#
+#
+#
+
+from pathlib import Path
+import sys
+
+
+# Importing `utils`, `searchers` and `widgets` as the application does,
+# from its root, wherever pytest is run from...
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
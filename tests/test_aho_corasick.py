@@ -0,0 +1,55 @@
+#
+#
+#
+
+from utils.aho_corasick import AhoCorasick
+
+
+def _naiveMatches(patterns: list[str], text: str) -> set[tuple[int, int]]:
+    """Finds every occurrence the slow way: `(end, pattern index)`."""
+    return {
+        (start + len(pattern), patIdx)
+        for patIdx, pattern in enumerate(patterns)
+        for start in range(len(text) - len(pattern) + 1)
+        if text.startswith(pattern, start)}
+
+
+def test_overlapping_patterns_all_reported():
+    patterns = ["he", "she", "his", "hers"]
+    automaton = AhoCorasick(patterns)
+    text = "ushers"
+    assert set(automaton.iterMatches(text)) == _naiveMatches(patterns, text)
+    assert automaton.findAll(text) == {0, 1, 3}
+
+
+def test_pattern_inside_another_found_through_failure_links():
+    patterns = ["abcd", "bc", "c"]
+    automaton = AhoCorasick(patterns)
+    assert set(automaton.iterMatches("xabcy")) == {(4, 1), (4, 2)}
+
+
+def test_matches_agree_with_naive_search():
+    patterns = ["aa", "aab", "ab", "b", "baa", "abab"]
+    automaton = AhoCorasick(patterns)
+    for text in ("", "a", "aaab", "abababaa", "bbbaaabab", "cab"):
+        assert set(automaton.iterMatches(text)) == \
+            _naiveMatches(patterns, text)
+
+
+def test_find_any():
+    automaton = AhoCorasick(["needle", "pin"])
+    assert automaton.findAny("haystack with a pin")
+    assert automaton.findAny("needles")
+    assert not automaton.findAny("haystack")
+    assert not automaton.findAny("")
+
+
+def test_duplicate_patterns_keep_their_indexes():
+    automaton = AhoCorasick(["ab", "ab"])
+    assert automaton.findAll("xaby") == {0, 1}
+
+
+def test_no_patterns_match_nothing():
+    automaton = AhoCorasick([])
+    assert not automaton.findAny("anything")
+    assert automaton.findAll("anything") == set()
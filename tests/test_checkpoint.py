@@ -0,0 +1,141 @@
+#
+#
+#
+
+import os
+from pathlib import Path
+from queue import Queue
+
+import pytest
+from megacodist.fs import FsSearchMatch, FsSearchOptions
+
+from searchers.parallel_search import ParallelSearcher
+from utils import checkpoint as checkpoint_mod
+from utils.checkpoint import SearchCheckpoint
+from utils.pruning import Pruner, PruneRules
+from utils.search_context import SearchContext
+
+
+_OPTIONS = FsSearchOptions.FILES_INCLUDED
+_RULES = PruneRules((), False, False, True)
+
+
+class _StoppingQueue(Queue):
+    """Stops the searcher once it has put `n_matches` matches."""
+
+    def __init__(self, searcher: ParallelSearcher, n_matches: int) -> None:
+        super().__init__()
+        self._searcher = searcher
+        self._nLeft = n_matches
+
+    def put(self, item, block=True, timeout=None) -> None:
+        super().put(item, block, timeout)
+        if isinstance(item, FsSearchMatch):
+            self._nLeft -= 1
+            if self._nLeft == 0:
+                self._searcher.stopSearch()
+
+
+@pytest.fixture(autouse=True)
+def _checkpointDir(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(
+        checkpoint_mod,
+        "CHECKPOINT_DIR",
+        tmp_path / "checkpoints")
+
+
+def _makeTree(root: Path) -> int:
+    """Makes a tree with links to its folders; returns the hit count."""
+    nHits = 0
+    for dirIdx in range(6):
+        pthDir = root / f"d{dirIdx}"
+        for subIdx in range(4):
+            pthSub = pthDir / f"s{subIdx}"
+            pthSub.mkdir(parents=True)
+            (pthSub / "hit.txt").write_text("")
+            (pthSub / "miss.txt").write_text("")
+            nHits += 1
+        os.symlink(pthDir, root / f"l{dirIdx}")
+    return nHits
+
+
+def _search(
+        root: Path,
+        identity: tuple,
+        n_matches: int = 0,
+        ) -> tuple[list[str], SearchCheckpoint]:
+    """
+    Searches the tree for 'hit' with a checkpoint, stopping after
+    `n_matches` matches unless zero. Returns the real paths of the
+    matches with the checkpoint.
+    """
+    searcher = ParallelSearcher(n_workers=2)
+    q = _StoppingQueue(searcher, n_matches)
+    checkpoint = SearchCheckpoint(identity, 0.0)
+    context = SearchContext(
+        pruner=Pruner(_RULES),
+        checkpoint=checkpoint)
+    searcher.search(root / "", "hit", q, _OPTIONS, context)
+    paths = []
+    while not q.empty():
+        item = q.get()
+        if isinstance(item, FsSearchMatch):
+            paths.append(os.path.realpath(item.path))
+    return paths, checkpoint
+
+
+def test_completed_search_deletes_its_checkpoint(tmp_path: Path):
+    root = tmp_path / "tree"
+    nHits = _makeTree(root)
+    paths, checkpoint = _search(root, ("done",))
+    assert len(paths) == len(set(paths)) == nHits
+    assert not checkpoint.path.exists()
+    assert checkpoint.resumedAt is None
+
+
+def test_stopped_search_resumes_where_it_left_off(tmp_path: Path):
+    root = tmp_path / "tree"
+    nHits = _makeTree(root)
+    expected, _ = _search(root, ("full",))
+    stopped, checkpoint = _search(root, ("resumed",), 3)
+    assert checkpoint.path.exists()
+    assert 3 <= len(stopped) < nHits
+    resumed, checkpoint = _search(root, ("resumed",))
+    assert checkpoint.resumedAt is not None
+    # The resumed search replays the matches of the stopped one, and
+    # finds every other match once, whichever link it went through...
+    assert set(stopped) <= set(resumed)
+    assert sorted(resumed) == sorted(expected)
+    assert not checkpoint.path.exists()
+
+
+def test_checkpoint_of_another_identity_is_not_resumed(tmp_path: Path):
+    root = tmp_path / "tree"
+    _makeTree(root)
+    _search(root, ("one",), 2)
+    _, checkpoint = _search(root, ("two",))
+    assert checkpoint.resumedAt is None
+
+
+def test_visited_and_pending_join_at_once(tmp_path: Path):
+    root = tmp_path / "tree"
+    _makeTree(root)
+    pruner = Pruner(_RULES)
+    pruner.begin(root)
+    checkpoint = SearchCheckpoint(("keys",), 3600.0)
+    q: Queue = Queue()
+    assert checkpoint.begin(str(root), pruner, q) == [str(root)]
+    with os.scandir(root) as entries:
+        listing = list(entries)
+    _, dirEntries, _ = pruner.prune(str(root), listing, ())
+    subdirs = [entry.path for entry in dirEntries]
+    assert len(subdirs) == 6
+    # The pruner visited the subdirectories, but until completing the
+    # root the checkpoint holds neither them nor their keys...
+    assert len(pruner.getVisited()) == 7
+    assert len(checkpoint._visited) == 1
+    checkpoint.complete(str(root), subdirs, [])
+    assert set(checkpoint._pending) == set(subdirs)
+    assert checkpoint._visited == pruner.getVisited()
+    assert pruner.takeKeys(subdirs) == []
+    checkpoint.finish(False)
@@ -0,0 +1,75 @@
+#
+#
+#
+
+from pathlib import Path
+from queue import Queue
+
+from megacodist.fs import FsSearchOptions
+
+from searchers.duplicate_search import (
+    DuplicateSearcher, FsDuplicateMatch, _DuplicateGroups)
+from utils.matcher import MatchMode
+from utils.search_context import SearchContext
+
+
+def test_a_file_alone_is_never_passed_on():
+    groups = _DuplicateGroups()
+    assert groups.addSized("/a", 10, (1, 1)) == []
+    assert groups.addSized("/b", 20, (1, 2)) == []
+
+
+def test_a_pair_then_each_newcomer_is_passed_on():
+    groups = _DuplicateGroups()
+    assert groups.addSized("/a", 10, (1, 1)) == []
+    assert groups.addSized("/b", 10, (1, 2)) == ["/a", "/b"]
+    assert groups.addSized("/c", 10, (1, 3)) == ["/c"]
+
+
+def test_hard_links_count_once():
+    groups = _DuplicateGroups()
+    assert groups.addSized("/a", 10, (1, 1)) == []
+    assert groups.addSized("/a-link", 10, (1, 1)) == []
+    assert groups.addSized("/b", 10, None) == ["/a", "/b"]
+
+
+def test_stages_are_keyed_by_size_and_digest():
+    groups = _DuplicateGroups()
+    assert groups.addSampled("/a", 10, b"x") == []
+    assert groups.addSampled("/b", 20, b"x") == []
+    assert groups.addSampled("/c", 10, b"y") == []
+    assert groups.addSampled("/d", 10, b"x") == ["/a", "/d"]
+
+
+def test_groups_are_counted_once_confirmed():
+    groups = _DuplicateGroups()
+    groups.addHashed("/a", 10, b"x")
+    assert groups.nGroups == 0
+    assert groups.addHashed("/b", 10, b"x") == ["/a", "/b"]
+    assert groups.addHashed("/c", 10, b"x") == ["/c"]
+    assert groups.addHashed("/d", 10, b"y") == []
+    assert groups.nGroups == 1
+
+
+def test_search_reports_copies_only(tmp_path: Path):
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "one.txt").write_bytes(b"same content")
+    (tmp_path / "sub" / "two.txt").write_bytes(b"same content")
+    (tmp_path / "other.txt").write_bytes(b"same length!")
+    (tmp_path / "empty1.txt").write_bytes(b"")
+    (tmp_path / "empty2.txt").write_bytes(b"")
+    q: Queue = Queue()
+    DuplicateSearcher().search(
+        tmp_path,
+        "*",
+        q,
+        FsSearchOptions.FILES_INCLUDED,
+        SearchContext(MatchMode.GLOB))
+    matches = []
+    while not q.empty():
+        item = q.get()
+        if isinstance(item, FsDuplicateMatch):
+            matches.append(item)
+    assert sorted(match.path.name for match in matches) == \
+        ["one.txt", "two.txt"]
+    assert matches[0].digest == matches[1].digest
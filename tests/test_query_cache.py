@@ -0,0 +1,133 @@
+#
+#
+#
+
+import os
+from pathlib import Path
+from queue import Queue
+
+from megacodist.fs import FsSearchMatch, FsSearchOptions
+
+from searchers.parallel_search import ParallelSearcher
+from utils.matcher import MatchMode
+from utils.query_cache import CachingSearcher, QueryCache, isRefinement
+
+
+_OPTIONS = FsSearchOptions.FILES_INCLUDED
+
+
+class _CountingSearcher(ParallelSearcher):
+    """Counts the searches that reach the disk."""
+
+    def __init__(self) -> None:
+        super().__init__(n_workers=2)
+        self.nSearches = 0
+
+    def search(self, *args, **kwargs) -> None:
+        self.nSearches += 1
+        super().search(*args, **kwargs)
+
+
+def _makeTree(root: Path) -> None:
+    for dirName in ("a", "b"):
+        (root / dirName).mkdir()
+        for name in ("foo1.txt", "foo2.txt", "bar.txt"):
+            (root / dirName / name).write_text(name)
+
+
+def _touchDir(pth_dir: Path) -> None:
+    """Moves the mtime of the folder, whatever the clock resolution."""
+    stat = os.stat(pth_dir)
+    os.utime(pth_dir, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+def _search(searcher: CachingSearcher, root: Path, text: str) -> set[str]:
+    q: Queue = Queue()
+    searcher.search(root, text, q, _OPTIONS)
+    names = set()
+    while not q.empty():
+        item = q.get()
+        if isinstance(item, FsSearchMatch):
+            names.add(str(Path(item.path).relative_to(root)))
+    return names
+
+
+def test_repeated_search_is_replayed(tmp_path: Path):
+    _makeTree(tmp_path)
+    inner = _CountingSearcher()
+    searcher = CachingSearcher(inner, "Parallel", QueryCache())
+    first = _search(searcher, tmp_path, "foo")
+    assert _search(searcher, tmp_path, "foo") == first
+    assert inner.nSearches == 1
+
+
+def test_repeated_search_sees_new_files(tmp_path: Path):
+    _makeTree(tmp_path)
+    inner = _CountingSearcher()
+    searcher = CachingSearcher(inner, "Parallel", QueryCache())
+    assert _search(searcher, tmp_path, "foo") == {
+        "a/foo1.txt", "a/foo2.txt", "b/foo1.txt", "b/foo2.txt"}
+    (tmp_path / "b" / "foo3.txt").write_text("new")
+    _touchDir(tmp_path / "b")
+    assert "b/foo3.txt" in _search(searcher, tmp_path, "foo")
+    assert inner.nSearches == 2
+
+
+def test_repeated_search_drops_removed_files(tmp_path: Path):
+    _makeTree(tmp_path)
+    searcher = CachingSearcher(_CountingSearcher(), "Parallel", QueryCache())
+    _search(searcher, tmp_path, "foo")
+    os.unlink(tmp_path / "a" / "foo1.txt")
+    _touchDir(tmp_path / "a")
+    assert "a/foo1.txt" not in _search(searcher, tmp_path, "foo")
+
+
+def test_narrower_search_is_refined_from_the_cache(tmp_path: Path):
+    _makeTree(tmp_path)
+    inner = _CountingSearcher()
+    searcher = CachingSearcher(inner, "Parallel", QueryCache())
+    _search(searcher, tmp_path, "foo")
+    assert _search(searcher, tmp_path, "foo1") == {
+        "a/foo1.txt", "b/foo1.txt"}
+    assert inner.nSearches == 1
+
+
+def test_stale_broader_entry_is_not_refined(tmp_path: Path):
+    _makeTree(tmp_path)
+    inner = _CountingSearcher()
+    searcher = CachingSearcher(inner, "Parallel", QueryCache())
+    _search(searcher, tmp_path, "foo")
+    (tmp_path / "a" / "foo1-new.txt").write_text("new")
+    _touchDir(tmp_path / "a")
+    assert "a/foo1-new.txt" in _search(searcher, tmp_path, "foo1")
+    assert inner.nSearches == 2
+
+
+def test_search_over_the_budget_is_not_cached(tmp_path: Path):
+    _makeTree(tmp_path)
+    inner = _CountingSearcher()
+    searcher = CachingSearcher(inner, "Parallel", QueryCache(budget=2048))
+    _search(searcher, tmp_path, "foo")
+    _search(searcher, tmp_path, "foo")
+    assert inner.nSearches == 2
+
+
+def test_refinement_by_mode():
+    assert isRefinement(("foo1",), ("foo",), MatchMode.SUBSTRING,
+        False, False)
+    assert not isRefinement(("fo",), ("foo",), MatchMode.SUBSTRING,
+        False, False)
+    assert isRefinement(("FOO1",), ("foo",), MatchMode.SUBSTRING,
+        False, False)
+    assert not isRefinement(("FOO1",), ("foo",), MatchMode.SUBSTRING,
+        True, False)
+    assert not isRefinement(("foo1",), ("foo",), MatchMode.SUBSTRING,
+        False, True)
+    assert isRefinement(("fxoxo",), ("foo",), MatchMode.FUZZY,
+        False, False)
+    assert isRefinement(("a",), ("a", "b"), MatchMode.ANY_OF,
+        False, False)
+    assert not isRefinement(("a", "c"), ("a", "b"), MatchMode.ANY_OF,
+        False, False)
+    assert not isRefinement(("foo1",), ("foo",), MatchMode.GLOB,
+        False, False)
@@ -0,0 +1,62 @@
+#
+#
+#
+
+from pathlib import Path
+import threading
+
+from megacodist.fs import FsSearchMatch
+
+from utils.ranking import TopK
+
+
+def _scored(*scores: float) -> list[tuple[float, FsSearchMatch]]:
+    return [(score, FsSearchMatch(Path(f"/m{score}"))) for score in scores]
+
+
+def test_keeps_the_best_k_best_first():
+    topK = TopK(3)
+    topK.offer(_scored(5, 1, 9, 3, 7))
+    assert [score for score, _ in topK.snapshot()] == [9, 7, 5]
+    assert len(topK) == 3
+
+
+def test_threshold_is_the_worst_kept_once_full():
+    topK = TopK(2)
+    assert topK.getThreshold() == float("-inf")
+    topK.offer(_scored(4))
+    assert topK.getThreshold() == float("-inf")
+    topK.offer(_scored(6, 2))
+    assert topK.getThreshold() == 4
+
+
+def test_version_changes_only_with_the_kept_matches():
+    topK = TopK(2)
+    topK.offer(_scored(4, 6))
+    version = topK.version
+    topK.offer(_scored(1, 4))
+    assert topK.version == version
+    topK.offer(_scored(5))
+    assert topK.version == version + 1
+
+
+def test_equal_scores_do_not_compare_matches():
+    topK = TopK(2)
+    topK.offer(_scored(1, 1, 1, 1))
+    assert len(topK.snapshot()) == 2
+
+
+def test_offers_from_several_threads():
+    topK = TopK(10)
+    def offer(base: int) -> None:
+        for score in range(base, base + 1000):
+            topK.offer(_scored(score))
+    threads = [
+        threading.Thread(target=offer, args=(base,))
+        for base in range(0, 8000, 1000)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert [score for score, _ in topK.snapshot()] == \
+        list(range(7999, 7989, -1))
@@ -0,0 +1,192 @@
+#
+#
+#
+
+import os
+from pathlib import Path
+
+import pytest
+from megacodist.fs import FsSearchOptions
+
+from utils import trigram_index as trigram_mod
+from utils.matcher import MatchMode, NameMatcher
+from utils.trigram_index import TrigramIndex
+
+
+_OPTIONS = FsSearchOptions.FILES_INCLUDED | FsSearchOptions.DIRS_INCLUDED
+
+
+@pytest.fixture(autouse=True)
+def _indexDir(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(trigram_mod, "INDEX_DIR", tmp_path / "indexes")
+
+
+def _makeTree(root: Path) -> None:
+    for dirIdx in range(3):
+        pthDir = root / f"dir{dirIdx}"
+        pthDir.mkdir(parents=True)
+        for fileIdx in range(4):
+            (pthDir / f"report{fileIdx}.txt").write_text("")
+        (pthDir / "notes.md").write_text("")
+
+
+def _touchDir(pth_dir: Path) -> None:
+    """Moves the mtime of the folder, whatever the clock resolution."""
+    stat = os.stat(pth_dir)
+    os.utime(pth_dir, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+def _find(index: TrigramIndex, text: str, mode=MatchMode.SUBSTRING):
+    matcher = NameMatcher(text, _OPTIONS, mode)
+    return {
+        path.relative_to(index.root).as_posix()
+        for path in index.search(matcher)}
+
+
+def _build(root: Path) -> TrigramIndex:
+    index = TrigramIndex(root)
+    assert index.build()
+    return index
+
+
+def _dirId(index: TrigramIndex, name: str) -> int:
+    return index._dirNames.index(name)
+
+
+def test_build_and_search(tmp_path: Path):
+    root = tmp_path / "tree"
+    _makeTree(root)
+    index = _build(root)
+    assert len(index) == 18
+    assert _find(index, "report1") == {
+        "dir0/report1.txt", "dir1/report1.txt", "dir2/report1.txt"}
+    assert _find(index, "REPORT1") == _find(index, "report1")
+    assert _find(index, "dir1") == {"dir1"}
+    assert _find(index, "*.md", MatchMode.GLOB) == {
+        "dir0/notes.md", "dir1/notes.md", "dir2/notes.md"}
+    assert _find(index, "absent") == set()
+
+
+def test_search_skips_excluded_kinds(tmp_path: Path):
+    root = tmp_path / "tree"
+    _makeTree(root)
+    index = _build(root)
+    matcher = NameMatcher("dir", _OPTIONS, MatchMode.SUBSTRING)
+    assert list(index.search(matcher, include_dirs=False)) == []
+
+
+def test_saved_index_opens(tmp_path: Path):
+    root = tmp_path / "tree"
+    _makeTree(root)
+    index = _build(root)
+    index.save()
+    assert not index.dirty
+    assert TrigramIndex.getPath(root).exists()
+    # Forgetting the index in memory to load it from disk...
+    TrigramIndex._loaded.pop(str(root))
+    opened = TrigramIndex.open(root)
+    assert opened is not None and opened is not index
+    assert _find(opened, "report") == _find(index, "report")
+    assert TrigramIndex.open(tmp_path / "unindexed") is None
+
+
+def test_root_changes_are_detected(tmp_path: Path):
+    root = tmp_path / "tree"
+    _makeTree(root)
+    index = _build(root)
+    assert not index.isRootChanged()
+    (root / "dir0" / "deeper.txt").write_text("")
+    assert not index.isRootChanged()
+    (root / "new.txt").write_text("")
+    _touchDir(root)
+    assert index.isRootChanged()
+
+
+def test_refresh_picks_up_changes(tmp_path: Path):
+    root = tmp_path / "tree"
+    _makeTree(root)
+    index = _build(root)
+    (root / "dir1" / "report9.txt").write_text("")
+    os.unlink(root / "dir2" / "report0.txt")
+    (root / "dir3").mkdir()
+    (root / "dir3" / "report5.txt").write_text("")
+    for name in ("", "dir1", "dir2"):
+        _touchDir(root / name)
+    assert index.refresh()
+    assert "dir1/report9.txt" in _find(index, "report9")
+    assert _find(index, "report0") == {
+        "dir0/report0.txt", "dir1/report0.txt"}
+    assert _find(index, "report5") == {"dir3/report5.txt"}
+    assert not index.isRootChanged()
+
+
+def test_refresh_drops_removed_folders(tmp_path: Path):
+    root = tmp_path / "tree"
+    _makeTree(root)
+    index = _build(root)
+    for pthFile in (root / "dir0").iterdir():
+        pthFile.unlink()
+    (root / "dir0").rmdir()
+    _touchDir(root)
+    assert index.refresh()
+    assert _find(index, "dir0") == set()
+    assert all(
+        not path.startswith("dir0/") for path in _find(index, "report"))
+
+
+def test_compact_drops_dead_entries(tmp_path: Path):
+    root = tmp_path / "tree"
+    _makeTree(root)
+    index = _build(root)
+    os.unlink(root / "dir0" / "report0.txt")
+    _touchDir(root / "dir0")
+    assert index.refresh()
+    assert index._nDead == 1
+    before = _find(index, "report")
+    index.compact()
+    assert index._nDead == 0
+    assert len(index._entNames) == len(index) == 17
+    assert _find(index, "report") == before
+    assert _find(index, "notes") == {
+        "dir0/notes.md", "dir1/notes.md", "dir2/notes.md"}
+
+
+def test_refresh_dirs_compacts_once_dead_entries_pile_up(tmp_path: Path):
+    root = tmp_path / "tree"
+    _makeTree(root)
+    index = _build(root)
+    os.unlink(root / "dir0" / "report0.txt")
+    _touchDir(root / "dir0")
+    assert not index.refreshDirs([_dirId(index, "dir0")])
+    assert index._nDead == 1
+    for dirName in ("dir1", "dir2"):
+        for pthFile in (root / dirName).iterdir():
+            pthFile.unlink()
+        _touchDir(root / dirName)
+    dirIds = [_dirId(index, "dir1"), _dirId(index, "dir2")]
+    assert index.refreshDirs(dirIds)
+    assert index._nDead == 0
+    assert _find(index, "report") == {
+        "dir0/report1.txt", "dir0/report2.txt", "dir0/report3.txt"}
+    assert _find(index, "dir") == {"dir0", "dir1", "dir2"}
+
+
+def test_search_survives_compaction_midway(tmp_path: Path):
+    root = tmp_path / "tree"
+    _makeTree(root)
+    index = _build(root)
+    matcher = NameMatcher("report", _OPTIONS, MatchMode.SUBSTRING)
+    paths = index.search(matcher)
+    first = next(paths)
+    os.unlink(root / "dir2" / "report3.txt")
+    _touchDir(root / "dir2")
+    index.refresh()
+    index.compact()
+    # The columns taken stay consistent: the entry killed in place is
+    # skipped, and compacting leaves them to the search...
+    rest = set(paths)
+    assert first not in rest
+    assert {first, *rest} == {
+        root / f"dir{dirIdx}" / f"report{fileIdx}.txt"
+        for dirIdx in range(3)
+        for fileIdx in range(4)} - {root / "dir2" / "report3.txt"}
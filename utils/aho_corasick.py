@@ -0,0 +1,89 @@
+#
+#
+#
+
+from collections import deque
+
+
+class AhoCorasick:
+    """
+    An Aho-Corasick automaton finding every occurrence of any number of
+    patterns in a text in a single pass, so matching costs one step per
+    character of the text however many patterns there are.
+
+    The failure links are folded into a complete transition table
+    (a DFA) at construction, so each step is a single dict lookup.
+    """
+
+    def __init__(self, patterns: list[str]) -> None:
+        self.patterns = patterns
+        """The patterns, indexed as reported by the searching methods."""
+        self._delta: list[dict[str, int]] = [{}]
+        """
+        The transitions of each state:
+        `state => {char => next state}`
+        A missing char leads back to the root.
+        """
+        self._outputs: list[tuple[int, ...]] = [()]
+        """The indexes of the patterns ending at each state."""
+        self._build()
+
+    def _build(self) -> None:
+        # Building the trie ------------------------------------
+        goto: list[dict[str, int]] = [{}]
+        outputs: list[list[int]] = [[]]
+        for patIdx, pattern in enumerate(self.patterns):
+            state = 0
+            for char in pattern:
+                nextState = goto[state].get(char)
+                if nextState is None:
+                    nextState = len(goto)
+                    goto[state][char] = nextState
+                    goto.append({})
+                    outputs.append([])
+                state = nextState
+            outputs[state].append(patIdx)
+        # Folding failure links into transitions breadth-first --
+        fail = [0] * len(goto)
+        delta: list[dict[str, int]] = [dict(goto[0])]
+        delta.extend({} for _ in range(len(goto) - 1))
+        frontier = deque(goto[0].values())
+        while frontier:
+            state = frontier.popleft()
+            # The transitions of the failure state, overridden by the
+            # state's own; the failure state is shallower, so done...
+            delta[state] = {**delta[fail[state]], **goto[state]}
+            outputs[state].extend(outputs[fail[state]])
+            for char, child in goto[state].items():
+                fail[child] = delta[fail[state]].get(char, 0)
+                frontier.append(child)
+        self._delta = delta
+        self._outputs = [tuple(output) for output in outputs]
+
+    def iterMatches(self, text: str):
+        """
+        Yields `(end, pattern index)` for every occurrence of every
+        pattern in the text, where `end` is the index just past it.
+        """
+        delta = self._delta
+        outputs = self._outputs
+        state = 0
+        for idx, char in enumerate(text):
+            state = delta[state].get(char, 0)
+            for patIdx in outputs[state]:
+                yield idx + 1, patIdx
+
+    def findAny(self, text: str) -> bool:
+        """Determines whether any pattern occurs in the text."""
+        delta = self._delta
+        outputs = self._outputs
+        state = 0
+        for char in text:
+            state = delta[state].get(char, 0)
+            if outputs[state]:
+                return True
+        return False
+
+    def findAll(self, text: str) -> set[int]:
+        """Returns the indexes of all patterns occurring in the text."""
+        return {patIdx for _, patIdx in self.iterMatches(text)}
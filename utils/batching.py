@@ -0,0 +1,172 @@
+#
+#
+#
+
+from queue import Empty, Full, Queue
+import threading
+from time import monotonic
+
+from megacodist.fs import FsSearchLocation, FsSearchMatch
+
+
+class FsSearchBatch:
+    """A batch of search results as delivered to the GUI."""
+
+    def __init__(
+            self,
+            matches: list[FsSearchMatch],
+            location: FsSearchLocation | None,
+            ) -> None:
+        self.matches = matches
+        """The matches found since the previous batch."""
+        self.location = location
+        """
+        The latest location reported since the previous batch, or
+        `None` if there was none. Earlier locations are dropped.
+        """
+
+
+class BatchingQueue:
+    """
+    A queue-like object handed to searchers in place of a plain `Queue`.
+    Searchers `put` single `FsSearchLocation` and `FsSearchMatch` items
+    as before; they are gathered into `FsSearchBatch` objects which are
+    published on a bounded queue, so a consumer that falls behind blocks
+    the searcher instead of letting memory grow.
+
+    It is safe to `put` from several threads. `close` abandons the queue:
+    pending and later items are discarded and blocked producers resume.
+    """
+
+    def __init__(
+            self,
+            maxsize: int = 64,
+            batch_size: int = 1024,
+            max_delay: float = 0.05,
+            ) -> None:
+        """
+        Args:
+            maxsize:
+                The number of batches that may wait for the consumer
+                before producers block.
+            batch_size:
+                The number of matches that triggers publishing a batch.
+            max_delay:
+                The number of seconds after which pending items are
+                published even if the batch is not full.
+        """
+        self._q = Queue[FsSearchBatch](maxsize)
+        self._batchSize = batch_size
+        self._maxDelay = max_delay
+        self._lock = threading.Lock()
+        """Guards the pending batch."""
+        self._matches: list[FsSearchMatch] = []
+        """The matches not published yet."""
+        self._location: FsSearchLocation | None = None
+        """The latest location not published yet."""
+        self._lastFlush = monotonic()
+        """The time the pending batch was last published."""
+        self._evtClosed = threading.Event()
+
+    def put(
+            self,
+            item: FsSearchLocation | FsSearchMatch,
+            block: bool = True,
+            timeout: float | None = None,
+            ) -> None:
+        """
+        Adds a search result to the pending batch, publishing the batch
+        if it is full or old enough. Blocks while the queue is full.
+        """
+        if self._evtClosed.is_set():
+            return
+        with self._lock:
+            if isinstance(item, FsSearchMatch):
+                self._matches.append(item)
+            else:
+                self._location = item
+            if (len(self._matches) >= self._batchSize
+                    or monotonic() - self._lastFlush >= self._maxDelay):
+                self._publish(self._takePending())
+
+    put_nowait = put
+
+    def _takePending(self) -> FsSearchBatch | None:
+        """
+        Takes the pending items out as a batch, or returns `None` if
+        there are none. The lock must be held.
+        """
+        self._lastFlush = monotonic()
+        if not self._matches and self._location is None:
+            return None
+        batch = FsSearchBatch(self._matches, self._location)
+        self._matches = []
+        self._location = None
+        return batch
+
+    def _publish(self, batch: FsSearchBatch | None) -> None:
+        """Blocks until the batch is queued or the queue is closed."""
+        if batch is None:
+            return
+        while not self._evtClosed.is_set():
+            try:
+                self._q.put(batch, timeout=0.1)
+                return
+            except Full:
+                continue
+
+    def flush(self) -> None:
+        """Publishes the pending items; searchers call it when done."""
+        with self._lock:
+            self._publish(self._takePending())
+
+    def close(self) -> None:
+        """Abandons the queue, discarding everything not consumed yet."""
+        self._evtClosed.set()
+
+    def get(self, timeout: float | None = None) -> FsSearchBatch:
+        """
+        Waits at most `timeout` seconds, or forever if `None`, for the
+        next batch. Raises `Empty` if none arrives in time.
+        """
+        deadline = None if timeout is None else monotonic() + timeout
+        while True:
+            try:
+                return self.get_nowait()
+            except Empty:
+                pass
+            wait = self._maxDelay
+            if deadline is not None:
+                wait = min(wait, deadline - monotonic())
+                if wait <= 0:
+                    raise Empty
+            try:
+                return self._q.get(timeout=wait)
+            except Empty:
+                continue
+
+    def get_nowait(self) -> FsSearchBatch:
+        """
+        Returns the next batch. If none is queued but items have been
+        pending longer than the maximum delay, for example because the
+        searcher is stuck listing a slow directory, they are taken
+        directly. Raises `Empty` if there is nothing to return.
+        """
+        try:
+            return self._q.get_nowait()
+        except Empty:
+            pass
+        # Never stall the consumer on a producer holding the lock...
+        if (monotonic() - self._lastFlush >= self._maxDelay
+                and self._lock.acquire(blocking=False)):
+            try:
+                batch = self._takePending()
+            finally:
+                self._lock.release()
+            if batch is not None:
+                return batch
+        raise Empty
+
+    def qsize(self) -> int:
+        """Returns the approximate number of batches waiting."""
+        return self._q.qsize()
@@ -0,0 +1,244 @@
+#
+#
+#
+
+from hashlib import sha1
+import logging
+import os
+import pickle
+from queue import Queue
+import threading
+from time import monotonic, time
+from typing import BinaryIO
+
+from megacodist.fs import FsSearchLocation, FsSearchMatch
+
+from utils.pruning import Pruner
+from utils.settings import CACHE_DIR
+
+
+CHECKPOINT_DIR = CACHE_DIR / "checkpoints"
+"""The directory where the checkpoints of resumable searches are kept."""
+
+
+class SearchCheckpoint:
+    """
+    Saves the progress of a traversal to disk every `interval` seconds,
+    so that a search stopped, crashed or closed with the window can be
+    resumed by a later run instead of starting over. It travels to the
+    searcher as `SearchContext.checkpoint`.
+
+    The progress is the frontier of the traversal, the directories
+    completed or on the frontier, and the matches found so far, which
+    are appended to a log next to the checkpoint. A directory leaves
+    the frontier when the searcher calls `complete` with its
+    subdirectories and matches, which join the frontier and the visited
+    directories at once, so a checkpoint is consistent whatever threads
+    scan what: resuming re-scans the directories that were being
+    scanned, and no others, and finds none of their subdirectories
+    visited already.
+
+    Searchers call `begin` for the directories to start from, which
+    first replays the logged matches into the queue when resuming, then
+    `complete` for every directory, then `finish`. A completed search
+    deletes its checkpoint; a stopped one saves it a last time.
+    """
+
+    _VERSION = 1
+    """The version of the on-disk format."""
+
+    MAX_AGE = 30 * 24 * 3600
+    """The age in seconds past which checkpoints are deleted as stale."""
+
+    def __init__(self, identity: tuple, interval: float = 30.0) -> None:
+        """
+        Args:
+            identity:
+                Whatever tells the search apart from the others, such as
+                its root, searcher, text and options; searches of equal
+                identities share their checkpoint.
+            interval:
+                The least time between two saves, in seconds.
+        """
+        self.identity = identity
+        self.interval = interval
+        digest = sha1(repr(identity).encode("utf-8", "surrogateescape"))
+        self.path = CHECKPOINT_DIR / f"{digest.hexdigest()}.ckpt"
+        """The file of the checkpoint."""
+        self._pthLog = self.path.with_suffix(".log")
+        """The file the matches are logged to, as pickled lists."""
+        self._lock = threading.Lock()
+        self._pending: dict[str, None] = {}
+        """The directories not scanned yet, in the order they were found."""
+        self._visited: set[tuple[int, int]] = set()
+        """
+        The `(st_dev, st_ino)` of the directories completed or pending,
+        which the pruner is told were visited when resuming.
+        """
+        self._pruner: Pruner | None = None
+        self._logObj: BinaryIO | None = None
+        """The open match log, or `None` if checkpointing failed."""
+        self._lastSave = 0.0
+        """The `monotonic` time the checkpoint was last saved."""
+        self.nMatches = 0
+        """The number of matches logged, those of earlier runs included."""
+        self.resumedAt: float | None = None
+        """The time the resumed checkpoint was saved, if one was resumed."""
+
+    def __reduce__(self):
+        # Only the identity travels, e.g. to a worker process, which
+        # opens the checkpoint on its own...
+        return type(self), (self.identity, self.interval)
+
+    def begin(
+            self,
+            root_dir: str,
+            pruner: Pruner,
+            q: Queue[FsSearchLocation | FsSearchMatch],
+            ) -> list[str]:
+        """
+        Returns the directories to start the traversal from: the pending
+        ones of a saved checkpoint, whose matches are then put in the
+        queue first, or the root. The pruner must have begun the root.
+        """
+        self._pruner = pruner
+        pruner.trackKeys()
+        self._lastSave = monotonic()
+        self._purgeStale()
+        state = self._load()
+        try:
+            CHECKPOINT_DIR.mkdir(parents=True, exist_ok=True)
+            if state is None:
+                self._logObj = open(self._pthLog, "wb")
+            else:
+                self._logObj = open(self._pthLog, "r+b")
+                self._logObj.truncate(state["logSize"])
+        except OSError as err:
+            logging.warning(f"Cannot checkpoint the search: {err}")
+            self._logObj = None
+            state = None
+        if state is None:
+            self._pending = {str(root_dir): None}
+            self._visited = pruner.getVisited()
+            return [str(root_dir)]
+        # Resuming where the checkpoint left off...
+        self._pending = dict.fromkeys(state["pending"])
+        self.nMatches = state["nMatches"]
+        self.resumedAt = state["time"]
+        pruner.addVisited(state["visited"])
+        self._visited = pruner.getVisited()
+        self._replay(q) # type: ignore
+        return list(self._pending)
+
+    def _purgeStale(self) -> None:
+        """Deletes the checkpoints and logs older than `MAX_AGE`."""
+        oldest = time() - self.MAX_AGE
+        try:
+            with os.scandir(CHECKPOINT_DIR) as entries:
+                for entry in entries:
+                    if entry.stat().st_mtime < oldest:
+                        os.unlink(entry.path)
+        except OSError:
+            pass
+
+    def _load(self) -> dict | None:
+        """Returns the state of the saved checkpoint, if any."""
+        try:
+            with open(self.path, "rb") as fileObj:
+                version, state = pickle.load(fileObj)
+        except FileNotFoundError:
+            return None
+        except Exception as err:
+            logging.error(f"Cannot load the checkpoint '{self.path}': {err}")
+            return None
+        if version != self._VERSION or state["identity"] != self.identity:
+            return None
+        return state
+
+    def _replay(self, q: Queue[FsSearchLocation | FsSearchMatch]) -> None:
+        """Puts the logged matches in the queue, leaving the log at its end."""
+        logObj: BinaryIO = self._logObj # type: ignore
+        logObj.seek(0)
+        while True:
+            try:
+                matches = pickle.load(logObj)
+            except (EOFError, pickle.UnpicklingError):
+                break
+            for match in matches:
+                q.put(match)
+
+    def complete(
+            self,
+            pth_dir: str,
+            subdirs: list[str],
+            matches: list[FsSearchMatch],
+            ) -> None:
+        """
+        Records that the directory was scanned, with the subdirectories
+        to scan next and the matches it held. Saves the checkpoint if
+        the interval has passed. Safe to call from several threads.
+        """
+        keys = self._pruner.takeKeys(subdirs) if self._pruner else []
+        with self._lock:
+            self._pending.pop(pth_dir, None)
+            self._pending.update(dict.fromkeys(subdirs))
+            self._visited.update(keys)
+            if self._logObj is None:
+                return
+            if matches:
+                pickle.dump(matches, self._logObj, pickle.HIGHEST_PROTOCOL)
+                self.nMatches += len(matches)
+            if monotonic() - self._lastSave >= self.interval:
+                self._save()
+
+    def finish(self, completed: bool) -> None:
+        """
+        Ends the traversal: deletes the checkpoint if it completed, or
+        saves it a last time if it was stopped.
+        """
+        with self._lock:
+            if self._logObj is None:
+                return
+            if not completed:
+                self._save()
+            self._logObj.close()
+            self._logObj = None
+            if completed:
+                for pthFile in (self.path, self._pthLog):
+                    try:
+                        pthFile.unlink()
+                    except OSError:
+                        pass
+
+    def _save(self) -> None:
+        """Saves the checkpoint atomically. The lock must be held."""
+        logObj: BinaryIO = self._logObj # type: ignore
+        self._lastSave = monotonic()
+        try:
+            logObj.flush()
+            state = {
+                "identity": self.identity,
+                "pending": list(self._pending),
+                "visited": self._visited,
+                "nMatches": self.nMatches,
+                "logSize": logObj.tell(),
+                "time": time(),}
+            pthTemp = self.path.with_suffix(".tmp")
+            with open(pthTemp, "wb") as fileObj:
+                pickle.dump(
+                    (self._VERSION, state),
+                    fileObj,
+                    pickle.HIGHEST_PROTOCOL)
+            os.replace(pthTemp, self.path)
+        except OSError as err:
+            logging.warning(f"Cannot checkpoint the search: {err}")
+
+    def summary(self) -> str:
+        """
+        Describes the resumption in one short line for a status bar, or
+        returns an empty string if nothing was resumed.
+        """
+        if self.resumedAt is None:
+            return ""
+        hours = (time() - self.resumedAt) / 3600
+        return f"resumed a checkpoint of {hours:.1f} h ago"
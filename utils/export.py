@@ -0,0 +1,223 @@
+#
+#
+#
+
+from abc import ABC, abstractmethod
+import csv
+import json
+import os
+from pathlib import Path
+import sqlite3
+from typing import Iterable
+
+from megacodist.fs import FsSearchMatch
+
+
+ExportRow = tuple[str, str, str, int]
+"""A result as exported: `(parent path, name, details, byte offset)`"""
+
+
+class ResultSink(ABC):
+    """
+    The base of the destinations search results can be exported to. A
+    sink is fed rows as they arrive, from a running search or from a
+    `ResultStore`, and keeps nothing but its write buffers in memory.
+    Raises `OSError` if the file cannot be opened or written.
+    """
+
+    SUFFIXES: tuple[str, ...] = ()
+    """The file suffixes this sink is chosen for by `openSink`."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        """The file the results are written to."""
+        self.nRows = 0
+        """The number of rows written so far."""
+
+    def writeMatches(self, matches: Iterable[FsSearchMatch]) -> None:
+        """Writes a batch of search matches."""
+        self.writeRows(_matchToRow(match) for match in matches)
+
+    @abstractmethod
+    def writeRows(self, rows: Iterable[ExportRow]) -> None:
+        """Writes a batch of rows."""
+        pass
+
+    @abstractmethod
+    def close(self) -> None:
+        """Flushes everything written and closes the file."""
+        pass
+
+
+class CsvSink(ResultSink):
+    """Writes the results as CSV with a header row."""
+
+    SUFFIXES = (".csv",)
+
+    HEADER = ("path", "name", "folder", "details", "offset")
+
+    def __init__(self, path: Path) -> None:
+        super().__init__(path)
+        self._fileObj = open(
+            path,
+            "w",
+            encoding="utf-8",
+            errors="surrogateescape",
+            newline="")
+        self._writer = csv.writer(self._fileObj)
+        self._writer.writerow(self.HEADER)
+
+    def writeRows(self, rows: Iterable[ExportRow]) -> None:
+        nRows = self.nRows
+        writeRow = self._writer.writerow
+        for parent, name, details, offset in rows:
+            writeRow((
+                os.path.join(parent, name),
+                name,
+                parent,
+                details,
+                offset if offset >= 0 else ""))
+            nRows += 1
+        self.nRows = nRows
+
+    def close(self) -> None:
+        self._fileObj.close()
+
+
+class NdjsonSink(ResultSink):
+    """
+    Writes the results as one JSON object per line, in the format of
+    the `--ndjson` output of the command line.
+    """
+
+    SUFFIXES = (".ndjson", ".jsonl")
+
+    def __init__(self, path: Path) -> None:
+        super().__init__(path)
+        self._fileObj = open(path, "wb")
+
+    def writeRows(self, rows: Iterable[ExportRow]) -> None:
+        lines: list[bytes] = []
+        for parent, name, details, offset in rows:
+            record: dict = {"path": os.path.join(parent, name)}
+            if details:
+                record["details"] = details
+            if offset >= 0:
+                record["offset"] = offset
+            lines.append(json.dumps(record, ensure_ascii=False).encode(
+                "utf-8", "surrogateescape"))
+        if lines:
+            self._fileObj.write(b"\n".join(lines) + b"\n")
+            self.nRows += len(lines)
+
+    def close(self) -> None:
+        self._fileObj.close()
+
+
+class SqliteSink(ResultSink):
+    """
+    Writes the results into the `results` table of an SQLite database,
+    replacing it if it exists. Rows are inserted in transactions of
+    `BATCH_ROWS` rows, so millions of them are written at disk speed.
+    """
+
+    SUFFIXES = (".db", ".sqlite", ".sqlite3")
+
+    BATCH_ROWS = 10_000
+    """The number of rows inserted per transaction."""
+
+    def __init__(self, path: Path) -> None:
+        super().__init__(path)
+        try:
+            self._conn = sqlite3.connect(path, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode = WAL")
+            self._conn.execute("PRAGMA synchronous = NORMAL")
+            self._conn.execute("DROP TABLE IF EXISTS results")
+            self._conn.execute(
+                "CREATE TABLE results ("
+                "path TEXT NOT NULL, name TEXT NOT NULL, "
+                "folder TEXT NOT NULL, details TEXT, offset INTEGER)")
+        except sqlite3.Error as err:
+            raise OSError(f"cannot open '{path}': {err}") from err
+        self._pending: list[tuple[str, str, str, str | None, int | None]] = []
+        """The rows not inserted yet."""
+
+    def writeRows(self, rows: Iterable[ExportRow]) -> None:
+        for parent, name, details, offset in rows:
+            parent = _toSqlText(parent)
+            name = _toSqlText(name)
+            self._pending.append((
+                os.path.join(parent, name),
+                name,
+                parent,
+                _toSqlText(details) if details else None,
+                offset if offset >= 0 else None))
+            if len(self._pending) >= self.BATCH_ROWS:
+                self._flush()
+
+    def _flush(self) -> None:
+        """Inserts the pending rows in one transaction."""
+        if not self._pending:
+            return
+        try:
+            with self._conn:
+                self._conn.execute("BEGIN")
+                self._conn.executemany(
+                    "INSERT INTO results VALUES (?, ?, ?, ?, ?)",
+                    self._pending)
+        except sqlite3.Error as err:
+            raise OSError(f"cannot write '{self.path}': {err}") from err
+        self.nRows += len(self._pending)
+        self._pending = []
+
+    def close(self) -> None:
+        try:
+            self._flush()
+        finally:
+            self._conn.close()
+
+
+_SINKS: tuple[type[ResultSink], ...] = (CsvSink, NdjsonSink, SqliteSink)
+
+
+EXPORT_FILE_TYPES = [
+    ("CSV", "*.csv"),
+    ("NDJSON", "*.ndjson *.jsonl"),
+    ("SQLite", "*.db *.sqlite *.sqlite3"),]
+"""The file types of the export formats, for file dialogs."""
+
+
+def openSink(path: Path) -> ResultSink:
+    """
+    Opens the sink of the format the suffix of the path tells. Raises
+    `ValueError` for unknown suffixes and `OSError` if the file cannot
+    be created.
+    """
+    suffix = path.suffix.lower()
+    for sinkCls in _SINKS:
+        if suffix in sinkCls.SUFFIXES:
+            return sinkCls(path)
+    raise ValueError(f"unknown export format '{suffix}'")
+
+
+def _matchToRow(match: FsSearchMatch) -> ExportRow:
+    parent, name = os.path.split(os.fspath(match.path))
+    return (
+        parent,
+        name,
+        getattr(match, "details", ""),
+        getattr(match, "offset", -1))
+
+
+def _toSqlText(text: str) -> str:
+    """
+    Makes the text storable by SQLite, which rejects the lone surrogates
+    of undecodable file names; they become replacement characters.
+    """
+    try:
+        text.encode("utf-8")
+        return text
+    except UnicodeEncodeError:
+        return text.encode("utf-8", "surrogateescape").decode(
+            "utf-8",
+            "replace")
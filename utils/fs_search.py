@@ -1,26 +1,164 @@
 #
-# 
+#
 #
 
+from collections.abc import Iterator, Mapping
+import json
 from pathlib import Path
 import logging
+import os
+from typing import Any
 
 from megacodist.fs import IFsSearchable
 
+from utils.settings import CACHE_DIR
+
+
+_APP_DIR = Path(__file__).resolve().parent.parent
+"""The root directory of the application."""
+
+MANIFEST_PATH = CACHE_DIR / "searchers.json"
+"""
+The cached manifest of searcher modules, mapping every module to its
+modification stamp and the searchers it defines.
+"""
+
+_MANIFEST_VERSION = 1
+
+
+class FsSearchers(Mapping[str, type[IFsSearchable]]):
+    """
+    A read-only mapping between searcher names and their classes whose
+    modules are imported only when a class is first looked up.
+    """
+
+    def __init__(self) -> None:
+        self._mpNameLoc: dict[str, tuple[str, str]] = {}
+        """
+        The location of every searcher class:
+        `searcher name => (dotted module name, class qualified name)`
+        """
+        self._mpNameCls: dict[str, type[IFsSearchable]] = {}
+        """
+        The searcher classes imported so far:
+        `searcher name => searcher class`
+        """
+
+    def add(
+            self,
+            name: str,
+            mod_dotted: str,
+            qual_name: str,
+            cls: type[IFsSearchable] | None = None,
+            ) -> None:
+        """Registers a searcher, optionally with its class at hand."""
+        self._mpNameLoc[name] = (mod_dotted, qual_name)
+        if cls is None:
+            self._mpNameCls.pop(name, None)
+        else:
+            self._mpNameCls[name] = cls
+
+    def update(self, other: "FsSearchers") -> None:
+        """Adds all searchers of the other mapping to this one."""
+        self._mpNameLoc.update(other._mpNameLoc)
+        self._mpNameCls.update(other._mpNameCls)
+
+    def getLocation(self, name: str) -> tuple[str, str]:
+        """
+        Returns the dotted module name and the qualified class name of
+        the searcher without importing it. Raises `KeyError` if there is
+        no such searcher.
+        """
+        return self._mpNameLoc[name]
 
-def loadFsSearchers(relative_dir: Path) -> dict[str, type[IFsSearchable]]:
+    def __getitem__(self, name: str) -> type[IFsSearchable]:
+        """
+        Returns the class of the searcher, importing its module on the
+        first lookup. Raises `KeyError` if there is no such searcher and
+        `ImportError` if it cannot be loaded.
+        """
+        try:
+            return self._mpNameCls[name]
+        except KeyError:
+            pass
+        from importlib import import_module
+        modDotted, qualName = self._mpNameLoc[name]
+        itemObject: Any = import_module(modDotted)
+        for attr in qualName.split("."):
+            itemObject = getattr(itemObject, attr, None)
+        if not (isinstance(itemObject, type)
+                and issubclass(itemObject, IFsSearchable)):
+            raise ImportError(
+                f"'{modDotted}' no longer defines the '{name}' searcher")
+        self._mpNameCls[name] = itemObject
+        return itemObject
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._mpNameLoc)
+
+    def __len__(self) -> int:
+        return len(self._mpNameLoc)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({list(self._mpNameLoc)!r})"
+
+
+def _readManifest() -> dict[str, dict]:
+    """
+    Returns the cached manifest as a mapping between dotted module names
+    and their records, or an empty one if it is missing or unreadable.
     """
-    Loads all file system searcher modules from the specified relative
-    directory and returns a dictionary mapping searcher names to their
+    try:
+        with open(MANIFEST_PATH, "r", encoding="utf-8") as fileObj:
+            manifest = json.load(fileObj)
+    except FileNotFoundError:
+        return {}
+    except Exception as err:
+        logging.debug(f"Ignoring the searcher manifest: {err}")
+        return {}
+    if manifest.get("version") != _MANIFEST_VERSION:
+        return {}
+    return manifest.get("modules", {})
+
+
+def _writeManifest(modules: dict[str, dict]) -> None:
+    """Persists the manifest records of the modules."""
+    try:
+        with open(MANIFEST_PATH, "r", encoding="utf-8") as fileObj:
+            manifest = json.load(fileObj)
+        if manifest.get("version") != _MANIFEST_VERSION:
+            raise ValueError
+    except Exception:
+        manifest = {"version": _MANIFEST_VERSION, "modules": {}}
+    manifest["modules"].update(modules)
+    try:
+        MANIFEST_PATH.parent.mkdir(parents=True, exist_ok=True)
+        pthTemp = MANIFEST_PATH.with_suffix(".tmp")
+        with open(pthTemp, "w", encoding="utf-8") as fileObj:
+            json.dump(manifest, fileObj, indent=1)
+        os.replace(pthTemp, MANIFEST_PATH)
+    except OSError as err:
+        logging.debug(f"Cannot write the searcher manifest: {err}")
+
+
+def loadFsSearchers(relative_dir: Path) -> FsSearchers:
+    """
+    Finds all file system searcher modules in the specified relative
+    directory and returns a mapping between searcher names and their
     corresponding classes.
 
+    The searchers of every module are looked up in a cached manifest
+    keyed by the modification stamp of the module. Only modules that
+    are new or changed since are imported here; the others are imported
+    when one of their searchers is first used.
+
     Args:
         relative_dir:
             The relative path from application root directory to
             the directory containing the searcher modules.
 
     Returns:
-        A dictionary where keys are searcher names and values are their
+        A mapping where keys are searcher names and values are their
         corresponding classes.
     """
     # Declaring variables ---------------------------------
@@ -30,28 +168,49 @@ def loadFsSearchers(relative_dir: Path) -> dict[str, type[IFsSearchable]]:
     pthSearcher: Path
     modObj: ModuleType
     # Loading pages & wizards -----------------------------
-    searchers: dict[str, type[IFsSearchable]] = {}
+    searchers = FsSearchers()
+    manifest = _readManifest()
+    changed: dict[str, dict] = {}
     # Initializing & loading the other module of commands package...
     modNames = [
-        pthSearcher.relative_to(relative_dir)
-        for pthSearcher in relative_dir.glob("*.py")
+        pthSearcher.relative_to(_APP_DIR / relative_dir)
+        for pthSearcher in (_APP_DIR / relative_dir).glob("*.py")
         if not pthSearcher.name.startswith("_")]
     dirDotted = ".".join(relative_dir.parts)
     for pthSearcher in modNames:
         try:
             # Path('a/b/c/d.py') => 'a.b.c.d'...
             modDotted = ".".join(pthSearcher.with_suffix("").parts)
-            modObj = import_module(f"{dirDotted}.{modDotted}")
+            modDotted = f"{dirDotted}.{modDotted}"
+            stat = (_APP_DIR / relative_dir / pthSearcher).stat()
+            stamp = [stat.st_mtime_ns, stat.st_size]
+            record = manifest.get(modDotted)
+            if record is not None and record["stamp"] == stamp:
+                for name, qualName in record["searchers"].items():
+                    searchers.add(name, modDotted, qualName)
+                continue
+            modObj = import_module(modDotted)
+            record = {"stamp": stamp, "searchers": {}}
             for itemName in dir(modObj):
-                itemObject = getattr(modObj, itemName)
+                itemObject: Any = getattr(modObj, itemName)
                 if (
                         isinstance(itemObject, type)
                         and issubclass(itemObject, IFsSearchable)
                         and itemObject.__module__ == modObj.__name__
                         ):
-                    searchers[itemObject.name] = itemObject
+                    searcherName: str = getattr(itemObject, "name")
+                    searchers.add(
+                        searcherName,
+                        modDotted,
+                        itemObject.__qualname__,
+                        itemObject)
+                    record["searchers"][searcherName] = \
+                        itemObject.__qualname__
+            changed[modDotted] = record
         except Exception as e:
             logging.error("Error loading searcher module: "
                 f"{(relative_dir / pthSearcher)}. Error: {e}")
             continue
+    if changed:
+        _writeManifest(changed)
     return searchers
@@ -0,0 +1,107 @@
+#
+#
+#
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+from typing import NamedTuple
+
+
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+
+IN_CLOEXEC = 0o2000000
+
+_EVENT_HEADER = struct.Struct("iIII")
+"""The fixed part of `struct inotify_event`: wd, mask, cookie, len."""
+
+
+class InotifyEvent(NamedTuple):
+    wd: int
+    """The watch descriptor the event was raised for."""
+    mask: int
+    """The `IN_*` bits describing the event."""
+    cookie: int
+    """Pairs the `IN_MOVED_FROM` and `IN_MOVED_TO` of one rename."""
+    name: str
+    """The name of the entry inside the watched directory, if any."""
+
+
+def isAvailable() -> bool:
+    """Determines whether inotify can be used on this platform."""
+    return sys.platform.startswith("linux") and bool(
+        ctypes.util.find_library("c"))
+
+
+class Inotify:
+    """
+    A thin `ctypes` wrapper around the Linux inotify API. Raises
+    `OSError` on creation if inotify is not available.
+    """
+
+    def __init__(self) -> None:
+        if not isAvailable():
+            raise OSError("inotify is only available on Linux")
+        self._libc = ctypes.CDLL(
+            ctypes.util.find_library("c"),
+            use_errno=True)
+        self._libc.inotify_add_watch.argtypes = [
+            ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._fd: int = self._libc.inotify_init1(IN_CLOEXEC)
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+    def addWatch(self, path: str | os.PathLike, mask: int) -> int:
+        """
+        Watches the path for the events in the mask and returns the
+        watch descriptor. Raises `OSError` on failure, notably `ENOSPC`
+        when the per-user watch limit is reached.
+        """
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), str(path))
+        return wd
+
+    def removeWatch(self, wd: int) -> None:
+        """Stops watching the watch descriptor, ignoring stale ones."""
+        self._libc.inotify_rm_watch(self._fd, wd)
+
+    def read(self, timeout: float | None = None) -> list[InotifyEvent]:
+        """
+        Waits at most `timeout` seconds for events and returns all of
+        them that are pending, or an empty list on timeout.
+        """
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return []
+        buffer = os.read(self._fd, 64 * 1024)
+        events: list[InotifyEvent] = []
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, cookie, length = _EVENT_HEADER.unpack_from(
+                buffer, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(
+                buffer[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            events.append(InotifyEvent(wd, mask, cookie, name))
+        return events
+
+    def close(self) -> None:
+        """Releases the inotify instance and all of its watches."""
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
@@ -0,0 +1,210 @@
+#
+#
+#
+
+from collections import OrderedDict
+import os
+import threading
+from time import monotonic, time
+from typing import Callable
+
+
+class _Listing:
+    """A cached listing of a directory."""
+
+    __slots__ = ("entries", "mtimeNs", "ino", "scanTime", "nBytes")
+
+    def __init__(
+            self,
+            entries: list[os.DirEntry],
+            mtime_ns: int,
+            ino: int,
+            scan_time: float,
+            n_bytes: int,
+            ) -> None:
+        self.entries = entries
+        self.mtimeNs = mtime_ns
+        """The `st_mtime_ns` of the directory when it was listed."""
+        self.ino = ino
+        """The inode of the directory when it was listed."""
+        self.scanTime = scan_time
+        """The `monotonic` time the directory was listed at."""
+        self.nBytes = n_bytes
+        """The estimated memory of the listing."""
+
+
+class ListingCache:
+    """
+    A process-wide, least-recently-used cache of directory listings, so
+    that consecutive searches over the same tree read it from memory
+    rather than from the disk or the network.
+
+    It keeps the `os.DirEntry` objects themselves, so searchers keep
+    their usual entries: the names and types come with the listing, and
+    the `stat` results, hence sizes and modification times, one search
+    took are cached by the entries for the next. A listing is served as
+    long as the directory keeps its modification time and inode, which
+    change whenever an entry is added, removed or renamed, and is not
+    older than `max_age`: sizes and times of files edited in place,
+    which leaves their directory unchanged, lag by at most that long.
+
+    A directory modified less than `_RACY_WINDOW` before it is listed is
+    not cached, as a change in the same tick of a coarse clock would go
+    unseen. Checking a cached listing costs one `stat` of the directory.
+    """
+
+    _ENTRY_BYTES = 800
+    """
+    The estimated memory of a cached entry besides its path, including
+    the `stat` result most entries end up holding.
+    """
+
+    _LISTING_BYTES = 200
+    """The estimated memory of a cached listing besides its entries."""
+
+    _RACY_WINDOW = 2.0
+    """
+    The seconds within which a directory modified before being listed is
+    not cached, which covers the granularity of the common file systems.
+    """
+
+    def __init__(self, max_bytes: int, max_age: float = 300.0) -> None:
+        """
+        Args:
+            max_bytes:
+                The memory the listings may take, as estimated; zero
+                disables the cache.
+            max_age:
+                The seconds after which a listing is read again even if
+                its directory did not change.
+        """
+        self._maxBytes = max_bytes
+        self._maxAge = max_age
+        self._lock = threading.Lock()
+        self._listings: OrderedDict[str, _Listing] = OrderedDict()
+        """The cached listings, least recently used first."""
+        self._nBytes = 0
+        """The estimated memory of all cached listings."""
+        self.nHits = 0
+        """The number of listings served from the cache."""
+        self.nMisses = 0
+        """The number of listings read from the file system."""
+
+    def configure(self, max_bytes: int, max_age: float) -> None:
+        """Changes the memory cap and the age limit, evicting if need be."""
+        with self._lock:
+            self._maxBytes = max_bytes
+            self._maxAge = max_age
+            self._evict()
+
+    def clear(self) -> None:
+        """Drops all cached listings."""
+        with self._lock:
+            self._listings.clear()
+            self._nBytes = 0
+
+    def scan(
+            self,
+            pth_dir: str | os.PathLike,
+            should_stop: Callable[[], bool] | None = None,
+            stop_check: int = 1024,
+            ) -> list[os.DirEntry]:
+        """
+        Returns the entries of the directory like `os.scandir` does,
+        from the cache if its listing is still valid. Raises `OSError`
+        if the directory cannot be read.
+
+        While reading the directory, `should_stop` is called every
+        `stop_check` entries; once it returns `True`, the listing read
+        so far is returned as is and not cached, so callers must check
+        for a stop themselves afterwards.
+        """
+        return self.scanWithMtime(pth_dir, should_stop, stop_check)[0]
+
+    def scanWithMtime(
+            self,
+            pth_dir: str | os.PathLike,
+            should_stop: Callable[[], bool] | None = None,
+            stop_check: int = 1024,
+            ) -> tuple[list[os.DirEntry], float | None]:
+        """
+        Like `scan`, but also returns the `st_mtime` of the directory,
+        or `None` when the cache is disabled, as it then spares the
+        `stat` of the directory.
+        """
+        # Declaring variables ---------------------------------
+        pthDir = os.fspath(pth_dir)
+        listing: _Listing | None
+        entries: list[os.DirEntry] = []
+        # Looking the listing up ------------------------------
+        if self._maxBytes <= 0:
+            # Disabled, so sparing the stat of the directory...
+            with os.scandir(pthDir) as dirEntries:
+                for nEntries, entry in enumerate(dirEntries, 1):
+                    if (should_stop and nEntries % stop_check == 0
+                            and should_stop()):
+                        break
+                    entries.append(entry)
+            return entries, None
+        stat = os.stat(pthDir)
+        with self._lock:
+            listing = self._listings.get(pthDir)
+            if (listing is not None
+                    and listing.mtimeNs == stat.st_mtime_ns
+                    and listing.ino == stat.st_ino
+                    and monotonic() - listing.scanTime <= self._maxAge):
+                self._listings.move_to_end(pthDir)
+                self.nHits += 1
+                return list(listing.entries), stat.st_mtime
+            self.nMisses += 1
+        # Reading the directory -------------------------------
+        scanTime = monotonic()
+        with os.scandir(pthDir) as dirEntries:
+            for nEntries, entry in enumerate(dirEntries, 1):
+                if (should_stop and nEntries % stop_check == 0
+                        and should_stop()):
+                    return entries, stat.st_mtime
+                entries.append(entry)
+        if time() - stat.st_mtime < self._RACY_WINDOW:
+            return entries, stat.st_mtime
+        nBytes = self._LISTING_BYTES + len(pthDir) + sum(
+            self._ENTRY_BYTES + len(entry.path) + len(entry.name)
+            for entry in entries)
+        with self._lock:
+            old = self._listings.pop(pthDir, None)
+            if old is not None:
+                self._nBytes -= old.nBytes
+            if nBytes <= self._maxBytes:
+                self._listings[pthDir] = _Listing(
+                    list(entries),
+                    stat.st_mtime_ns,
+                    stat.st_ino,
+                    scanTime,
+                    nBytes)
+                self._nBytes += nBytes
+                self._evict()
+        return entries, stat.st_mtime
+
+    def _evict(self) -> None:
+        """
+        Drops the least recently used listings until they fit in the
+        cap. The lock must be held.
+        """
+        while self._listings and self._nBytes > self._maxBytes:
+            _, listing = self._listings.popitem(last=False)
+            self._nBytes -= listing.nBytes
+
+    def summary(self) -> str:
+        """Describes the use of the cache in one short line."""
+        with self._lock:
+            return (
+                f"{len(self._listings):,} listings cached in "
+                f"{self._nBytes / (1 << 20):.1f} MB, {self.nHits:,} hits, "
+                f"{self.nMisses:,} misses")
+
+
+LISTING_CACHE = ListingCache(64 << 20)
+"""
+The listing cache shared by all searchers of the process, which front
+ends size from their settings.
+"""
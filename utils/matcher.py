@@ -0,0 +1,297 @@
+#
+#
+#
+
+import enum
+import fnmatch
+from pathlib import Path
+import re
+from typing import Callable, Iterator, Sequence
+
+from megacodist.fs import FsSearchMatch, FsSearchOptions
+
+from utils.aho_corasick import AhoCorasick
+
+
+class MatchMode(enum.Enum):
+    """The ways the search text can be matched against entry names."""
+
+    SUBSTRING = "Substring"
+    """The name contains the text."""
+    GLOB = "Glob"
+    """The whole name matches the text as a shell wildcard pattern."""
+    REGEX = "Regex"
+    """The name contains a match of the text as a regular expression."""
+    FUZZY = "Fuzzy"
+    """The characters of the text appear in the name in order."""
+    ANY_OF = "Any of"
+    """The name contains any of several patterns."""
+
+
+PATTERNS_SEP = ";"
+"""
+The separator of the patterns of an `ANY_OF` search as typed; it is
+doubled to stand for itself within a pattern.
+"""
+
+
+def splitPatterns(text: str) -> list[str]:
+    """
+    Splits the text of an `ANY_OF` search into its patterns, stripped,
+    leaving out the blank ones. The inverse of `joinPatterns`.
+    """
+    # Splitting on single separators only, as doubled ones are kept...
+    patterns = [""]
+    for idx, part in enumerate(text.split(PATTERNS_SEP * 2)):
+        pieces = part.split(PATTERNS_SEP)
+        if idx:
+            patterns[-1] += PATTERNS_SEP
+        patterns[-1] += pieces[0]
+        patterns.extend(pieces[1:])
+    return [pattern.strip() for pattern in patterns if pattern.strip()]
+
+
+def joinPatterns(patterns: Sequence[str]) -> str:
+    """Returns the patterns as the text of an `ANY_OF` search."""
+    sepSep = PATTERNS_SEP * 2
+    return f"{PATTERNS_SEP} ".join(
+        pattern.replace(PATTERNS_SEP, sepSep) for pattern in patterns)
+
+
+class FsPatternMatch(FsSearchMatch):
+    """A match of an `ANY_OF` search, telling which patterns hit."""
+
+    def __init__(self, path: Path, patterns: tuple[str, ...]) -> None:
+        super().__init__(path)
+        self.patterns = patterns
+        """The patterns occurring in the name."""
+
+    @property
+    def details(self) -> str:
+        return ", ".join(self.patterns)
+
+
+class FsContentMatch(FsSearchMatch):
+    """A line of a file whose content matches a content search."""
+
+    def __init__(self, path: Path, line: int, offset: int, text: str) -> None:
+        super().__init__(path)
+        self.line = line
+        """The 1-based number of the matching line."""
+        self.offset = offset
+        """The offset of the match from the start of the file, in bytes."""
+        self.text = text
+        """The matching line, possibly truncated."""
+
+    @property
+    def details(self) -> str:
+        return f"{self.line}:{self.offset}: {self.text}"
+
+
+class NameMatcher:
+    """
+    Compiles a search text and its `FsSearchOptions` once into the
+    fastest predicate for its `MatchMode`, so searchers do not re-derive
+    case-folding and whole-word logic for every entry. Raises `re.error`
+    if a regular expression is invalid.
+    """
+
+    def __init__(
+            self,
+            search: str,
+            options: FsSearchOptions,
+            mode: MatchMode = MatchMode.SUBSTRING,
+            patterns: Sequence[str] = (),
+            ) -> None:
+        self.search = search
+        """The search text as entered by the user."""
+        self.mode = mode
+        self.patterns = tuple(patterns) or (search,)
+        """The patterns of an `ANY_OF` search, or the text alone."""
+        self.matchCase = bool(options & FsSearchOptions.MATCH_CASE)
+        self.matchWhole = bool(options & FsSearchOptions.MATCH_WHOLE)
+        self.literals: tuple[str, ...] | None = None
+        """
+        Literals one of which every matching name contains once it is
+        case-folded (unless `matchCase`), or `None` if the mode has no
+        such literals. Index searchers use them for pre-filtering.
+        """
+        self._automaton: AhoCorasick | None = None
+        """The automaton of the patterns of an `ANY_OF` query."""
+        self._batch: Callable[[Sequence[str]], list[int]] | None = None
+        """The batch form of the predicate, where one is worth having."""
+        self._pred: Callable[[str], bool] = self._compile()
+
+    def _compile(self) -> Callable[[str], bool]:
+        # Declaring variables ---------------------------------
+        search = self.search
+        flags = 0 if self.matchCase else re.IGNORECASE
+        pattern: re.Pattern
+        # Compiling per mode ----------------------------------
+        match self.mode:
+            case MatchMode.SUBSTRING if not self.matchWhole:
+                literal = self._fold(search)
+                self.literals = (literal,)
+                # Inlining the test spares a call per name in batches...
+                if self.matchCase:
+                    self._batch = lambda names: [
+                        idx for idx, name in enumerate(names)
+                        if literal in name]
+                    return lambda name: literal in name
+                self._batch = lambda names: [
+                    idx for idx, name in enumerate(names)
+                    if literal in name.casefold()]
+                return lambda name: literal in name.casefold()
+            case MatchMode.SUBSTRING:
+                self.literals = (self._fold(search),)
+                pattern = re.compile(
+                    rf"(?<!\w){re.escape(search)}(?!\w)",
+                    flags)
+            case MatchMode.GLOB:
+                runs = re.split(r"[*?]|\[[^\]]*\]", search)
+                self.literals = (self._fold(max(runs, key=len)),)
+                if not re.search(r"[*?\[]", search):
+                    literal = self._fold(search)
+                    if self.matchCase:
+                        return lambda name: name == literal
+                    return lambda name: name.casefold() == literal
+                pattern = re.compile(fnmatch.translate(search), flags)
+                return lambda name: pattern.match(name) is not None
+            case MatchMode.REGEX:
+                if self.matchWhole:
+                    search = rf"(?<!\w)(?:{search})(?!\w)"
+                pattern = re.compile(search, flags)
+            case MatchMode.FUZZY:
+                pattern = re.compile(
+                    ".*?".join(re.escape(char) for char in search),
+                    flags | re.DOTALL)
+            case MatchMode.ANY_OF:
+                self.literals = tuple(
+                    self._fold(pat) for pat in self.patterns)
+                automaton = AhoCorasick(list(self.literals))
+                self._automaton = automaton
+                if self.matchWhole:
+                    return lambda name: bool(self.matchPatterns(name))
+                if self.matchCase:
+                    return automaton.findAny
+                return lambda name: automaton.findAny(name.casefold())
+        return lambda name: pattern.search(name) is not None
+
+    def _fold(self, text: str) -> str:
+        return text if self.matchCase else text.casefold()
+
+    def __call__(self, name: str) -> bool:
+        """Determines whether the entry name matches the search."""
+        return self._pred(name)
+
+    def matchPatterns(self, name: str) -> tuple[str, ...]:
+        """
+        Returns the patterns of an `ANY_OF` query occurring in the name,
+        honouring `matchWhole`, or an empty tuple for other modes.
+        """
+        if self._automaton is None:
+            return ()
+        text = self._fold(name)
+        hits: set[int] = set()
+        for end, patIdx in self._automaton.iterMatches(text):
+            if self.matchWhole:
+                start = end - len(self._automaton.patterns[patIdx])
+                if ((start > 0 and _isWordChar(text[start - 1]))
+                        or (end < len(text) and _isWordChar(text[end]))):
+                    continue
+            hits.add(patIdx)
+        return tuple(self.patterns[patIdx] for patIdx in sorted(hits))
+
+    def makeMatch(self, path: Path) -> FsSearchMatch:
+        """
+        Returns the match object of a path accepted by this matcher,
+        telling which patterns hit for `ANY_OF` queries.
+        """
+        if self._automaton is None:
+            return FsSearchMatch(path)
+        return FsPatternMatch(path, self.matchPatterns(path.name))
+
+    def matchMany(self, names: Sequence[str]) -> list[int]:
+        """
+        Matches a batch of names, typically a whole directory, in one
+        call and returns the indexes of those that match.
+        """
+        if self._batch:
+            return self._batch(names)
+        pred = self._pred
+        return [idx for idx, name in enumerate(names) if pred(name)]
+
+
+class ContentMatcher:
+    """
+    Compiles a search text and its `FsSearchOptions` once into a bytes
+    regular expression finding the text in file contents, honouring the
+    `MatchMode` the way `NameMatcher` does for names, except that globs
+    and fuzzy patterns never span lines. The text is encoded as UTF-8
+    and, without `MATCH_CASE`, only ASCII letters are matched regardless
+    of case. Raises `re.error` if a regular expression is invalid.
+    """
+
+    def __init__(
+            self,
+            search: str,
+            options: FsSearchOptions,
+            mode: MatchMode = MatchMode.SUBSTRING,
+            patterns: Sequence[str] = (),
+            ) -> None:
+        self.search = search
+        """The search text as entered by the user."""
+        self.mode = mode
+        self.patterns = tuple(patterns) or (search,)
+        """The patterns of an `ANY_OF` search, or the text alone."""
+        self.matchCase = bool(options & FsSearchOptions.MATCH_CASE)
+        self.matchWhole = bool(options & FsSearchOptions.MATCH_WHOLE)
+        self.pattern: re.Pattern[bytes] = self._compile()
+
+    def _compile(self) -> re.Pattern[bytes]:
+        # Declaring variables ---------------------------------
+        search = self.search
+        flags = re.MULTILINE | (0 if self.matchCase else re.IGNORECASE)
+        # Translating per mode --------------------------------
+        match self.mode:
+            case MatchMode.SUBSTRING:
+                regex = re.escape(search)
+            case MatchMode.GLOB:
+                regex = "".join(
+                    _GLOB_TO_REGEX.get(part)
+                        or (f"[^{part[2:]}" if part.startswith("[!")
+                            else part if part.startswith("[")
+                            else re.escape(part))
+                    for part in re.split(r"(\*|\?|\[[^\]]*\])", search)
+                    if part)
+            case MatchMode.REGEX:
+                regex = search
+            case MatchMode.FUZZY:
+                regex = "[^\n]*?".join(re.escape(char) for char in search)
+            case MatchMode.ANY_OF:
+                # Longest first, so a pattern is not shadowed by its prefix...
+                regex = "|".join(
+                    re.escape(pattern)
+                    for pattern in sorted(
+                        self.patterns,
+                        key=len,
+                        reverse=True))
+        if self.matchWhole:
+            regex = rf"(?<!\w)(?:{regex})(?!\w)"
+        return re.compile(regex.encode("utf-8"), flags)
+
+    def finditer(self, buffer) -> Iterator[re.Match[bytes]]:
+        """
+        Yields the matches in the buffer, which may be `bytes` or any
+        object supporting the buffer protocol such as an `mmap`.
+        """
+        return self.pattern.finditer(buffer)
+
+
+_GLOB_TO_REGEX = {"*": "[^\n]*", "?": "[^\n]"}
+"""The regular expressions of the glob wildcards within a line."""
+
+
+def _isWordChar(char: str) -> bool:
+    """Determines whether the character counts as part of a word."""
+    return char.isalnum() or char == "_"
@@ -0,0 +1,178 @@
+#
+#
+#
+
+import os
+import re
+from time import time
+from typing import Callable, NamedTuple
+
+
+_SIZE_UNITS = {
+    "": 1, "b": 1,
+    "k": 1 << 10, "kb": 1 << 10, "kib": 1 << 10,
+    "m": 1 << 20, "mb": 1 << 20, "mib": 1 << 20,
+    "g": 1 << 30, "gb": 1 << 30, "gib": 1 << 30,
+    "t": 1 << 40, "tb": 1 << 40, "tib": 1 << 40,}
+"""The multipliers of the size units, which are all binary."""
+
+_AGE_UNITS = {
+    "": 86400, "s": 1, "min": 60, "h": 3600, "d": 86400, "w": 7 * 86400,}
+"""The multipliers of the age units; a bare number means days."""
+
+_QUANTITY_RE = re.compile(r"\s*(\d+(?:\.\d*)?|\.\d+)\s*([a-z]*)\s*")
+
+
+def parseSize(text: str) -> int | None:
+    """
+    Parses a size such as `100M`, `1.5 GB` or `512` bytes, or returns
+    `None` for an empty text. Raises `ValueError` if it is malformed.
+    """
+    if not text.strip():
+        return None
+    match = _QUANTITY_RE.fullmatch(text.casefold())
+    if match is None or match[2] not in _SIZE_UNITS:
+        raise ValueError(f"invalid size '{text}'")
+    return int(float(match[1]) * _SIZE_UNITS[match[2]])
+
+
+def parseAge(text: str) -> float | None:
+    """
+    Parses an age such as `7d`, `12h`, `30min` or `2w` into seconds, a
+    bare number meaning days, or returns `None` for an empty text.
+    Raises `ValueError` if it is malformed.
+    """
+    if not text.strip():
+        return None
+    match = _QUANTITY_RE.fullmatch(text.casefold())
+    if match is None or match[2] not in _AGE_UNITS:
+        raise ValueError(f"invalid age '{text}'")
+    return float(match[1]) * _AGE_UNITS[match[2]]
+
+
+class MetaFilter(NamedTuple):
+    """
+    Narrows a search to entries by extension, size and modification
+    time. It travels to searchers as `SearchContext.filters`. The
+    extension is checked from the name alone, so searchers do it before
+    matching names; size and time need `os.DirEntry.stat`, which is
+    free on Windows and costs one `stat` on POSIX, so searchers do it
+    last and only for entries that matched. Directories have no size
+    and no extension: an extension or a size bound leaves them out.
+    """
+
+    extensions: tuple[str, ...] = ()
+    """
+    The case-folded suffixes, dot included, one of which the name of a
+    file must end with, or none to accept any.
+    """
+    minSize: int | None = None
+    """The least size of a file in bytes, if any."""
+    maxSize: int | None = None
+    """The largest size of a file in bytes, if any."""
+    minMtime: float | None = None
+    """The earliest modification time as a timestamp, if any."""
+    maxMtime: float | None = None
+    """The latest modification time as a timestamp, if any."""
+
+    @classmethod
+    def fromText(
+            cls,
+            extensions: str = "",
+            min_size: str = "",
+            max_size: str = "",
+            newer_than: str = "",
+            older_than: str = "",
+            ) -> "MetaFilter":
+        """
+        Makes a filter from text fields as a user types them: extensions
+        separated by commas, semicolons or spaces, sizes for `parseSize`
+        and ages for `parseAge`, counted back from now. Raises
+        `ValueError` if a field is malformed.
+        """
+        exts = tuple(dict.fromkeys(
+            "." + ext.lstrip(".").casefold()
+            for ext in re.split(r"[\s,;]+", extensions)
+            if ext.lstrip(".")))
+        newer = parseAge(newer_than)
+        older = parseAge(older_than)
+        now = time()
+        return cls(
+            exts,
+            parseSize(min_size),
+            parseSize(max_size),
+            None if newer is None else now - newer,
+            None if older is None else now - older)
+
+    def isEmpty(self) -> bool:
+        """Determines whether the filter accepts every entry."""
+        return not self.extensions and not self.needsStat()
+
+    def needsStat(self) -> bool:
+        """Determines whether the filter looks at sizes or times."""
+        return (
+            self.minSize is not None
+            or self.maxSize is not None
+            or self.minMtime is not None
+            or self.maxMtime is not None)
+
+    def acceptsName(self, name: str, is_dir: bool) -> bool:
+        """Checks the cheap part of the filter, needing no `stat`."""
+        if is_dir:
+            return not (
+                self.extensions
+                or self.minSize is not None
+                or self.maxSize is not None)
+        return not self.extensions or name.casefold().endswith(
+            self.extensions)
+
+    def acceptsStat(self, size: int, mtime: float, is_dir: bool) -> bool:
+        """
+        Checks the size and the modification time, as taken from a
+        `stat` result or from the columns of an index.
+        """
+        if not is_dir:
+            if self.minSize is not None and size < self.minSize:
+                return False
+            if self.maxSize is not None and size > self.maxSize:
+                return False
+        if self.minMtime is not None and mtime < self.minMtime:
+            return False
+        if self.maxMtime is not None and mtime > self.maxMtime:
+            return False
+        return True
+
+    def acceptsEntry(
+            self,
+            entry: os.DirEntry,
+            is_dir: bool,
+            follow_links: bool = True,
+            ) -> bool:
+        """
+        Checks the size and the modification time of a directory entry
+        that passed `acceptsName`, through its cached `stat`. Entries
+        that cannot be statted are left out.
+        """
+        if not self.needsStat():
+            return True
+        try:
+            stat = entry.stat(follow_symlinks=follow_links)
+        except OSError:
+            return False
+        return self.acceptsStat(stat.st_size, stat.st_mtime, is_dir)
+
+    def filterNames(
+            self,
+            listing: list[os.DirEntry],
+            is_dir: Callable[[os.DirEntry], bool],
+            ) -> list[os.DirEntry]:
+        """
+        Returns the entries of a directory listing passing
+        `acceptsName`, or the listing itself if all of them do.
+        """
+        if not self.extensions and self.minSize is None and (
+                self.maxSize is None):
+            return listing
+        return [
+            entry for entry in listing
+            if self.acceptsName(entry.name, is_dir(entry))]
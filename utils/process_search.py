@@ -0,0 +1,280 @@
+#
+#
+#
+
+from importlib import import_module
+import logging
+import multiprocessing
+from multiprocessing.connection import Connection
+from pathlib import Path
+from queue import Queue
+import threading
+from time import monotonic
+from typing import Any
+
+from megacodist.fs import (
+    FsSearchOptions, FsSearchLocation, FsSearchMatch, IFsSearchable)
+
+from utils.checkpoint import SearchCheckpoint
+from utils.matcher import MatchMode
+from utils.meta_filter import MetaFilter
+from utils.pruning import Pruner, PruneRules
+from utils.search_context import IContextSearchable, SearchContext, runSearch
+from utils.search_stats import SearchStats
+
+
+_FRAME_BATCH = 0
+"""A frame of results: `(_FRAME_BATCH, items, scan counters)`"""
+_FRAME_DONE = 1
+"""
+The last frame of a finished search: `(_FRAME_DONE, prune counts,
+notes)`
+"""
+_FRAME_ERROR = 2
+"""The last frame of a failed search: `(_FRAME_ERROR, message)`"""
+
+
+class _PipeQueue:
+    """
+    Stands in for the results queue of a searcher in the worker process,
+    gathering the items it is given into frames sent down the pipe. A
+    frame goes out when it is full or old enough; sending blocks while
+    the pipe is full, so a parent that falls behind throttles the
+    searcher. It is safe to `put` from several threads.
+    """
+
+    def __init__(
+            self,
+            conn: Connection,
+            stats: SearchStats,
+            batch_size: int,
+            max_delay: float,
+            ) -> None:
+        self._conn = conn
+        self._stats = stats
+        self._batchSize = batch_size
+        self._maxDelay = max_delay
+        self._lock = threading.Lock()
+        self._items: list[FsSearchLocation | FsSearchMatch] = []
+        """The items not sent yet, in the order they were put."""
+        self._lastFlush = monotonic()
+
+    def put(self, item, block: bool = True, timeout=None) -> None:
+        with self._lock:
+            self._items.append(item)
+            if (len(self._items) >= self._batchSize
+                    or monotonic() - self._lastFlush >= self._maxDelay):
+                self._send()
+
+    put_nowait = put
+
+    def flush(self) -> None:
+        """Sends the pending items, if any."""
+        with self._lock:
+            self._send()
+
+    def _send(self) -> None:
+        """Sends the pending items as a frame. The lock must be held."""
+        self._lastFlush = monotonic()
+        if not self._items:
+            return
+        items = self._items
+        self._items = []
+        self._conn.send((
+            _FRAME_BATCH,
+            items,
+            self._stats.getScanCounters()))
+
+
+def _runWorker(
+        conn: Connection,
+        evt_stop,
+        mod_dotted: str,
+        qual_name: str,
+        root_dir: str,
+        search: str,
+        mode: MatchMode,
+        patterns: tuple[str, ...],
+        rules: PruneRules,
+        filters: MetaFilter,
+        checkpoint: SearchCheckpoint | None,
+        options: int,
+        batch_size: int,
+        max_delay: float,
+        ) -> None:
+    """The entry point of the worker process."""
+    # Declaring variables ---------------------------------
+    searcher: IFsSearchable
+    searcherCls: Any
+    pruner = Pruner(rules)
+    stats = SearchStats()
+    q = _PipeQueue(conn, stats, batch_size, max_delay)
+    context = SearchContext(mode, patterns, pruner, stats, filters, checkpoint)
+    # Running the search ----------------------------------
+    try:
+        searcherCls = import_module(mod_dotted)
+        for attr in qual_name.split("."):
+            searcherCls = getattr(searcherCls, attr)
+        searcher = searcherCls()
+        # Forwarding the stop request of the parent...
+        threading.Thread(
+            target=lambda: evt_stop.wait() and searcher.stopSearch(),
+            daemon=True).start()
+        runSearch(
+            searcher,
+            root_dir,
+            search,
+            q, # type: ignore
+            FsSearchOptions(options),
+            context)
+        q.flush()
+    except Exception as err:
+        conn.send((_FRAME_ERROR, f"{type(err).__name__}: {err}"))
+    else:
+        conn.send((_FRAME_DONE, pruner.getCounts(), context.notes))
+    finally:
+        conn.close()
+
+
+class ProcessSearcher(IContextSearchable):
+    """
+    Runs a searcher in a worker process, so that matching does not
+    compete with the GUI for the GIL. The worker imports the searcher
+    class by name, runs it on a copy of the search context, and streams
+    its results back in pickled, length-prefixed frames over a pipe;
+    they are put in the queue in the order the searcher put them, so
+    the wrapper can stand in for the searcher anywhere. The worker
+    reports its scan counters and what its pruner left out, which end
+    up in the `SearchStats` and the `Pruner` of the context.
+
+    `stopSearch` is forwarded to the worker, which is killed if it has
+    not finished `stop_deadline` seconds later. Profilers of the parent
+    do not see into the worker.
+    """
+
+    def __init__(
+            self,
+            searcher_cls: type[IFsSearchable],
+            stop_deadline: float = 2.0,
+            batch_size: int = 1024,
+            max_delay: float = 0.05,
+            ) -> None:
+        """
+        Args:
+            searcher_cls:
+                The searcher to run, which must be importable by its
+                module and qualified name.
+            stop_deadline:
+                The number of seconds the worker has to finish once
+                asked to stop.
+            batch_size:
+                The number of items that triggers sending a frame.
+            max_delay:
+                The number of seconds after which pending items are
+                sent even if the frame is not full.
+        """
+        self.name = getattr(searcher_cls, "name", searcher_cls.__name__)
+        self.refinable: bool = getattr(searcher_cls, "refinable", True)
+        """Whether the results of the searcher can be narrowed by name."""
+        self.resumable: bool = getattr(searcher_cls, "resumable", False)
+        """Whether the searcher resumes from a `SearchCheckpoint`."""
+        self._modDotted = searcher_cls.__module__
+        self._qualName = searcher_cls.__qualname__
+        self._stopDeadline = stop_deadline
+        self._batchSize = batch_size
+        self._maxDelay = max_delay
+        self._ctx = multiprocessing.get_context("spawn")
+        """
+        Spawning rather than forking, as forking a process running Tk
+        and other threads is unsafe.
+        """
+        self._evtStop = self._ctx.Event()
+        self._stopTime: float | None = None
+        """The `monotonic` time the worker was asked to stop at, if it was."""
+
+    def search(
+            self,
+            root_dir: str | Path,
+            search: str,
+            q: Queue[FsSearchLocation | FsSearchMatch],
+            options: FsSearchOptions = (
+                FsSearchOptions.FILES_INCLUDED
+                | FsSearchOptions.DIRS_INCLUDED),
+            context: SearchContext | None = None,
+            ) -> None:
+        # Declaring variables ---------------------------------
+        context = context or SearchContext()
+        pruner = context.pruner
+        stats = context.stats
+        finished = False
+        # Starting the worker ---------------------------------
+        # The pruner and the statistics hold locks, which do not pickle,
+        # so the worker makes its own from the rules...
+        self._evtStop.clear()
+        self._stopTime = None
+        connRecv, connSend = self._ctx.Pipe(duplex=False)
+        process = self._ctx.Process(
+            target=_runWorker,
+            args=(
+                connSend,
+                self._evtStop,
+                self._modDotted,
+                self._qualName,
+                str(root_dir),
+                search,
+                context.mode,
+                context.patterns,
+                pruner.rules,
+                context.filters,
+                context.checkpoint,
+                int(options),
+                self._batchSize,
+                self._maxDelay,),
+            daemon=True,)
+        process.start()
+        # Closing our end of sending, so a dead worker means EOF...
+        connSend.close()
+        # Relaying the frames ---------------------------------
+        try:
+            while True:
+                if (self._stopTime is not None
+                        and monotonic() - self._stopTime
+                            > self._stopDeadline):
+                    logging.debug(
+                        f"Killing the '{self.name}' search process "
+                        "that missed its stop deadline")
+                    process.kill()
+                    break
+                if not connRecv.poll(0.05):
+                    continue
+                try:
+                    frame = connRecv.recv()
+                except EOFError:
+                    break
+                if frame[0] == _FRAME_BATCH:
+                    _, items, counters = frame
+                    stats.setScanCounters(*counters)
+                    for item in items:
+                        q.put(item)
+                elif frame[0] == _FRAME_DONE:
+                    pruner.addCounts(*frame[1])
+                    context.notes.extend(frame[2])
+                    finished = True
+                    break
+                else:
+                    raise RuntimeError(frame[1])
+        finally:
+            connRecv.close()
+            process.join(self._stopDeadline)
+            if process.is_alive():
+                process.kill()
+                process.join()
+        if not (finished or self._stopTime is not None):
+            raise RuntimeError(
+                f"The '{self.name}' search process ended unexpectedly "
+                f"with exit code {process.exitcode}")
+
+    def stopSearch(self) -> None:
+        if self._stopTime is None:
+            self._stopTime = monotonic()
+        self._evtStop.set()
@@ -0,0 +1,535 @@
+#
+#
+#
+
+from collections import Counter
+import enum
+import fnmatch
+import logging
+import os
+from pathlib import Path
+import re
+import threading
+from typing import Callable, NamedTuple
+
+
+DEFAULT_EXCLUDES = (".git", ".hg", ".svn", "node_modules", "__pycache__")
+"""
+The glob patterns of the entries the command line leaves out unless
+it is run with `--unrestricted`.
+"""
+
+_STAT_HAS_IDS = os.name != "nt"
+"""
+Whether `os.DirEntry.stat` fills `st_dev` and `st_ino`. On Windows it
+leaves them zero and the entry has to be stat-ed by path instead.
+"""
+
+
+class PruneReason(enum.Enum):
+    """Why an entry was left out of a traversal."""
+
+    EXCLUDED = "excluded"
+    """It matches one of the glob excludes."""
+    IGNORED = "ignored by .gitignore"
+    """A `.gitignore` file of the tree ignores it."""
+    OTHER_FS = "on other file systems"
+    """It is a directory on another file system than the root."""
+    LOOP = "already visited"
+    """It is a directory visited before through another path."""
+
+
+class PruneRules(NamedTuple):
+    """
+    What a traversal leaves out. Being hashable, the rules can be part
+    of the keys of cached results.
+    """
+
+    excludes: tuple[str, ...] = ()
+    """
+    The glob patterns of the entries to leave out. A pattern containing
+    a `/` is matched against the path relative to the root, the others
+    against the name.
+    """
+    gitignore: bool = False
+    """Whether to honour the `.gitignore` files found in the tree."""
+    oneFileSystem: bool = False
+    """Whether to stay on the file system of the root."""
+    followLinks: bool = False
+    """
+    Whether to descend into symbolic links to directories. Directories
+    are then visited once by `(st_dev, st_ino)`, which breaks cycles.
+    """
+
+    @classmethod
+    def fromSettings(cls, settings) -> "PruneRules":
+        """Makes the rules out of an `FsAppSettings` object."""
+        return cls(
+            tuple(settings.prune_excludes),
+            bool(settings.prune_gitignore),
+            bool(settings.prune_one_fs),
+            bool(settings.follow_links))
+
+
+PruneScope = tuple["_IgnoreFile", ...]
+"""The `.gitignore` files in effect in a directory, outermost first."""
+
+
+class Pruner:
+    """
+    Applies `PruneRules` to the traversal of one search and counts what
+    it leaves out. It travels to the searcher as `SearchContext.pruner`;
+    a searcher may use it from several threads.
+
+    Searchers call `begin` with the root, then `prune` with the listing
+    of every directory and the scope its parent handed it. Excluded and
+    ignored entries are neither matched nor descended into; directories
+    on other file systems and directories seen before are matched but
+    not descended into.
+    """
+
+    def __init__(self, rules: PruneRules = PruneRules()) -> None:
+        self.rules = rules
+        self._nameRe = _compileGlobs(
+            pat for pat in rules.excludes if "/" not in pat)
+        """Matches the names of the excluded entries, if any."""
+        self._pathRe = _compileGlobs(
+            pat.strip("/") for pat in rules.excludes if "/" in pat)
+        """Matches the relative paths of the excluded entries, if any."""
+        self._checkDirs = rules.oneFileSystem or rules.followLinks
+        """Whether subdirectories are stat-ed before descending."""
+        self._rootPrefix = ""
+        self._rootDev = -1
+        self._visited: set[tuple[int, int]] = set()
+        """The `(st_dev, st_ino)` of the directories descended into."""
+        self._dirKeys: dict[str, tuple[int, int]] | None = None
+        """
+        The `(st_dev, st_ino)` of the directories descended into and not
+        taken by `takeKeys` yet, by path, if `trackKeys` was called.
+        """
+        self._excludedDirs: set[str] = set()
+        """The directories `allowsPath` found left out, counted once."""
+        self._scopes: dict[str, PruneScope] = {}
+        """
+        The scopes of the directories looked up by `allowsPath` and
+        `scopeOf`.
+        """
+        self._lock = threading.Lock()
+        self._dirCounts: Counter[PruneReason] = Counter()
+        """The number of subtrees left out, by reason."""
+        self._nFiles = 0
+        """The number of files left out."""
+        self.nStats = 0
+        """The number of `stat` calls made to check subdirectories."""
+
+    @property
+    def statsDirs(self) -> bool:
+        """
+        Whether `prune` stats the subdirectories it keeps, which then
+        hold their `stat` results for free.
+        """
+        return self._checkDirs
+
+    @property
+    def nDirs(self) -> int:
+        """The number of subtrees left out."""
+        return sum(self._dirCounts.values())
+
+    @property
+    def nFiles(self) -> int:
+        """The number of files left out."""
+        return self._nFiles
+
+    def getCounts(self) -> tuple[dict[PruneReason, int], int, int]:
+        """
+        Returns what was left out and checked, as `(subtrees by reason,
+        files, stat calls)`, for handing over to `addCounts` of another
+        pruner, such as that of another process.
+        """
+        with self._lock:
+            return dict(self._dirCounts), self._nFiles, self.nStats
+
+    def addCounts(
+            self,
+            dir_counts: dict[PruneReason, int],
+            n_files: int,
+            n_stats: int,
+            ) -> None:
+        """Adds the counts `getCounts` of another pruner returned."""
+        with self._lock:
+            self._dirCounts.update(dir_counts)
+            self._nFiles += n_files
+            self.nStats += n_stats
+
+    def begin(self, root_dir: str | Path) -> PruneScope:
+        """Starts a traversal of the root and returns its scope."""
+        root = os.fspath(root_dir)
+        self._rootPrefix = os.path.join(root, "")
+        if self._checkDirs:
+            try:
+                stat = os.stat(root)
+            except OSError as err:
+                logging.debug(f"Cannot stat '{root}': {err}")
+            else:
+                self._rootDev = stat.st_dev
+                self._visited.add((stat.st_dev, stat.st_ino))
+        return ()
+
+    def isDir(self, entry: os.DirEntry) -> bool:
+        """
+        Determines whether the entry is a directory, following symbolic
+        links only if the rules say so.
+        """
+        try:
+            return entry.is_dir(follow_symlinks=self.rules.followLinks)
+        except OSError:
+            return False
+
+    def prune(
+            self,
+            pth_dir: str,
+            listing: list[os.DirEntry],
+            scope: PruneScope,
+            ) -> tuple[list[os.DirEntry], list[os.DirEntry], PruneScope]:
+        """
+        Applies the rules to the listing of a directory.
+
+        Args:
+            pth_dir:
+                The path of the directory.
+            listing:
+                The entries of the directory.
+            scope:
+                The scope handed to the directory by its parent, or the
+                one `begin` returned for the root.
+
+        Returns:
+            The entries to match, the subdirectories among them to
+            descend into, and the scope to hand those subdirectories.
+        """
+        # Loading the .gitignore file of the directory, if any...
+        if self.rules.gitignore:
+            for entry in listing:
+                if entry.name == ".gitignore":
+                    ignoreFile = _IgnoreFile.load(pth_dir)
+                    if ignoreFile is not None:
+                        scope = (*scope, ignoreFile)
+                    break
+        # Leaving out excluded and ignored entries...
+        kept: list[os.DirEntry] = []
+        subdirs: list[os.DirEntry] = []
+        filtering = bool(self._nameRe or self._pathRe or scope)
+        nStats = 0
+        for entry in listing:
+            isDir = self.isDir(entry)
+            if filtering:
+                reason = self._getReason(entry.name, entry.path, isDir, scope)
+                if reason is not None:
+                    self._count(reason, isDir)
+                    continue
+            kept.append(entry)
+            if not isDir:
+                continue
+            if self._checkDirs:
+                nStats += 1
+                if not self._canDescend(entry):
+                    continue
+            subdirs.append(entry)
+        if nStats:
+            with self._lock:
+                self.nStats += nStats
+        return kept, subdirs, scope
+
+    def allowsPath(self, path: str | Path, is_dir: bool) -> bool:
+        """
+        Determines whether an entry below the root survives the excludes
+        and the `.gitignore` files, for searchers that look entries up
+        rather than traverse, such as index ones. The file system and
+        loop rules do not apply there. Entries left out are counted, a
+        directory once however many of its entries are looked up.
+        """
+        if not (self._nameRe or self._pathRe or self.rules.gitignore):
+            return True
+        pthEntry = os.fspath(path)
+        if not pthEntry.startswith(self._rootPrefix):
+            return True
+        parts = pthEntry[len(self._rootPrefix):].split(os.sep)
+        pthDir = self._rootPrefix.rstrip(os.sep) or os.sep
+        scope: PruneScope = ()
+        for idx, name in enumerate(parts):
+            if self.rules.gitignore:
+                scope = self._getDirScope(pthDir, scope)
+            pthDir = os.path.join(pthDir, name)
+            isDir = is_dir or idx < len(parts) - 1
+            reason = self._getReason(name, pthDir, isDir, scope)
+            if reason is None:
+                continue
+            if isDir:
+                with self._lock:
+                    if pthDir in self._excludedDirs:
+                        return False
+                    self._excludedDirs.add(pthDir)
+            self._count(reason, isDir)
+            return False
+        return True
+
+    def scopeOf(self, pth_dir: str | Path) -> PruneScope:
+        """
+        Returns the scope a directory below the root gets from its
+        ancestors, for resuming a traversal there rather than at the
+        root. `begin` must have been called.
+        """
+        pthEntry = os.fspath(pth_dir)
+        if not (self.rules.gitignore
+                and pthEntry.startswith(self._rootPrefix)):
+            return ()
+        parts = pthEntry[len(self._rootPrefix):].split(os.sep)
+        pthDir = self._rootPrefix.rstrip(os.sep) or os.sep
+        scope: PruneScope = ()
+        for name in parts:
+            scope = self._getDirScope(pthDir, scope)
+            pthDir = os.path.join(pthDir, name)
+        return scope
+
+    def getVisited(self) -> set[tuple[int, int]]:
+        """
+        Returns the `(st_dev, st_ino)` of the directories descended
+        into, for checkpointing a traversal.
+        """
+        with self._lock:
+            return set(self._visited)
+
+    def addVisited(self, visited: set[tuple[int, int]]) -> None:
+        """Marks directories as descended into, for resuming a traversal."""
+        with self._lock:
+            self._visited.update(visited)
+
+    def trackKeys(self) -> None:
+        """
+        Keeps the `(st_dev, st_ino)` of the directories descended into
+        from now on, until `takeKeys` takes them.
+        """
+        with self._lock:
+            if self._dirKeys is None:
+                self._dirKeys = {}
+
+    def takeKeys(self, paths: list[str]) -> list[tuple[int, int]]:
+        """
+        Returns the `(st_dev, st_ino)` kept for the directories and
+        forgets them. Directories with none kept are left out.
+        """
+        with self._lock:
+            if not self._dirKeys:
+                return []
+            keys = [self._dirKeys.pop(pth, None) for pth in paths]
+        return [key for key in keys if key is not None]
+
+    def summary(self) -> str:
+        """
+        Describes what was left out, such as `skipped 3 folders (2
+        excluded, 1 on other file systems)`, or returns an empty string
+        if nothing was.
+        """
+        parts: list[str] = []
+        if self._dirCounts:
+            reasons = ", ".join(
+                f"{count} {reason.value}"
+                for reason, count in self._dirCounts.most_common())
+            parts.append(f"{self.nDirs} folders ({reasons})")
+        if self._nFiles:
+            parts.append(f"{self._nFiles} files")
+        return f"skipped {' and '.join(parts)}" if parts else ""
+
+    def _getReason(
+            self,
+            name: str,
+            path: str,
+            is_dir: bool,
+            scope: PruneScope,
+            ) -> PruneReason | None:
+        """Returns why the entry is left out, or `None` if it is not."""
+        if self._nameRe and self._nameRe(name):
+            return PruneReason.EXCLUDED
+        if self._pathRe and self._pathRe(
+                path[len(self._rootPrefix):].replace(os.sep, "/")):
+            return PruneReason.EXCLUDED
+        # The innermost .gitignore file with a matching rule decides...
+        for ignoreFile in reversed(scope):
+            ignored = ignoreFile.match(path, is_dir)
+            if ignored is not None:
+                return PruneReason.IGNORED if ignored else None
+        return None
+
+    def _canDescend(self, entry: os.DirEntry) -> bool:
+        """
+        Determines whether the traversal may descend into the directory,
+        counting it if it is on another file system or was visited.
+        """
+        followLinks = self.rules.followLinks
+        try:
+            if _STAT_HAS_IDS:
+                stat = entry.stat(follow_symlinks=followLinks)
+            else:
+                stat = os.stat(entry.path, follow_symlinks=followLinks)
+        except OSError:
+            return False
+        if self.rules.oneFileSystem and stat.st_dev != self._rootDev:
+            self._count(PruneReason.OTHER_FS, True)
+            return False
+        if followLinks:
+            key = (stat.st_dev, stat.st_ino)
+            with self._lock:
+                if key in self._visited:
+                    self._dirCounts[PruneReason.LOOP] += 1
+                    return False
+                self._visited.add(key)
+                if self._dirKeys is not None:
+                    self._dirKeys[entry.path] = key
+        return True
+
+    def _getDirScope(
+            self,
+            pth_dir: str,
+            parent_scope: PruneScope,
+            ) -> PruneScope:
+        """Returns the scope of a directory, loading its .gitignore once."""
+        try:
+            return self._scopes[pth_dir]
+        except KeyError:
+            pass
+        ignoreFile = _IgnoreFile.load(pth_dir)
+        scope = parent_scope if ignoreFile is None else (
+            *parent_scope, ignoreFile)
+        self._scopes[pth_dir] = scope
+        return scope
+
+    def _count(self, reason: PruneReason, is_dir: bool) -> None:
+        with self._lock:
+            if is_dir:
+                self._dirCounts[reason] += 1
+            else:
+                self._nFiles += 1
+
+
+class _IgnoreFile:
+    """
+    The rules of a `.gitignore` file, matched against the paths below
+    its directory. Negations, directory-only rules, anchoring and `**`
+    are supported; other git-specific files such as `info/exclude` and
+    the global excludes file are not read.
+    """
+
+    def __init__(
+            self,
+            pth_dir: str,
+            rules: list[tuple[re.Pattern[str], bool, bool, bool]],
+            ) -> None:
+        self._prefixLen = len(os.path.join(pth_dir, ""))
+        self._rules = rules
+        """The rules in file order: `(regex, negated, dir only, anchored)`"""
+
+    @classmethod
+    def load(cls, pth_dir: str) -> "_IgnoreFile | None":
+        """
+        Reads the `.gitignore` file of the directory. Returns `None` if
+        there is none or it has no rules.
+        """
+        try:
+            with open(
+                    os.path.join(pth_dir, ".gitignore"),
+                    "r",
+                    encoding="utf-8",
+                    errors="replace") as fileObj:
+                lines = fileObj.read().splitlines()
+        except FileNotFoundError:
+            return None
+        except OSError as err:
+            logging.debug(f"Cannot read the .gitignore of '{pth_dir}': {err}")
+            return None
+        rules = [rule for line in lines if (rule := _parseIgnoreLine(line))]
+        return cls(pth_dir, rules) if rules else None
+
+    def match(self, path: str, is_dir: bool) -> bool | None:
+        """
+        Returns whether the last rule matching the path ignores it, or
+        `None` if no rule matches it.
+        """
+        relPath = path[self._prefixLen:].replace(os.sep, "/")
+        name = relPath.rpartition("/")[2]
+        for regex, negated, dirOnly, anchored in reversed(self._rules):
+            if dirOnly and not is_dir:
+                continue
+            if regex.match(relPath if anchored else name):
+                return not negated
+        return None
+
+
+def _parseIgnoreLine(
+        line: str,
+        ) -> tuple[re.Pattern[str], bool, bool, bool] | None:
+    """Parses a line of a `.gitignore` file into a rule, if it has one."""
+    line = line.rstrip(" ")
+    if not line or line.startswith("#"):
+        return None
+    negated = line.startswith("!")
+    if negated:
+        line = line[1:]
+    elif line.startswith(("\\!", "\\#")):
+        line = line[1:]
+    dirOnly = line.endswith("/")
+    line = line.rstrip("/")
+    anchored = "/" in line
+    line = line.lstrip("/")
+    if not line:
+        return None
+    return _translateGitGlob(line), negated, dirOnly, anchored
+
+
+def _translateGitGlob(pattern: str) -> re.Pattern[str]:
+    """
+    Translates a `.gitignore` pattern into a regular expression where
+    `*`, `?` and classes never match `/`, but `**` between slashes
+    matches any number of directories.
+    """
+    parts: list[str] = []
+    idx = 0
+    while idx < len(pattern):
+        atSegment = idx == 0 or pattern[idx - 1] == "/"
+        if atSegment and pattern.startswith("**/", idx):
+            parts.append("(?:.*/)?")
+            idx += 3
+        elif atSegment and pattern[idx:] == "**":
+            parts.append(".*")
+            idx += 2
+        elif pattern[idx] == "*":
+            parts.append("[^/]*")
+            idx += 1
+        elif pattern[idx] == "?":
+            parts.append("[^/]")
+            idx += 1
+        elif pattern[idx] == "[" and (end := pattern.find("]", idx + 2)) > 0:
+            body = pattern[idx + 1:end].replace("\\", "\\\\")
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            parts.append(f"(?!/)[{body}]")
+            idx = end + 1
+        elif pattern[idx] == "\\" and idx + 1 < len(pattern):
+            parts.append(re.escape(pattern[idx + 1]))
+            idx += 2
+        else:
+            parts.append(re.escape(pattern[idx]))
+            idx += 1
+    return re.compile("".join(parts) + r"\Z", re.DOTALL)
+
+
+def _compileGlobs(patterns) -> Callable[[str], re.Match | None] | None:
+    """
+    Compiles shell wildcard patterns into the `match` method of a single
+    regular expression, or returns `None` if there are none. Matching is
+    case-insensitive on Windows.
+    """
+    regexes = [fnmatch.translate(pattern) for pattern in patterns if pattern]
+    if not regexes:
+        return None
+    flags = re.IGNORECASE if os.name == "nt" else 0
+    return re.compile("|".join(regexes), flags).match
@@ -0,0 +1,402 @@
+#
+#
+#
+
+from collections import OrderedDict
+import logging
+import os
+from pathlib import Path
+from queue import Queue
+import threading
+from typing import NamedTuple
+
+from megacodist.fs import (
+    FsSearchOptions, FsSearchLocation, FsSearchMatch, IFsSearchable)
+
+from utils.matcher import MatchMode, NameMatcher, joinPatterns
+from utils.meta_filter import MetaFilter
+from utils.pruning import PruneRules
+from utils.search_context import IContextSearchable, SearchContext, runSearch
+
+
+class _QueryKey(NamedTuple):
+    root: str
+    searcher: str
+    mode: MatchMode
+    text: str
+    patterns: tuple[str, ...]
+    options: int
+    prune: PruneRules
+    filters: MetaFilter
+
+
+class _CacheEntry:
+    """The results of a completed search and what validates them."""
+
+    def __init__(
+            self,
+            query: tuple[str, ...],
+            matches: list[FsSearchMatch],
+            dir_mtimes: dict[str, int],
+            refinable: bool = True,
+            ) -> None:
+        self.query = query
+        """The patterns of the search, or its text alone."""
+        self.matches = matches
+        self.dirMtimes = dir_mtimes
+        """
+        The mtime of every directory the search visited, taken before it
+        was listed: `directory => st_mtime_ns`
+        """
+        self.refinable = refinable and all(
+            isRefinable(match) for match in matches)
+        """
+        Whether narrower queries can be answered by filtering the matches
+        by name; see `isRefinable`.
+        """
+        self.size = _ENTRY_SIZE + sum(
+            _itemSize(str(match.path)) for match in matches)
+        self.size += sum(_itemSize(pth) for pth in dir_mtimes)
+        """The estimated memory held by the entry, in bytes."""
+
+    def isValid(self, should_stop=lambda: False) -> bool:
+        """
+        Determines whether none of the visited directories has changed
+        since, which would have changed the results.
+        """
+        for pthDir, mtime in self.dirMtimes.items():
+            if should_stop():
+                return False
+            try:
+                if os.stat(pthDir).st_mtime_ns != mtime:
+                    return False
+            except OSError:
+                return False
+        return True
+
+
+_ENTRY_SIZE = 1024
+"""The estimated fixed memory of a cache entry, in bytes."""
+
+_ITEM_SIZE = 160
+"""The estimated memory of a match or directory of an entry, in bytes."""
+
+
+def _itemSize(path: str) -> int:
+    """Estimates the memory of a match or directory of an entry."""
+    return _ITEM_SIZE + 2 * len(path)
+
+
+class QueryCache:
+    """
+    Keeps the results of recent searches, keyed by root, searcher, query
+    and options, evicting the least recently used ones once their
+    estimated size exceeds a memory budget. Entries are validated
+    against the mtimes of the directories their search visited, which
+    change whenever an entry is added, removed or renamed in them.
+    """
+
+    def __init__(self, budget: int = 64 * 1024 * 1024) -> None:
+        """
+        Args:
+            budget:
+                The memory the cached results may take, in bytes.
+        """
+        self.budget = budget
+        """The memory the cached results may take, in bytes."""
+        self._size = 0
+        """The estimated memory of all entries, in bytes."""
+        self._entries: OrderedDict[_QueryKey, _CacheEntry] = OrderedDict()
+        """The entries from the least to the most recently used."""
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def makeKey(
+            root_dir: str | Path,
+            searcher: str,
+            search: str,
+            options: FsSearchOptions,
+            context: SearchContext,
+            ) -> _QueryKey:
+        return _QueryKey(
+            str(Path(root_dir).resolve()),
+            searcher,
+            context.mode,
+            search,
+            context.patterns,
+            int(options),
+            context.pruner.rules,
+            context.filters)
+
+    def get(self, key: _QueryKey) -> _CacheEntry | None:
+        """Returns the entry of the key, if any, marking it as used."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def findSuperset(
+            self,
+            key: _QueryKey,
+            search: tuple[str, ...],
+            ) -> tuple[_QueryKey, _CacheEntry] | None:
+        """
+        Returns the smallest entry of the same root, searcher and
+        options whose query is broader than the search, so that the
+        matches of the search are among its matches, if any.
+        """
+        matchCase = bool(key.options & FsSearchOptions.MATCH_CASE)
+        matchWhole = bool(key.options & FsSearchOptions.MATCH_WHOLE)
+        best: tuple[_QueryKey, _CacheEntry] | None = None
+        with self._lock:
+            for otherKey, entry in self._entries.items():
+                if not (entry.refinable
+                        and otherKey.root == key.root
+                        and otherKey.searcher == key.searcher
+                        and otherKey.options == key.options
+                        and otherKey.mode == key.mode
+                        and otherKey.prune == key.prune
+                        and otherKey.filters == key.filters
+                        and isRefinement(
+                            search,
+                            entry.query,
+                            key.mode,
+                            matchCase,
+                            matchWhole)):
+                    continue
+                if best is None or len(entry.matches) < len(best[1].matches):
+                    best = otherKey, entry
+            if best is not None:
+                self._entries.move_to_end(best[0])
+        return best
+
+    def put(self, key: _QueryKey, entry: _CacheEntry) -> None:
+        """Stores the entry, evicting old ones to fit the budget."""
+        if entry.size > self.budget:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= old.size
+            self._entries[key] = entry
+            self._size += entry.size
+            while self._size > self.budget:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.size
+
+    def discard(self, key: _QueryKey) -> None:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._size -= entry.size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+def isRefinable(match: FsSearchMatch) -> bool:
+    """
+    Determines whether the match holds for its name alone, so that the
+    matches of a narrower query are those of a broader one its name
+    still matches. Content matches do not, nor do matches a class marks
+    with `refinable = False`, such as duplicates, which depend on the
+    other files compared.
+    """
+    return getattr(match, "refinable", not hasattr(match, "offset"))
+
+
+def isRefinement(
+        search: tuple[str, ...],
+        cached: tuple[str, ...],
+        mode: MatchMode,
+        match_case: bool,
+        match_whole: bool,
+        ) -> bool:
+    """
+    Determines whether every name matching the search also matches the
+    cached query of the same mode and options. Queries are given as
+    their patterns, or as their text alone outside `ANY_OF`.
+    """
+    fold = (lambda text: text) if match_case else str.casefold
+    match mode:
+        case MatchMode.SUBSTRING if not match_whole:
+            return fold(cached[0]) in fold(search[0])
+        case MatchMode.FUZZY:
+            # The cached text must be a subsequence of the search...
+            chars = iter(fold(search[0]))
+            return all(char in chars for char in fold(cached[0]))
+        case MatchMode.ANY_OF:
+            return ({fold(pattern) for pattern in search}
+                <= {fold(pattern) for pattern in cached})
+    return False
+
+
+class _RecordingQueue:
+    """
+    Stands in for the results queue of a searcher, recording the
+    matches and the mtimes of the locations on their way through. Once
+    the record would exceed the budget, it is dropped and recording
+    stops, as it could not be cached anyway.
+    """
+
+    def __init__(self, q: Queue, budget: int) -> None:
+        self._q = q
+        self._lock = threading.Lock()
+        self._budget = budget
+        self._size = _ENTRY_SIZE
+        """The estimated memory of the record, in bytes."""
+        self.matches: list[FsSearchMatch] = []
+        self.dirMtimes: dict[str, int] = {}
+        self.overflowed = False
+        """Whether the record exceeded the budget and was dropped."""
+
+    def put(self, item, block: bool = True, timeout=None) -> None:
+        if not self.overflowed:
+            self._record(item)
+        self._q.put(item, block, timeout)
+
+    def _record(self, item) -> None:
+        if isinstance(item, FsSearchLocation):
+            # Taking the mtime before the searcher lists the directory,
+            # so changes made while it is listed are detected later...
+            try:
+                mtime = os.stat(item.path).st_mtime_ns
+            except OSError:
+                mtime = -1
+            pth = str(item.path)
+            with self._lock:
+                self.dirMtimes[pth] = mtime
+                self._grow(pth)
+        else:
+            with self._lock:
+                self.matches.append(item)
+                self._grow(str(item.path))
+
+    def _grow(self, path: str) -> None:
+        """Accounts for a recorded item, dropping the record if too big."""
+        self._size += _itemSize(path)
+        if self._size > self._budget:
+            self.overflowed = True
+            self.matches = []
+            self.dirMtimes = {}
+
+    def put_nowait(self, item) -> None:
+        self.put(item, False)
+
+    def __getattr__(self, name: str):
+        return getattr(self._q, name)
+
+
+class CachingSearcher(IContextSearchable):
+    """
+    Wraps a searcher to answer searches from a `QueryCache` when
+    possible. A repeated search replays the cached matches once the
+    directories it visited are found unchanged; a search narrower than
+    a cached one filters the cached matches instead of walking the
+    disk. Otherwise the wrapped searcher runs and, if it completes, its
+    results are cached.
+    """
+
+    def __init__(
+            self,
+            searcher: IFsSearchable,
+            searcher_name: str,
+            cache: QueryCache,
+            ) -> None:
+        self.name = searcher_name
+        self._searcher = searcher
+        self._cache = cache
+        self._refinable: bool = getattr(searcher, "refinable", True)
+        """
+        Whether the results of the searcher can be narrowed by name. A
+        searcher whose results depend on the whole set of files it
+        compares says `refinable = False`.
+        """
+        self._evtStop = threading.Event()
+        """Set when the current search has been asked to stop."""
+
+    def search(
+            self,
+            root_dir: str | Path,
+            search: str,
+            q: Queue[FsSearchLocation | FsSearchMatch],
+            options: FsSearchOptions = (
+                FsSearchOptions.FILES_INCLUDED
+                | FsSearchOptions.DIRS_INCLUDED),
+            context: SearchContext | None = None,
+            ) -> None:
+        self._evtStop.clear()
+        context = context or SearchContext()
+        patterns = context.patterns or (search,)
+        key = QueryCache.makeKey(root_dir, self.name, search, options, context)
+        # Replaying a repeated search...
+        entry = self._cache.get(key)
+        if entry is not None:
+            if entry.isValid(self._evtStop.is_set):
+                logging.debug(f"Replaying cached results of '{search}'")
+                self._replay(root_dir, entry.matches, q)
+                return
+            self._cache.discard(key)
+        # Filtering the results of a broader search...
+        superset = self._cache.findSuperset(key, patterns)
+        if superset is not None:
+            supKey, supEntry = superset
+            if supEntry.isValid(self._evtStop.is_set):
+                logging.debug(
+                    "Refining cached results of "
+                    f"'{joinPatterns(supEntry.query)}'")
+                matcher = NameMatcher(
+                    search,
+                    options,
+                    context.mode,
+                    context.patterns)
+                matches = [
+                    matcher.makeMatch(match.path)
+                    for match in supEntry.matches
+                    if matcher(match.path.name)]
+                if self._replay(root_dir, matches, q):
+                    self._cache.put(
+                        key,
+                        _CacheEntry(patterns, matches, supEntry.dirMtimes))
+                return
+            self._cache.discard(supKey)
+        # Searching the disk...
+        recorder = _RecordingQueue(q, self._cache.budget)
+        runSearch(
+            self._searcher,
+            root_dir,
+            search,
+            recorder, # type: ignore
+            options,
+            context)
+        if (not self._evtStop.is_set()
+                and not recorder.overflowed
+                and recorder.dirMtimes):
+            self._cache.put(
+                key,
+                _CacheEntry(
+                    patterns,
+                    recorder.matches,
+                    recorder.dirMtimes,
+                    self._refinable))
+
+    def _replay(
+            self,
+            root_dir: str | Path,
+            matches: list[FsSearchMatch],
+            q: Queue[FsSearchLocation | FsSearchMatch],
+            ) -> bool:
+        """Puts the matches in the queue. Returns `False` if stopped."""
+        q.put(FsSearchLocation(Path(root_dir)))
+        for match in matches:
+            if self._evtStop.is_set():
+                return False
+            q.put(match)
+        return True
+
+    def stopSearch(self) -> None:
+        self._evtStop.set()
+        self._searcher.stopSearch()
@@ -0,0 +1,295 @@
+#
+#
+#
+
+import heapq
+from itertools import count
+import os
+from pathlib import Path
+from queue import Queue
+import re
+import threading
+from time import time
+
+from megacodist.fs import (
+    FsSearchOptions, FsSearchLocation, FsSearchMatch, IFsSearchable)
+
+from utils.matcher import MatchMode, NameMatcher
+from utils.search_context import IContextSearchable, SearchContext, runSearch
+
+
+class MatchScorer:
+    """
+    Scores the matches of a search for ranking, from the quality of the
+    name match, the depth below the root and how recently the entry was
+    modified. Names are scored a batch at a time, typically the matches
+    of one directory, so that case-folding and substring lookups run as
+    list comprehensions over C-level string methods. Scores are in
+    levels: a point of quality is worth `QUALITY_WEIGHT` levels of depth.
+    """
+
+    QUALITY_WEIGHT = 10.0
+    """The score of a perfect name match, in levels."""
+
+    RECENCY_WEIGHT = 2.0
+    """
+    The bonus of an entry modified just now, in levels, fading over
+    `RECENCY_SPAN`.
+    """
+
+    RECENCY_SPAN = 30 * 24 * 3600
+    """The age in seconds past which an entry gets no recency bonus."""
+
+    def __init__(
+            self,
+            root_dir: str | Path,
+            search: str,
+            options: FsSearchOptions,
+            context: SearchContext | None = None,
+            ) -> None:
+        context = context or SearchContext()
+        matcher = NameMatcher(search, options, context.mode, context.patterns)
+        self._matchCase = matcher.matchCase
+        texts: tuple[str, ...]
+        if matcher.mode in (MatchMode.SUBSTRING, MatchMode.FUZZY):
+            texts = (search,)
+        elif matcher.mode is MatchMode.ANY_OF:
+            texts = matcher.literals or ()
+        else:
+            # Ranking by the longest literal the pattern requires...
+            texts = (max(matcher.literals or ("",), key=len),)
+        self._texts = tuple(
+            text if self._matchCase else text.casefold()
+            for text in texts
+            if text)
+        """The texts names are compared with, case-folded if need be."""
+        self._fuzzyRes = tuple(
+            re.compile(
+                ".*?".join(re.escape(char) for char in text),
+                re.DOTALL)
+            for text in self._texts)
+        """Find a window of a name holding each text in order."""
+        self._rootSeps = os.path.join(os.fspath(root_dir), "").count(os.sep)
+        """The number of separators in the paths of the root's children."""
+        self._now = time()
+
+    def scoreNames(self, names: list[str]) -> list[float]:
+        """
+        Returns the quality of the batch of names from 0 to 1: the whole
+        name is best, then a prefix, a word in the name, any substring
+        and at last the characters of the text scattered in order, each
+        favouring names the text covers more of. With several texts, a
+        name gets the quality of the best one.
+        """
+        if not self._texts:
+            return [1.0] * len(names)
+        folded = names if self._matchCase else [
+            name.casefold() for name in names]
+        best = [0.0] * len(names)
+        for text, fuzzyRe in zip(self._texts, self._fuzzyRes):
+            nText = len(text)
+            positions = [name.find(text) for name in folded]
+            for idx, (name, pos) in enumerate(zip(folded, positions)):
+                if pos < 0:
+                    match = fuzzyRe.search(name)
+                    if match is None:
+                        continue
+                    quality = 0.5 * nText / (match.end() - match.start())
+                elif pos == 0:
+                    quality = 1.0 if len(name) == nText else 0.9
+                elif not name[pos - 1].isalnum():
+                    quality = 0.8
+                else:
+                    quality = 0.7
+                quality *= 0.8 + 0.2 * nText / len(name)
+                if quality > best[idx]:
+                    best[idx] = quality
+        return best
+
+    def scoreMatches(
+            self,
+            matches: list[FsSearchMatch],
+            threshold: float = float("-inf"),
+            ) -> list[tuple[float, FsSearchMatch]]:
+        """
+        Scores a batch of matches and returns those scoring above the
+        threshold with their scores. The modification time, which costs
+        a `stat`, is only looked up for matches the threshold does not
+        rule out without it.
+        """
+        pthStrs = [os.fspath(match.path) for match in matches]
+        qualities = self.scoreNames(
+            [os.path.basename(pthStr) for pthStr in pthStrs])
+        scored: list[tuple[float, FsSearchMatch]] = []
+        for match, pthStr, quality in zip(matches, pthStrs, qualities):
+            depth = pthStr.count(os.sep) - self._rootSeps
+            score = self.QUALITY_WEIGHT * quality - depth
+            if score + self.RECENCY_WEIGHT <= threshold:
+                continue
+            try:
+                age = self._now - os.stat(pthStr).st_mtime
+                score += self.RECENCY_WEIGHT * max(
+                    0.0,
+                    1.0 - age / self.RECENCY_SPAN)
+            except OSError:
+                pass
+            if score > threshold:
+                scored.append((score, match))
+        return scored
+
+
+class TopK:
+    """
+    The best `k` matches of a search, kept in a bounded min-heap so that
+    memory does not grow with the number of matches. It is safe to offer
+    matches from several threads; `version` tells readers whether the
+    ranking changed since they last took a snapshot.
+    """
+
+    def __init__(self, k: int) -> None:
+        self.k = k
+        """The number of matches kept."""
+        self._heap: list[tuple[float, int, FsSearchMatch]] = []
+        """The kept matches as `(score, sequence, match)`, worst first."""
+        self._seq = count()
+        """Breaks ties of scores, as matches do not compare."""
+        self._lock = threading.Lock()
+        self.version = 0
+        """Incremented every time the kept matches change."""
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def getThreshold(self) -> float:
+        """
+        Returns the score a match must beat to be kept: the worst kept
+        one once `k` matches are kept, minus infinity before.
+        """
+        with self._lock:
+            if len(self._heap) < self.k:
+                return float("-inf")
+            return self._heap[0][0]
+
+    def offer(self, scored: list[tuple[float, FsSearchMatch]]) -> None:
+        """Keeps those of the scored matches that rank among the best."""
+        changed = False
+        with self._lock:
+            for score, match in scored:
+                item = (score, next(self._seq), match)
+                if len(self._heap) < self.k:
+                    heapq.heappush(self._heap, item)
+                    changed = True
+                elif score > self._heap[0][0]:
+                    heapq.heapreplace(self._heap, item)
+                    changed = True
+            if changed:
+                self.version += 1
+
+    def snapshot(self) -> list[tuple[float, FsSearchMatch]]:
+        """Returns the kept matches with their scores, best first."""
+        with self._lock:
+            items = sorted(self._heap, reverse=True)
+        return [(score, match) for score, _, match in items]
+
+
+class _RankingQueue:
+    """
+    Stands in for the results queue of a searcher, holding matches back
+    and offering them to a `TopK` instead. Matches are scored a batch at
+    a time: those each thread put since its latest location, that is
+    the matches of one directory for traversing searchers, or
+    `BATCH_SIZE` of them for the others. Locations go on through.
+    """
+
+    BATCH_SIZE = 256
+    """The number of matches scored at once when no location comes."""
+
+    def __init__(
+            self,
+            q: Queue,
+            scorer: MatchScorer,
+            top_k: TopK,
+            ) -> None:
+        self._q = q
+        self._scorer = scorer
+        self._topK = top_k
+        self._lock = threading.Lock()
+        self._pending: dict[int, list[FsSearchMatch]] = {}
+        """The matches not scored yet: `thread ident => matches`"""
+
+    def put(self, item, block: bool = True, timeout=None) -> None:
+        ident = threading.get_ident()
+        if isinstance(item, FsSearchLocation):
+            self._flush(ident)
+            self._q.put(item, block, timeout)
+            return
+        with self._lock:
+            pending = self._pending.setdefault(ident, [])
+            pending.append(item)
+            full = len(pending) >= self.BATCH_SIZE
+        if full:
+            self._flush(ident)
+
+    def put_nowait(self, item) -> None:
+        self.put(item, False)
+
+    def _flush(self, ident: int) -> None:
+        """Scores the pending matches of the thread."""
+        with self._lock:
+            pending = self._pending.pop(ident, None)
+        if pending:
+            self._topK.offer(self._scorer.scoreMatches(
+                pending,
+                self._topK.getThreshold()))
+
+    def flushAll(self) -> None:
+        """Scores the pending matches of every thread."""
+        with self._lock:
+            idents = list(self._pending)
+        for ident in idents:
+            self._flush(ident)
+
+    def __getattr__(self, name: str):
+        return getattr(self._q, name)
+
+
+class RankedSearcher(IContextSearchable):
+    """
+    Wraps a searcher to rank its matches with a `MatchScorer` and keep
+    only the best ones in a `TopK`, which the caller reads as the search
+    goes. Only locations reach the queue. Any searcher can be ranked.
+    """
+
+    def __init__(self, searcher: IFsSearchable, top_k: TopK) -> None:
+        self.name = getattr(searcher, "name", type(searcher).__name__)
+        self.topK = top_k
+        """The best matches found so far."""
+        self._searcher = searcher
+
+    def search(
+            self,
+            root_dir: str | Path,
+            search: str,
+            q: Queue[FsSearchLocation | FsSearchMatch],
+            options: FsSearchOptions = (
+                FsSearchOptions.FILES_INCLUDED
+                | FsSearchOptions.DIRS_INCLUDED),
+            context: SearchContext | None = None,
+            ) -> None:
+        rankingQueue = _RankingQueue(
+            q,
+            MatchScorer(root_dir, search, options, context),
+            self.topK)
+        try:
+            runSearch(
+                self._searcher,
+                root_dir,
+                search,
+                rankingQueue, # type: ignore
+                options,
+                context)
+        finally:
+            rankingQueue.flushAll()
+
+    def stopSearch(self) -> None:
+        self._searcher.stopSearch()
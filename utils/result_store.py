@@ -0,0 +1,258 @@
+#
+#
+#
+
+from array import array
+import os
+from pathlib import Path
+from typing import Callable, Iterator
+
+
+_FLAG_DETAILS = 0x01
+"""The result has details, kept in `ResultStore._details`."""
+_FLAG_CONTENT = 0x02
+"""The result is a content match, its offset kept in `_offsets`."""
+
+
+class ResultStore:
+    """
+    The backing store of the search results, laid out in columns so
+    that millions of results cost tens of bytes each. Parent paths are
+    interned in a table, names are packed as UTF-8 into one buffer, and
+    every result is a row of array columns: `(parent id, name offset,
+    flags)`. The rare details and byte offsets live in side tables.
+    Strings and `Path` objects are only made for the rows that are
+    actually read, such as the visible window of a view.
+    """
+
+    COL_NAME = 0
+    """The column of item names."""
+    COL_PARENT = 1
+    """The column of parent paths."""
+    COL_DETAILS = 2
+    """The column of match details, such as the patterns that hit."""
+
+    def __init__(self) -> None:
+        self._dirs: list[str] = []
+        """The interned parent paths: `parent id => parent path`"""
+        self._dirIds: dict[str, int] = {}
+        """The ids of the interned parent paths: `parent path => id`"""
+        self._parentIds = array("I")
+        """The parent id of each result in arrival order."""
+        self._nameBuf = bytearray()
+        """The names of all results, UTF-8 encoded back to back."""
+        self._nameOffsets = array("Q")
+        """
+        The offset of the name of each result in `_nameBuf`, in arrival
+        order. A name ends where the next one starts.
+        """
+        self._flags = array("B")
+        """The `_FLAG_*` bits of each result in arrival order."""
+        self._details: dict[int, str] = {}
+        """The non-empty details of results: `arrival index => details`"""
+        self._offsets: dict[int, int] = {}
+        """
+        The byte offsets of content matches from the start of their
+        file: `arrival index => offset`
+        """
+        self._order: array | None = None
+        """
+        The arrival indexes in view order, or `None` for arrival order.
+        Results added after sorting follow the sorted ones.
+        """
+        self._sortCol: int | None = None
+        self._sortReverse = False
+
+    def __len__(self) -> int:
+        return len(self._parentIds)
+
+    def clear(self) -> None:
+        """Drops all results in constant time."""
+        self._dirs = []
+        self._dirIds = {}
+        self._parentIds = array("I")
+        self._nameBuf = bytearray()
+        self._nameOffsets = array("Q")
+        self._flags = array("B")
+        self._details = {}
+        self._offsets = {}
+        self._order = None
+        self._sortCol = None
+        self._sortReverse = False
+
+    def append(self, path: Path, details: str = "", offset: int = -1) -> None:
+        """Appends a result."""
+        parent, name = os.path.split(os.fspath(path))
+        self.appendEntry(parent, name, details, offset)
+
+    def appendEntry(
+            self,
+            parent: str,
+            name: str,
+            details: str = "",
+            offset: int = -1,
+            ) -> None:
+        """Appends a result given as its parent path and name."""
+        idx = len(self._parentIds)
+        try:
+            parentId = self._dirIds[parent]
+        except KeyError:
+            parentId = len(self._dirs)
+            self._dirIds[parent] = parentId
+            self._dirs.append(parent)
+        flags = 0
+        if details:
+            flags |= _FLAG_DETAILS
+            self._details[idx] = details
+        if offset >= 0:
+            flags |= _FLAG_CONTENT
+            self._offsets[idx] = offset
+        self._parentIds.append(parentId)
+        self._nameOffsets.append(len(self._nameBuf))
+        self._nameBuf += name.encode("utf-8", "surrogateescape")
+        self._flags.append(flags)
+        if self._order is not None:
+            self._order.append(idx)
+
+    def retain(self, keep: Callable[[str], bool]) -> None:
+        """
+        Drops the results whose name the predicate rejects, keeping the
+        order of the view.
+        """
+        kept = [idx for idx in range(len(self)) if keep(self._getName(idx))]
+        newIdxs = {oldIdx: newIdx for newIdx, oldIdx in enumerate(kept)}
+        if self._order is not None:
+            self._order = array("I", (
+                newIdxs[oldIdx] for oldIdx in self._order
+                if oldIdx in newIdxs))
+        nameBuf = bytearray()
+        nameOffsets = array("Q")
+        for idx in kept:
+            nameOffsets.append(len(nameBuf))
+            nameBuf += self._getNameBytes(idx)
+        self._nameBuf = nameBuf
+        self._nameOffsets = nameOffsets
+        self._parentIds = array("I", (self._parentIds[idx] for idx in kept))
+        self._flags = array("B", (self._flags[idx] for idx in kept))
+        self._details = {
+            newIdxs[idx]: details for idx, details in self._details.items()
+            if idx in newIdxs}
+        self._offsets = {
+            newIdxs[idx]: offset for idx, offset in self._offsets.items()
+            if idx in newIdxs}
+
+    def paths(self) -> Iterator[Path]:
+        """Yields the paths of all results in arrival order."""
+        for pthEntry in self.pathStrs():
+            yield Path(pthEntry)
+
+    def pathStrs(self) -> Iterator[str]:
+        """
+        Yields the paths of all results as strings in arrival order,
+        which is cheaper than `paths` when no `Path` is needed.
+        """
+        dirs = self._dirs
+        for idx, parentId in enumerate(self._parentIds):
+            yield os.path.join(dirs[parentId], self._getName(idx))
+
+    def iterRows(self) -> Iterator[tuple[str, str, str, int]]:
+        """
+        Yields the parent path, the name, the details and the byte
+        offset of every result in view order, as exporters take them.
+        """
+        for row in range(len(self)):
+            idx = self._index(row)
+            yield (
+                self._getParent(idx),
+                self._getName(idx),
+                self._getDetails(idx),
+                self._offsets.get(idx, -1))
+
+    def _getNameBytes(self, idx: int) -> bytearray:
+        """Returns the UTF-8 encoded name of the result."""
+        start = self._nameOffsets[idx]
+        if idx + 1 < len(self._nameOffsets):
+            return self._nameBuf[start:self._nameOffsets[idx + 1]]
+        return self._nameBuf[start:]
+
+    def _getName(self, idx: int) -> str:
+        """Returns the name of the result at the arrival index."""
+        return self._getNameBytes(idx).decode("utf-8", "surrogateescape")
+
+    def _getParent(self, idx: int) -> str:
+        """Returns the parent path of the result at the arrival index."""
+        return self._dirs[self._parentIds[idx]]
+
+    def _getDetails(self, idx: int) -> str:
+        """Returns the details of the result at the arrival index."""
+        if self._flags[idx] & _FLAG_DETAILS:
+            return self._details[idx]
+        return ""
+
+    def _index(self, row: int) -> int:
+        """Maps a row of the view to the arrival index of the result."""
+        return row if self._order is None else self._order[row]
+
+    def row(self, row: int) -> tuple[str, str, str]:
+        """
+        Returns the name, the parent path and the details at the row of
+        the view.
+        """
+        idx = self._index(row)
+        return self._getName(idx), self._getParent(idx), self._getDetails(idx)
+
+    def path(self, row: int) -> Path:
+        """Returns the path of the result at the row of the view."""
+        idx = self._index(row)
+        return Path(self._getParent(idx), self._getName(idx))
+
+    def offset(self, row: int) -> int:
+        """
+        Returns the byte offset of the content match at the row of the
+        view, or -1 if the result is not in the content of a file.
+        """
+        idx = self._index(row)
+        if self._flags[idx] & _FLAG_CONTENT:
+            return self._offsets[idx]
+        return -1
+
+    def getSort(self) -> tuple[int | None, bool]:
+        """
+        Returns the sorting column, or `None` for arrival order, and
+        whether it is sorted in descending order.
+        """
+        return self._sortCol, self._sortReverse
+
+    def sortBy(self, col: int, reverse: bool = False) -> None:
+        """
+        Sorts the view by the column. Re-sorting by the current column
+        in the other direction only reverses the order.
+        """
+        nResults = len(self)
+        if (self._order is not None
+                and col == self._sortCol
+                and len(self._order) == nResults):
+            if reverse != self._sortReverse:
+                self._order.reverse()
+        else:
+            if col == self.COL_PARENT:
+                # Ranking the interned parents once, so the sort compares
+                # integers rather than paths...
+                ranks = array("I", bytes(4 * len(self._dirs)))
+                for rank, parentId in enumerate(sorted(
+                        range(len(self._dirs)),
+                        key=self._dirs.__getitem__)):
+                    ranks[parentId] = rank
+                parentIds = self._parentIds
+                key: Callable[[int], int | str] = (
+                    lambda idx: ranks[parentIds[idx]])
+            elif col == self.COL_NAME:
+                key = self._getName
+            else:
+                key = self._getDetails
+            self._order = array("I", sorted(
+                range(nResults),
+                key=key,
+                reverse=reverse))
+        self._sortCol = col
+        self._sortReverse = reverse
@@ -0,0 +1,94 @@
+#
+#
+#
+
+from abc import abstractmethod
+from pathlib import Path
+from queue import Queue
+from typing import TYPE_CHECKING, Sequence
+
+from megacodist.fs import (
+    FsSearchOptions, FsSearchLocation, FsSearchMatch, IFsSearchable)
+
+from utils.matcher import MatchMode
+from utils.meta_filter import MetaFilter
+from utils.pruning import Pruner
+
+if TYPE_CHECKING:
+    # Imported lazily at run time, as it wraps searchers of this module,
+    # and the checkpoint only by the searches resuming...
+    from utils.checkpoint import SearchCheckpoint
+    from utils.search_stats import SearchStats
+
+
+class SearchContext:
+    """
+    What a search needs besides its text and its `FsSearchOptions`: how
+    the text is matched, and the state of the run that searchers update.
+    It is passed alongside the text to searchers implementing
+    `IContextSearchable`; others only ever see the text. A context is
+    made per search, as its pruner, statistics and checkpoint account
+    for that search alone.
+    """
+
+    def __init__(
+            self,
+            mode: MatchMode = MatchMode.SUBSTRING,
+            patterns: Sequence[str] = (),
+            pruner: Pruner | None = None,
+            stats: "SearchStats | None" = None,
+            filters: MetaFilter | None = None,
+            checkpoint: "SearchCheckpoint | None" = None,
+            ) -> None:
+        from utils.search_stats import SearchStats
+        self.mode = mode
+        """How the text is matched against names or contents."""
+        self.patterns = tuple(patterns)
+        """The patterns of an `ANY_OF` search; empty for other modes."""
+        self.pruner = pruner or Pruner()
+        """What the traversal leaves out."""
+        self.stats = stats or SearchStats()
+        """The counters of the search."""
+        self.filters = filters or MetaFilter()
+        """The extension, size and time the entries must have."""
+        self.checkpoint = checkpoint
+        """Where the progress is saved for resuming, if it is."""
+        self.notes: list[str] = []
+        """What the searcher tells about its results, such as staleness."""
+
+
+class IContextSearchable(IFsSearchable):
+    """
+    A searcher whose `search` also takes the `SearchContext` of the
+    search, falling back to a default one when it is not given. Call
+    searchers through `runSearch` to pass the context only to those
+    taking it.
+    """
+
+    @abstractmethod
+    def search(
+            self,
+            root_dir: str | Path,
+            search: str,
+            q: Queue[FsSearchLocation | FsSearchMatch],
+            options: FsSearchOptions = (
+                FsSearchOptions.FILES_INCLUDED
+                | FsSearchOptions.DIRS_INCLUDED),
+            context: SearchContext | None = None,
+            ) -> None:
+        pass
+
+
+def runSearch(
+        searcher: IFsSearchable,
+        root_dir: str | Path,
+        search: str,
+        q: Queue[FsSearchLocation | FsSearchMatch],
+        options: FsSearchOptions,
+        context: SearchContext | None,
+        ) -> None:
+    """Runs the search, passing the context if the searcher takes one."""
+    if isinstance(searcher, IContextSearchable):
+        searcher.search(root_dir, search, q, options, context)
+    else:
+        searcher.search(root_dir, search, q, options)
@@ -0,0 +1,322 @@
+#
+#
+#
+
+from collections import Counter
+import cProfile
+import json
+import logging
+import os
+from pathlib import Path
+from queue import Queue
+import sys
+import threading
+from time import perf_counter
+
+from megacodist.fs import (
+    FsSearchOptions, FsSearchLocation, FsSearchMatch, IFsSearchable)
+
+from utils.search_context import IContextSearchable, SearchContext, runSearch
+from utils.settings import CACHE_DIR
+
+
+STATS_PATH = CACHE_DIR / "search_stats.json"
+"""The JSON summary of the latest search run from the GUI."""
+
+PROFILE_PATH = CACHE_DIR / "search.prof"
+"""The cProfile statistics of the latest profiled search."""
+
+PROFILERS = ("none", "cprofile", "sampling")
+"""The profiling hooks `InstrumentedSearcher` supports."""
+
+
+class SearchStats:
+    """
+    The counters of one search run. Searchers aware of it update it a
+    directory at a time, from any thread; `InstrumentedSearcher` fills
+    in what it can observe from outside any searcher. It travels to the
+    searcher as `SearchContext.stats`.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.nDirs = 0
+        """The number of directories scanned."""
+        self.nEntries = 0
+        """The number of directory entries read."""
+        self.nStats = 0
+        """The number of `stat` calls beyond the directory listings."""
+        self.nMatches = 0
+        """The number of matches reported."""
+        self.queueDepth = 0
+        """The number of batches waiting for the consumer, last seen."""
+        self.maxQueueDepth = 0
+        """The largest number of batches seen waiting for the consumer."""
+        self.scanTime = 0.0
+        """The time spent listing directories, in seconds of any thread."""
+        self.matchTime = 0.0
+        """The time spent matching names, in seconds of any thread."""
+        self.putTime = 0.0
+        """The time spent putting results in the queue, in seconds."""
+        self.startTime: float | None = None
+        """The `perf_counter` time the run started at, if it did."""
+        self.wallTime = 0.0
+        """The duration of the run, in seconds, once it finished."""
+        self.samples: list[tuple[str, int]] = []
+        """
+        The functions most often found running by the sampling profiler
+        with their sample counts, if it ran.
+        """
+
+    def addDir(
+            self,
+            n_entries: int,
+            scan_time: float,
+            match_time: float,
+            n_stats: int = 0,
+            ) -> None:
+        """Accounts for the scan and the matching of a directory."""
+        with self._lock:
+            self.nEntries += n_entries
+            self.scanTime += scan_time
+            self.matchTime += match_time
+            self.nStats += n_stats
+
+    def addStats(self, n_stats: int) -> None:
+        """Accounts for `stat` calls made outside `addDir`."""
+        with self._lock:
+            self.nStats += n_stats
+
+    def getScanCounters(self) -> tuple[int, int, float, float]:
+        """
+        Returns the counters searchers update, as `(entries, stat calls,
+        scan time, match time)`, for handing over to `setScanCounters`.
+        """
+        with self._lock:
+            return self.nEntries, self.nStats, self.scanTime, self.matchTime
+
+    def setScanCounters(
+            self,
+            n_entries: int,
+            n_stats: int,
+            scan_time: float,
+            match_time: float,
+            ) -> None:
+        """
+        Sets the counters searchers update to those of a searcher run
+        elsewhere, such as in another process.
+        """
+        with self._lock:
+            self.nEntries = n_entries
+            self.nStats = n_stats
+            self.scanTime = scan_time
+            self.matchTime = match_time
+
+    def addPut(self, is_location: bool, put_time: float) -> None:
+        """Accounts for a result put in the queue."""
+        with self._lock:
+            self.putTime += put_time
+            if is_location:
+                self.nDirs += 1
+            else:
+                self.nMatches += 1
+
+    def getElapsed(self) -> float:
+        """Returns the duration of the run so far, in seconds."""
+        if self.startTime is None:
+            return 0.0
+        return self.wallTime or perf_counter() - self.startTime
+
+    def summary(self) -> str:
+        """Describes the counters in one short line for a status bar."""
+        elapsed = self.getElapsed()
+        rate = self.nEntries / elapsed if elapsed else 0.0
+        return (
+            f"{self.nDirs:,} folders, {self.nEntries:,} entries "
+            f"({rate:,.0f}/s), {self.nMatches:,} matches, "
+            f"scan {self.scanTime:.2f} s, match {self.matchTime:.2f} s, "
+            f"queue {self.putTime:.2f} s, depth {self.queueDepth}")
+
+    def toDict(self) -> dict:
+        """Returns the counters as a JSON-serializable dictionary."""
+        return {
+            "dirs": self.nDirs,
+            "entries": self.nEntries,
+            "stat_calls": self.nStats,
+            "matches": self.nMatches,
+            "max_queue_depth": self.maxQueueDepth,
+            "scandir_time": self.scanTime,
+            "match_time": self.matchTime,
+            "put_time": self.putTime,
+            "wall_time": self.getElapsed(),
+            "samples": [
+                {"function": func, "count": count}
+                for func, count in self.samples],}
+
+
+class _CountingQueue:
+    """
+    Stands in for the results queue of a searcher, counting locations
+    and matches and timing the puts on their way through. The depth of
+    the wrapped queue is sampled once per location.
+    """
+
+    def __init__(self, q: Queue, stats: SearchStats) -> None:
+        self._q = q
+        self._stats = stats
+        self._qsize = getattr(q, "qsize", None)
+
+    def put(self, item, block: bool = True, timeout=None) -> None:
+        start = perf_counter()
+        self._q.put(item, block, timeout)
+        isLocation = isinstance(item, FsSearchLocation)
+        self._stats.addPut(isLocation, perf_counter() - start)
+        if isLocation and self._qsize:
+            depth = self._qsize()
+            self._stats.queueDepth = depth
+            self._stats.maxQueueDepth = max(self._stats.maxQueueDepth, depth)
+
+    def put_nowait(self, item) -> None:
+        self.put(item, False)
+
+    def __getattr__(self, name: str):
+        return getattr(self._q, name)
+
+
+class _Sampler:
+    """
+    A sampling profiler: a daemon thread that looks at the frames of the
+    other threads every `interval` seconds and counts the functions it
+    finds running. It is far cheaper than cProfile and sees the worker
+    threads of parallel searchers too.
+    """
+
+    def __init__(self, interval: float = 0.005) -> None:
+        self._interval = interval
+        self._evtStop = threading.Event()
+        self._counts: Counter[str] = Counter()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._ignored = {threading.main_thread().ident}
+        """The threads not sampled: the GUI or CLI one, and the sampler."""
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self, top: int = 20) -> list[tuple[str, int]]:
+        """Stops sampling and returns the most sampled functions."""
+        self._evtStop.set()
+        self._thread.join()
+        return self._counts.most_common(top)
+
+    def _run(self) -> None:
+        self._ignored.add(threading.get_ident())
+        while not self._evtStop.wait(self._interval):
+            for ident, frame in sys._current_frames().items():
+                if ident in self._ignored:
+                    continue
+                code = frame.f_code
+                self._counts[
+                    f"{code.co_name} "
+                    f"({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+                    ] += 1
+
+
+class InstrumentedSearcher(IContextSearchable):
+    """
+    Wraps a searcher to collect `SearchStats` on every run: the wrapper
+    counts directories and matches and times the queue, while searchers
+    aware of the statistics add their own scan and matching counters.
+    At the end the statistics are written as JSON, and the run can be
+    profiled with cProfile, which sees the search thread only, or with
+    a sampling profiler, which sees every thread.
+    """
+
+    def __init__(
+            self,
+            searcher: IFsSearchable,
+            json_path: Path | None = None,
+            profiler: str = "none",
+            ) -> None:
+        """
+        Args:
+            searcher:
+                The searcher to instrument.
+            json_path:
+                Where to write the JSON summary of every run, if at all.
+            profiler:
+                One of `PROFILERS`. cProfile statistics are written to
+                `PROFILE_PATH`; samples go into the JSON summary.
+        """
+        self.name = getattr(searcher, "name", type(searcher).__name__)
+        self._searcher = searcher
+        self._jsonPath = json_path
+        self._profiler = profiler
+
+    def search(
+            self,
+            root_dir: str | Path,
+            search: str,
+            q: Queue[FsSearchLocation | FsSearchMatch],
+            options: FsSearchOptions = (
+                FsSearchOptions.FILES_INCLUDED
+                | FsSearchOptions.DIRS_INCLUDED),
+            context: SearchContext | None = None,
+            ) -> None:
+        context = context or SearchContext()
+        stats = context.stats
+        profile = cProfile.Profile() if self._profiler == "cprofile" else None
+        sampler = _Sampler() if self._profiler == "sampling" else None
+        stats.startTime = perf_counter()
+        if sampler:
+            sampler.start()
+        try:
+            if profile:
+                profile.enable()
+            runSearch(
+                self._searcher,
+                root_dir,
+                search,
+                _CountingQueue(q, stats), # type: ignore
+                options,
+                context)
+        finally:
+            if profile:
+                profile.disable()
+            stats.wallTime = perf_counter() - stats.startTime
+            stats.addStats(context.pruner.nStats)
+            if sampler:
+                stats.samples = sampler.stop()
+            if profile:
+                self._dumpProfile(profile)
+            if self._jsonPath:
+                self._writeSummary(root_dir, search, stats)
+
+    def stopSearch(self) -> None:
+        self._searcher.stopSearch()
+
+    def _dumpProfile(self, profile: cProfile.Profile) -> None:
+        try:
+            PROFILE_PATH.parent.mkdir(parents=True, exist_ok=True)
+            profile.dump_stats(PROFILE_PATH)
+        except OSError as err:
+            logging.debug(f"Cannot write the search profile: {err}")
+
+    def _writeSummary(
+            self,
+            root_dir: str | Path,
+            search: str,
+            stats: SearchStats,
+            ) -> None:
+        """Writes the JSON summary of the run."""
+        pthJson: Path = self._jsonPath # type: ignore
+        summary = {
+            "searcher": self.name,
+            "root": str(root_dir),
+            "search": str(search),
+            **stats.toDict(),}
+        try:
+            pthJson.parent.mkdir(parents=True, exist_ok=True)
+            with open(pthJson, "w", encoding="utf-8") as fileObj:
+                json.dump(summary, fileObj, indent=2)
+        except OSError as err:
+            logging.debug(f"Cannot write the search statistics: {err}")
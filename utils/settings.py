@@ -2,9 +2,18 @@
 #
 #
 
+from pathlib import Path
+
 from megacodist.settings import AppSettings
 
 
+CACHE_DIR = Path(__file__).resolve().parent.parent / "cache"
+"""
+The directory where the application keeps its on-disk caches, such as
+filename indexes.
+"""
+
+
 class FsAppSettings(AppSettings):
     """
     Settings for the fs-search application.
@@ -17,8 +26,26 @@ class FsAppSettings(AppSettings):
     # Columns width...
     item_col_width = 100
     path_col_width = 200
+    details_col_width = 150
     # Panes width...
     search_pane_width = 180
     results_pane_width = 500
+    # Caches...
+    query_cache_mb = 64
+    listing_cache_mb = 64
+    listing_cache_ttl = 300.0
     
     
+    # Pruning, leaving nothing out unless asked to...
+    prune_excludes: tuple[str, ...] = ()
+    prune_gitignore = False
+    prune_one_fs = False
+    follow_links = False
+    # Instrumentation...
+    profiler = "none"
+    # Isolation...
+    search_in_process = False
+    # Checkpoints...
+    checkpoint_interval = 30.0
+    # Ranking...
+    ranked_top_k = 1000
@@ -0,0 +1,765 @@
+#
+#
+#
+
+from array import array
+from bisect import bisect_left
+from collections import deque
+import errno
+from hashlib import sha1
+import logging
+import os
+from pathlib import Path
+import pickle
+import threading
+from typing import Callable, Iterable, Iterator, Sequence
+
+from utils.inotify import (
+    IN_CREATE, IN_DELETE, IN_DELETE_SELF, IN_IGNORED, IN_MOVE_SELF,
+    IN_MOVED_FROM, IN_MOVED_TO, IN_ONLYDIR, IN_Q_OVERFLOW, Inotify,
+    InotifyEvent)
+from utils.matcher import NameMatcher
+from utils.meta_filter import MetaFilter
+from utils.settings import CACHE_DIR
+
+
+INDEX_DIR = CACHE_DIR / "indexes"
+"""The directory where trigram indexes are persisted."""
+
+_FLAG_DIR = 0x01
+"""The entry flag marking an entry as a directory."""
+_FLAG_DEAD = 0x02
+"""The entry flag marking an entry as removed since it was indexed."""
+
+
+def _trigrams(text: str) -> set[str]:
+    """Returns the set of all 3-character substrings of the text."""
+    return {text[idx:idx + 3] for idx in range(len(text) - 2)}
+
+
+class TrigramIndex:
+    """
+    A compact filename index of a directory tree. Directories are kept
+    in a parent-pointer table so parent paths are never stored in full,
+    and every entry name is posted under the trigrams of its case-folded
+    form so that substring queries only verify a handful of candidates.
+
+    The modification time and inode of every directory are recorded
+    when it is scanned, so `refresh` only re-scans the directories that
+    changed since. Removed entries are flagged dead rather than deleted
+    and the index is compacted once they pile up.
+
+    The size and modification time of every entry are kept in columns
+    too, so `MetaFilter` queries never touch the disk; they are as fresh
+    as the latest scan of the directory of the entry.
+    """
+
+    _VERSION = 3
+    """The version of the on-disk format."""
+
+    _STATE = (
+        "_dirParents", "_dirNames", "_dirMtimes", "_dirInos",
+        "_entDirs", "_entNames", "_entFlags", "_entSubdirs",
+        "_entSizes", "_entMtimes", "_postings", "_nDead",)
+    """The attributes making up the persisted state of an index."""
+
+    _lock = threading.Lock()
+    _loaded: dict[str, "TrigramIndex"] = {}
+    """
+    The indexes already loaded in this process:
+    `root directory => index`
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        """The root directory this index covers."""
+        self.mutex = threading.RLock()
+        """Serializes queries and updates of this index."""
+        self.watcher: "IndexWatcher | None" = None
+        """The inotify watcher keeping this index current, if any."""
+        self.dirty = False
+        """Whether the index changed since it was last saved."""
+        self._dirParents = array("q")
+        """The ID of the parent of each directory, `-1` for the root."""
+        self._dirNames: list[str] = []
+        """The name of each directory; the root keeps its full path."""
+        self._dirMtimes = array("q")
+        """The `st_mtime_ns` of each directory when it was scanned."""
+        self._dirInos = array("Q")
+        """The inode of each directory when it was scanned."""
+        self._entDirs = array("Q")
+        """The ID of the directory containing each entry."""
+        self._entNames: list[str] = []
+        """The name of each entry."""
+        self._entFlags = bytearray()
+        """The flags of each entry."""
+        self._entSubdirs = array("q")
+        """The directory ID of each entry that is a directory, or `-1`."""
+        self._entSizes = array("q")
+        """The size of each entry in bytes when it was scanned."""
+        self._entMtimes = array("d")
+        """The modification time of each entry when it was scanned."""
+        self._postings: dict[str, array] = {}
+        """
+        The posting lists of entry IDs in ascending order:
+        `trigram => array of entry IDs`
+        """
+        self._nDead = 0
+        """The number of dead entries."""
+        self._dirEnts: dict[int, list[int]] | None = None
+        """
+        The IDs of the live entries of each directory, derived on the
+        first refresh and maintained from then on:
+        `directory ID => entry IDs`
+        """
+
+    @classmethod
+    def getPath(cls, root: Path) -> Path:
+        """Returns the on-disk location of the index of the root."""
+        digest = sha1(str(root).encode("utf-8", "surrogateescape"))
+        return INDEX_DIR / f"{digest.hexdigest()}.idx"
+
+    @classmethod
+    def open(cls, root: Path) -> "TrigramIndex | None":
+        """
+        Returns the index of the root from memory or disk, or `None` if
+        it has not been built yet or its file is unreadable.
+        """
+        with cls._lock:
+            index = cls._loaded.get(str(root))
+        if index is not None:
+            return index
+        try:
+            with open(cls.getPath(root), "rb") as fileObj:
+                version, state = pickle.load(fileObj)
+        except FileNotFoundError:
+            return None
+        except Exception as err:
+            logging.error(f"Cannot load the index of '{root}': {err}")
+            return None
+        if version != cls._VERSION:
+            return None
+        index = cls(root)
+        index.__dict__.update(state)
+        with cls._lock:
+            cls._loaded[str(root)] = index
+        return index
+
+    def save(self) -> None:
+        """Persists the index to disk and registers it in memory."""
+        pthIndex = self.getPath(self.root)
+        pthIndex.parent.mkdir(parents=True, exist_ok=True)
+        pthTemp = pthIndex.with_suffix(".tmp")
+        with self.mutex:
+            state = {attr: getattr(self, attr) for attr in self._STATE}
+            with open(pthTemp, "wb") as fileObj:
+                pickle.dump(
+                    (self._VERSION, state),
+                    fileObj,
+                    pickle.HIGHEST_PROTOCOL)
+            self.dirty = False
+        os.replace(pthTemp, pthIndex)
+        with self._lock:
+            self._loaded[str(self.root)] = self
+
+    def __len__(self) -> int:
+        return len(self._entNames) - self._nDead
+
+    def _addDir(self, parent_id: int, name: str) -> int:
+        """Appends a directory record and returns its ID."""
+        self._dirParents.append(parent_id)
+        self._dirNames.append(name)
+        self._dirMtimes.append(0)
+        self._dirInos.append(0)
+        dirId = len(self._dirNames) - 1
+        if self._dirEnts is not None:
+            self._dirEnts[dirId] = []
+        return dirId
+
+    def _addEntry(
+            self,
+            dir_id: int,
+            name: str,
+            subdir_id: int,
+            size: int = 0,
+            mtime: float = 0.0,
+            ) -> None:
+        """Appends an entry record and posts it under its trigrams."""
+        entId = len(self._entNames)
+        self._entDirs.append(dir_id)
+        self._entNames.append(name)
+        self._entFlags.append(_FLAG_DIR if subdir_id >= 0 else 0)
+        self._entSubdirs.append(subdir_id)
+        self._entSizes.append(size)
+        self._entMtimes.append(mtime)
+        if self._dirEnts is not None:
+            self._dirEnts[dir_id].append(entId)
+        for gram in _trigrams(name.casefold()):
+            try:
+                self._postings[gram].append(entId)
+            except KeyError:
+                self._postings[gram] = array("Q", (entId,))
+
+    def _killEntry(self, ent_id: int) -> None:
+        """Flags the entry, and the subtree under it, as dead."""
+        stack = [ent_id]
+        while stack:
+            entId = stack.pop()
+            self._entFlags[entId] |= _FLAG_DEAD
+            self._nDead += 1
+            subdirId = self._entSubdirs[entId]
+            if subdirId >= 0 and self._dirEnts is not None:
+                stack.extend(self._dirEnts.pop(subdirId, ()))
+
+    def _scanTree(
+            self,
+            dir_id: int,
+            pth_dir: Path,
+            on_dir: Callable[[Path], None] | None = None,
+            should_stop: Callable[[], bool] | None = None,
+            ) -> bool:
+        """
+        Scans the subtree of a directory which has no entries yet into
+        this index breadth-first. Returns `False` if it was stopped.
+        """
+        frontier = deque([(dir_id, pth_dir)])
+        while frontier:
+            if should_stop and should_stop():
+                return False
+            dirId, pthDir = frontier.popleft()
+            if on_dir:
+                on_dir(pthDir)
+            try:
+                # Stat before listing so changes made during the listing
+                # show up as a newer mtime on the next refresh...
+                stat = os.stat(pthDir)
+                self._dirMtimes[dirId] = stat.st_mtime_ns
+                self._dirInos[dirId] = stat.st_ino
+                with os.scandir(pthDir) as entries:
+                    for entry in entries:
+                        try:
+                            isDir = entry.is_dir(follow_symlinks=False)
+                        except OSError:
+                            isDir = False
+                        if isDir:
+                            subdirId = self._addDir(dirId, entry.name)
+                            frontier.append((subdirId, Path(entry.path)))
+                        else:
+                            subdirId = -1
+                        self._addEntry(
+                            dirId,
+                            entry.name,
+                            subdirId,
+                            *_getEntryMeta(entry))
+            except OSError as err:
+                logging.debug(f"Cannot scan '{pthDir}': {err}")
+        return True
+
+    def build(
+            self,
+            on_dir: Callable[[Path], None] | None = None,
+            should_stop: Callable[[], bool] | None = None,
+            ) -> bool:
+        """
+        Scans the whole tree under the root into this empty index.
+
+        Args:
+            on_dir:
+                Called with the path of every directory before it is
+                scanned, to report progress.
+            should_stop:
+                Polled between directories; the build is abandoned as
+                soon as it returns `True`.
+
+        Returns:
+            `True` if the build completed, `False` if it was stopped.
+        """
+        with self.mutex:
+            self.dirty = True
+            return self._scanTree(
+                self._addDir(-1, str(self.root)),
+                self.root,
+                on_dir,
+                should_stop)
+
+    def _ensureDirEnts(self) -> dict[int, list[int]]:
+        """Derives the live entries of every directory if not done yet."""
+        if self._dirEnts is None:
+            dirEnts: dict[int, list[int]] = {0: []}
+            for entId, dirId in enumerate(self._entDirs):
+                if self._entFlags[entId] & _FLAG_DEAD:
+                    continue
+                dirEnts.setdefault(dirId, []).append(entId)
+                if self._entSubdirs[entId] >= 0:
+                    dirEnts.setdefault(self._entSubdirs[entId], [])
+            self._dirEnts = dirEnts
+        return self._dirEnts
+
+    def _rescanDir(
+            self,
+            dir_id: int,
+            pth_dir: Path,
+            on_dir: Callable[[Path], None] | None = None,
+            ) -> None:
+        """
+        Re-lists a directory whose entries are already indexed, kills
+        the entries that disappeared and scans the ones that appeared.
+        """
+        # Declaring variables ---------------------------------
+        dirEnts = self._ensureDirEnts()
+        current: dict[str, int]
+        # Re-listing the directory ----------------------------
+        if on_dir:
+            on_dir(pth_dir)
+        try:
+            stat = os.stat(pth_dir)
+            with os.scandir(pth_dir) as entries:
+                listing = list(entries)
+        except OSError as err:
+            logging.debug(f"Cannot scan '{pth_dir}': {err}")
+            return
+        self._dirMtimes[dir_id] = stat.st_mtime_ns
+        self._dirInos[dir_id] = stat.st_ino
+        self.dirty = True
+        current = {self._entNames[entId]: entId for entId in dirEnts[dir_id]}
+        # _addEntry appends the new entries to this list too...
+        live: list[int] = []
+        dirEnts[dir_id] = live
+        newDirs: list[tuple[int, Path]] = []
+        for entry in listing:
+            try:
+                isDir = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                isDir = False
+            size, mtime = _getEntryMeta(entry)
+            entId = current.pop(entry.name, -1)
+            if entId >= 0:
+                if isDir == bool(self._entFlags[entId] & _FLAG_DIR):
+                    live.append(entId)
+                    self._entSizes[entId] = size
+                    self._entMtimes[entId] = mtime
+                    continue
+                self._killEntry(entId)
+            if isDir:
+                subdirId = self._addDir(dir_id, entry.name)
+                newDirs.append((subdirId, Path(entry.path)))
+            else:
+                subdirId = -1
+            self._addEntry(dir_id, entry.name, subdirId, size, mtime)
+        for entId in current.values():
+            self._killEntry(entId)
+        for subdirId, pthSubdir in newDirs:
+            self._scanTree(subdirId, pthSubdir, on_dir)
+
+    def refresh(
+            self,
+            on_dir: Callable[[Path], None] | None = None,
+            should_stop: Callable[[], bool] | None = None,
+            ) -> bool:
+        """
+        Brings the index up to date by statting every indexed directory
+        and re-scanning only those whose mtime or inode changed.
+
+        Args:
+            on_dir:
+                Called with the path of every directory before it is
+                re-scanned, to report progress.
+            should_stop:
+                Polled between directories; the refresh is abandoned as
+                soon as it returns `True`, leaving a consistent index.
+
+        Returns:
+            `True` if the refresh completed, `False` if it was stopped.
+        """
+        with self.mutex:
+            dirEnts = self._ensureDirEnts()
+            dirCache: dict[int, Path] = {}
+            stack = [0]
+            while stack:
+                if should_stop and should_stop():
+                    return False
+                dirId = stack.pop()
+                pthDir = self.dirPath(dirId, dirCache)
+                try:
+                    stat = os.stat(pthDir)
+                except OSError:
+                    # The parent re-scan drops the directory...
+                    continue
+                if (stat.st_mtime_ns != self._dirMtimes[dirId]
+                        or stat.st_ino != self._dirInos[dirId]):
+                    self._rescanDir(dirId, pthDir, on_dir)
+                stack.extend(
+                    self._entSubdirs[entId]
+                    for entId in dirEnts.get(dirId, ())
+                    if self._entSubdirs[entId] >= 0)
+            self._compactIfDead()
+            return True
+
+    def refreshDirs(self, dir_ids: Iterable[int]) -> bool:
+        """
+        Re-scans the directories, for example on inotify events, then
+        compacts the index if dead entries pile up.
+
+        Returns:
+            `True` if the index was compacted, which changes the IDs of
+            the directories.
+        """
+        with self.mutex:
+            for dirId in dir_ids:
+                if self._dirEnts is not None and dirId not in self._dirEnts:
+                    # The directory was killed in the meantime...
+                    continue
+                self._rescanDir(dirId, self.dirPath(dirId, {}))
+            return self._compactIfDead()
+
+    def _compactIfDead(self) -> bool:
+        """
+        Compacts the index once its dead entries outnumber the live
+        ones. Returns `True` if it did. The lock must be held.
+        """
+        if self._nDead <= len(self):
+            return False
+        self.compact()
+        return True
+
+    def compact(self) -> None:
+        """Rebuilds the records and postings without the dead entries."""
+        with self.mutex:
+            dirEnts = self._ensureDirEnts()
+            compacted = TrigramIndex(self.root)
+            compacted._dirEnts = {}
+            frontier = deque([(0, compacted._addDir(-1, str(self.root)))])
+            while frontier:
+                oldDirId, newDirId = frontier.popleft()
+                compacted._dirMtimes[newDirId] = self._dirMtimes[oldDirId]
+                compacted._dirInos[newDirId] = self._dirInos[oldDirId]
+                for entId in dirEnts.get(oldDirId, ()):
+                    name = self._entNames[entId]
+                    oldSubdirId = self._entSubdirs[entId]
+                    if oldSubdirId >= 0:
+                        newSubdirId = compacted._addDir(newDirId, name)
+                        frontier.append((oldSubdirId, newSubdirId))
+                    else:
+                        newSubdirId = -1
+                    compacted._addEntry(
+                        newDirId,
+                        name,
+                        newSubdirId,
+                        self._entSizes[entId],
+                        self._entMtimes[entId])
+            for attr in (*self._STATE, "_dirEnts"):
+                setattr(self, attr, getattr(compacted, attr))
+            self.dirty = True
+
+    def _candidates(self, matcher: NameMatcher) -> Sequence[int]:
+        """
+        Returns, in ascending order, the IDs of the entries that may
+        match according to the trigram postings. The sequence is a copy,
+        so updates of the index leave it alone.
+        """
+        literals = matcher.literals or ("",)
+        gramSets = [_trigrams(literal.casefold()) for literal in literals]
+        if not all(gramSets):
+            # Some literal is too short to pre-filter by...
+            return range(len(self._entNames))
+        elif len(gramSets) == 1:
+            return self._gramsCandidates(gramSets[0])
+        else:
+            entIds: set[int] = set()
+            for grams in gramSets:
+                entIds.update(self._gramsCandidates(grams))
+            return sorted(entIds)
+
+    def _gramsCandidates(self, grams: set[str]) -> Sequence[int]:
+        """
+        Returns, in ascending order, a copy of the IDs of the entries
+        posted under all of the trigrams.
+        """
+        postings: list[array] = []
+        for gram in grams:
+            posting = self._postings.get(gram)
+            if posting is None:
+                return []
+            postings.append(posting)
+        # Intersecting from the shortest list, so the candidates only
+        # ever shrink, probing each longer list by bisection as postings
+        # are sorted...
+        postings.sort(key=len)
+        entIds: Sequence[int] = postings[0][:]
+        for posting in postings[1:]:
+            entIds = [
+                entId for entId in entIds
+                if _isPosted(posting, entId)]
+            if not entIds:
+                break
+        return entIds
+
+    def dirPath(self, dir_id: int, cache: dict[int, Path]) -> Path:
+        """
+        Returns the full path of the directory, memoizing every
+        ancestor resolved along the way in the cache.
+        """
+        return _resolveDir(self._dirParents, self._dirNames, dir_id, cache)
+
+    def isRootChanged(self) -> bool:
+        """
+        Determines whether entries were added to, removed from or
+        renamed in the root directory since it was last scanned.
+        """
+        try:
+            stat = os.stat(self.root)
+        except OSError:
+            return True
+        with self.mutex:
+            return (
+                stat.st_mtime_ns != self._dirMtimes[0]
+                or stat.st_ino != self._dirInos[0])
+
+    def search(
+            self,
+            matcher: NameMatcher,
+            include_files: bool = True,
+            include_dirs: bool = True,
+            accept: Callable[[Path, bool], bool] | None = None,
+            filters: MetaFilter | None = None,
+            ) -> Iterator[Path]:
+        """
+        Yields the paths of all entries accepted by the matcher, by the
+        filters answered from the stored columns, and, if given, by
+        `accept` called with the path and whether it is a directory.
+        """
+        dirCache: dict[int, Path] = {}
+        if filters is not None and filters.isEmpty():
+            filters = None
+        # Taking the candidates and the columns under the lock only, so
+        # the caller can take its time between paths. Compacting swaps
+        # the columns for new ones, and other updates only append to
+        # them or change single items, so those taken stay consistent...
+        with self.mutex:
+            entIds = self._candidates(matcher)
+            entFlags = self._entFlags
+            entNames = self._entNames
+            entDirs = self._entDirs
+            entSizes = self._entSizes
+            entMtimes = self._entMtimes
+            dirParents = self._dirParents
+            dirNames = self._dirNames
+        for entId in entIds:
+            flags = entFlags[entId]
+            if flags & _FLAG_DEAD:
+                continue
+            isDir = bool(flags & _FLAG_DIR)
+            if not (include_dirs if isDir else include_files):
+                continue
+            name = entNames[entId]
+            if filters and not filters.acceptsName(name, isDir):
+                continue
+            if not matcher(name):
+                continue
+            if filters and not filters.acceptsStat(
+                    entSizes[entId],
+                    entMtimes[entId],
+                    isDir):
+                continue
+            path = _resolveDir(
+                dirParents,
+                dirNames,
+                entDirs[entId],
+                dirCache) / name
+            if accept is None or accept(path, isDir):
+                yield path
+
+    def startWatcher(self) -> bool:
+        """
+        Starts an inotify watcher keeping this index current while the
+        application runs. Returns `True` if the index is being watched.
+        """
+        with self.mutex:
+            if self.watcher is None or not self.watcher.isAlive():
+                try:
+                    self.watcher = IndexWatcher(self)
+                except OSError as err:
+                    logging.info(f"Cannot watch '{self.root}': {err}")
+                    self.watcher = None
+                    return False
+                self.watcher.start()
+            return True
+
+
+def _resolveDir(
+        dir_parents: array,
+        dir_names: list[str],
+        dir_id: int,
+        cache: dict[int, Path],
+        ) -> Path:
+    """
+    Returns the full path of the directory from the parent and name
+    columns, memoizing every ancestor resolved along the way.
+    """
+    # Climbing up to the nearest resolved ancestor...
+    chain: list[int] = []
+    dirId = dir_id
+    while dirId >= 0 and dirId not in cache:
+        chain.append(dirId)
+        dirId = dir_parents[dirId]
+    # Resolving the chain back down...
+    pthDir = cache[dirId] if dirId >= 0 else Path()
+    for dirId in reversed(chain):
+        pthDir = pthDir / dir_names[dirId]
+        cache[dirId] = pthDir
+    return pthDir
+
+
+def _isPosted(posting: array, ent_id: int) -> bool:
+    """Tells whether the sorted posting holds the entry ID."""
+    idx = bisect_left(posting, ent_id)
+    return idx < len(posting) and posting[idx] == ent_id
+
+
+def _getEntryMeta(entry: os.DirEntry) -> tuple[int, float]:
+    """
+    Returns the size and the modification time of the entry, without
+    following symbolic links, or zeros if it cannot be statted.
+    """
+    try:
+        stat = entry.stat(follow_symlinks=False)
+    except OSError:
+        return 0, 0.0
+    return stat.st_size, stat.st_mtime
+
+
+class IndexWatcher:
+    """
+    Keeps a `TrigramIndex` current by re-scanning each directory that
+    inotify reports as changed. Falls back to a full `refresh` if the
+    event queue overflows. Directories it may not watch are skipped and
+    counted; if the tree has more directories than the per-user watch
+    limit allows, it refreshes the whole index every `POLL_INTERVAL`
+    seconds instead.
+    """
+
+    POLL_INTERVAL = 30.0
+    """The seconds between refreshes once the watch limit is reached."""
+
+    _MASK = (
+        IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO
+        | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+
+    def __init__(self, index: TrigramIndex) -> None:
+        self._index = index
+        self._inotify = Inotify()
+        self._mpWdDir: dict[int, int] = {}
+        """
+        The mapping between watch descriptors and directory IDs:
+        `wd => directory ID`
+        """
+        self.nDenied = 0
+        """The number of directories left unwatched for lack of rights."""
+        self._evtStop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._evtStop.set()
+
+    def isAlive(self) -> bool:
+        return self._thread.is_alive() and not self._evtStop.is_set()
+
+    def _watchAll(self) -> None:
+        """Adds a watch for every live directory of the index."""
+        index = self._index
+        self.nDenied = 0
+        with index.mutex:
+            dirEnts = index._ensureDirEnts()
+            dirCache: dict[int, Path] = {}
+            for dirId in list(dirEnts):
+                self._watch(dirId, index.dirPath(dirId, dirCache))
+        if self.nDenied:
+            logging.info(
+                f"Cannot watch {self.nDenied:,} folders of "
+                f"'{index.root}': permission denied")
+
+    def _watch(self, dir_id: int, pth_dir: Path) -> None:
+        """
+        Watches the directory, skipping it if it is gone or may not be
+        read. Raises `OSError` with `ENOSPC` once the watch limit is
+        reached.
+        """
+        try:
+            wd = self._inotify.addWatch(pth_dir, self._MASK)
+        except FileNotFoundError:
+            return
+        except PermissionError:
+            self.nDenied += 1
+            return
+        self._mpWdDir[wd] = dir_id
+
+    def _run(self) -> None:
+        try:
+            try:
+                self._watchAll()
+                while not self._evtStop.is_set():
+                    events = self._inotify.read(0.5)
+                    if not events:
+                        continue
+                    self._apply(events)
+            except OSError as err:
+                if err.errno != errno.ENOSPC:
+                    raise
+                logging.warning(
+                    f"Too many folders to watch in '{self._index.root}', "
+                    f"refreshing it every {self.POLL_INTERVAL:g} s "
+                    f"instead: {err}")
+                self._inotify.close()
+                self._mpWdDir.clear()
+                self._poll()
+        except OSError as err:
+            logging.warning(
+                f"Stopped watching '{self._index.root}': {err}")
+        finally:
+            self._evtStop.set()
+            self._inotify.close()
+
+    def _poll(self) -> None:
+        """Refreshes the whole index periodically until stopped."""
+        while not self._evtStop.wait(self.POLL_INTERVAL):
+            self._index.refresh(should_stop=self._evtStop.is_set)
+
+    def _apply(self, events: list[InotifyEvent]) -> None:
+        """Re-scans the directories the events were raised for."""
+        index = self._index
+        if any(event.mask & IN_Q_OVERFLOW for event in events):
+            index.refresh()
+            self._rewatch()
+            return
+        dirIds: set[int] = set()
+        for event in events:
+            dirId = self._mpWdDir.get(event.wd)
+            if dirId is None:
+                continue
+            if event.mask & IN_IGNORED:
+                del self._mpWdDir[event.wd]
+            elif event.mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                self._inotify.removeWatch(event.wd)
+            else:
+                dirIds.add(dirId)
+        nDirs = len(index._dirNames)
+        if index.refreshDirs(dirIds):
+            self._rewatch()
+            return
+        # Watching the directories that the re-scans discovered...
+        with index.mutex:
+            dirCache: dict[int, Path] = {}
+            for dirId in range(nDirs, len(index._dirNames)):
+                if dirId in index._ensureDirEnts():
+                    self._watch(dirId, index.dirPath(dirId, dirCache))
+
+    def _rewatch(self) -> None:
+        """Replaces every watch, as directory IDs may have changed."""
+        for wd in self._mpWdDir:
+            self._inotify.removeWatch(wd)
+        self._mpWdDir.clear()
+        self._watchAll()
+
@@ -0,0 +1,96 @@
+#
+#
+#
+
+import tkinter as tk
+from tkinter import ttk
+from pathlib import Path
+
+
+class PreviewPane(ttk.Frame):
+    """
+    A read-only view of a window of a file around a byte offset, with
+    the line at the offset highlighted. Only the window is read, so
+    previewing a match deep in a large file stays cheap.
+    """
+
+    _BEFORE = 4096
+    """The number of bytes shown before the offset at most."""
+
+    _AFTER = 12288
+    """The number of bytes shown after the offset at most."""
+
+    def __init__(self, parent) -> None:
+        super().__init__(parent)
+        self._initGui()
+
+    def _initGui(self) -> None:
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(1, weight=1)
+        self._lbl_path = ttk.Label(self, anchor="w", padding=(5, 2))
+        self._lbl_path.grid(row=0, column=0, columnspan=2, sticky="ew")
+        self._txt_preview = tk.Text(
+            self,
+            wrap="none",
+            state=tk.DISABLED,
+            undo=False,)
+        self._txt_preview.tag_configure("hit", background="#fff2a8")
+        self._vsb = ttk.Scrollbar(
+            self, orient="vertical",
+            command=self._txt_preview.yview,)
+        self._hsb = ttk.Scrollbar(
+            self, orient="horizontal",
+            command=self._txt_preview.xview,)
+        self._txt_preview.configure(
+            yscrollcommand=self._vsb.set,
+            xscrollcommand=self._hsb.set,)
+        self._txt_preview.grid(row=1, column=0, sticky="nsew")
+        self._vsb.grid(row=1, column=1, sticky="ns")
+        self._hsb.grid(row=2, column=0, sticky="ew")
+
+    def clear(self) -> None:
+        """Clears the preview."""
+        self._lbl_path.config(text="")
+        self._setText("")
+
+    def showFile(self, path: Path, offset: int = -1) -> None:
+        """
+        Previews the file around the byte offset, or its beginning if
+        the offset is negative.
+        """
+        self._lbl_path.config(text=str(path))
+        if not path.is_file():
+            self._setText("")
+            return
+        start = max(0, offset - self._BEFORE)
+        try:
+            with open(path, "rb") as fileObj:
+                fileObj.seek(start)
+                data = fileObj.read(offset - start + self._AFTER
+                    if offset >= 0 else self._AFTER)
+        except OSError as err:
+            self._setText(f"Cannot read the file: {err}")
+            return
+        if b"\0" in data[:8192]:
+            self._setText("Binary file.")
+            return
+        # Starting at a whole line...
+        if start:
+            skipped = data.find(b"\n", 0, offset - start) + 1
+            data = data[skipped:]
+            start += skipped
+        self._setText(data.decode("utf-8", "replace"))
+        if offset >= 0:
+            self._highlightLine(data[:offset - start])
+
+    def _highlightLine(self, before: bytes) -> None:
+        """Highlights and shows the line at the end of the bytes."""
+        lineNum = before.count(b"\n") + 1
+        self._txt_preview.tag_add("hit", f"{lineNum}.0", f"{lineNum}.end")
+        self._txt_preview.see(f"{lineNum}.0")
+
+    def _setText(self, text: str) -> None:
+        self._txt_preview.config(state=tk.NORMAL)
+        self._txt_preview.delete("1.0", tk.END)
+        self._txt_preview.insert("1.0", text)
+        self._txt_preview.config(state=tk.DISABLED)
@@ -1,5 +1,5 @@
 #
-# 
+#
 #
 
 import tkinter as tk
@@ -9,25 +9,41 @@ import os
 import platform
 import subprocess
 import logging
-from typing import Callable
+from typing import Callable, Iterable, Iterator
+
+from utils.result_store import ResultStore
+
 
 class ResultsView(ttk.Frame):
     """
     A custom widget to display search results in a Treeview with scrollbars.
+    The Treeview is virtual: it only ever holds the rows that fit in the
+    widget and fills them from a `ResultStore`, so its cost does not
+    depend on the number of results.
     """
 
+    _HEADINGS = ("Item", "Path", "Details")
+    """The headings of the columns."""
+
     def __init__(
             self,
             parent,
             on_item_double_click: Callable[[Path], None] | None = None,
+            on_item_select: Callable[[Path, int], None] | None = None,
             ) -> None:
         super().__init__(parent)
-        self._mpIidPath: dict[str, Path] = {}
-        """
-        The mapping between items' ID and their path objects:
-        `iid -> Path`
-        """
+        self._store = ResultStore()
+        """The store of all results in this view."""
+        self._top = 0
+        """The row of the store shown at the top of the Treeview."""
+        self._nVisible = 1
+        """The number of rows fitting in the Treeview."""
+        self._selected: int | None = None
+        """The row of the store which is selected, if any."""
+        self._afterId_render: str | None = None
         self._onItemDoubleClicked = on_item_double_click
+        self._onItemSelected = on_item_select
+        """Called with the path and the byte offset of selected results."""
         self._initGui()
 
     def _initGui(self):
@@ -36,62 +52,276 @@ class ResultsView(ttk.Frame):
         self.rowconfigure(0, weight=1)
         # Create Treeview
         self._treevw = ttk.Treeview(
-            self, columns=("Item", "Path"),
-            show="headings",)
-        self.setColumnsSize(100, 200)
-        self._treevw.heading("Item", text="Item")
-        self._treevw.heading("Path", text="Path")
+            self, columns=self._HEADINGS,
+            show="headings",
+            selectmode="browse",)
+        self.setColumnsSize(100, 200, 150)
+        for col, heading in enumerate(self._HEADINGS):
+            self._treevw.heading(
+                heading,
+                text=heading,
+                command=lambda col=col: self._onHeadingClicked(col))
         # Create scrollbars
         self._vsb = ttk.Scrollbar(
             self, orient="vertical",
-            command=self._treevw.yview,)
+            command=self._onScroll,)
         self._hsb = ttk.Scrollbar(
             self, orient="horizontal",
             command=self._treevw.xview,)
-        self._treevw.configure(
-            yscrollcommand=self._vsb.set,
-            xscrollcommand=self._hsb.set,)
+        self._treevw.configure(xscrollcommand=self._hsb.set,)
         # Place widgets
         self._treevw.grid(row=0, column=0, sticky="nsew")
         self._vsb.grid(row=0, column=1, sticky="ns")
         self._hsb.grid(row=1, column=0, sticky="ew")
-        # Bind double-click event
+        # Bind events
         self._treevw.bind("<Double-1>", self._onDoubleClick)
+        self._treevw.bind("<Configure>", self._onConfigure)
+        self._treevw.bind("<<TreeviewSelect>>", self._onSelect)
+        self._treevw.bind("<MouseWheel>", self._onMouseWheel)
+        self._treevw.bind("<Button-4>", self._onMouseWheel)
+        self._treevw.bind("<Button-5>", self._onMouseWheel)
+        for key, delta in (
+                ("<Up>", -1), ("<Down>", 1),
+                ("<Prior>", "page-up"), ("<Next>", "page-down"),
+                ("<Home>", "home"), ("<End>", "end")):
+            self._treevw.bind(
+                key,
+                lambda _, delta=delta: self._onKey(delta))
 
     def clear(self):
-        """Clears all items from the Treeview."""
-        for item in self._treevw.get_children():
-            self._treevw.delete(item)
-        self._mpIidPath.clear()
-
-    def add(self, path: Path):
-        """Adds a Path object to the Treeview."""
-        iid = self._treevw.insert(
-            parent="",
-            index="end",
-            values=(path.name, str(path.parent)))
-        self._mpIidPath[iid] = path
+        """Clears all items from the view in constant time."""
+        self._store.clear()
+        self._top = 0
+        self._selected = None
+        self._updateHeadings()
+        self._render()
+
+    def retain(self, keep: Callable[[str], bool]) -> None:
+        """Drops the results whose name the predicate rejects."""
+        self._store.retain(keep)
+        self._top = 0
+        self._selected = None
+        self._render()
+
+    def replace(self, rows: Iterable[tuple[Path, str, int]]) -> None:
+        """
+        Replaces all results with the rows of `(path, details, offset)`,
+        such as a new ranking of the best matches, keeping the sorting,
+        the scrolling and the selected result where it is still listed.
+        """
+        selected = None
+        if self._selected is not None:
+            selected = self._store.path(self._selected)
+        sortCol, reverse = self._store.getSort()
+        self._store.clear()
+        for path, details, offset in rows:
+            self._store.append(path, details, offset)
+        if sortCol is not None:
+            self._store.sortBy(sortCol, reverse)
+        self._selected = None
+        if selected is not None:
+            for row in range(len(self._store)):
+                if self._store.path(row) == selected:
+                    self._selected = row
+                    break
+        self._render()
+
+    @property
+    def store(self) -> ResultStore:
+        """The store of all results in this view, for reading."""
+        return self._store
+
+    def getPaths(self) -> Iterator[Path]:
+        """Yields the paths of all results in arrival order."""
+        return self._store.paths()
+
+    def getPathStrs(self) -> Iterator[str]:
+        """Yields the paths of all results as strings in arrival order."""
+        return self._store.pathStrs()
+
+    def add(self, path: Path, details: str = "", offset: int = -1):
+        """
+        Adds a Path object, and optionally its details and the byte offset
+        of a content match, to the view.
+        """
+        self._store.append(path, details, offset)
+        self._scheduleRender()
+
+    def _scheduleRender(self) -> None:
+        """Coalesces many additions into one rendering."""
+        if self._afterId_render is None:
+            self._afterId_render = self.after_idle(self._render)
+
+    def _getRowHeight(self) -> int:
+        """Returns the height of the rows of the Treeview in pixels."""
+        children = self._treevw.get_children()
+        if children:
+            bbox = self._treevw.bbox(children[0])
+            if bbox:
+                return max(1, bbox[3])
+        height = ttk.Style().lookup("Treeview", "rowheight")
+        return int(height) if height else 20
+
+    def _getVisibleCount(self) -> int:
+        """Returns the number of rows fitting in the Treeview."""
+        rowHeight = self._getRowHeight()
+        children = self._treevw.get_children()
+        bbox = self._treevw.bbox(children[0]) if children else None
+        # The first row starts right below the headings...
+        headerHeight = bbox[1] if bbox else rowHeight
+        return max(
+            1,
+            (self._treevw.winfo_height() - headerHeight) // rowHeight)
+
+    def _render(self) -> None:
+        """Fills the rows of the Treeview from the visible window."""
+        self._afterId_render = None
+        nResults = len(self._store)
+        self._top = max(0, min(self._top, nResults - self._nVisible))
+        nRows = min(self._nVisible, nResults - self._top)
+        # Reusing the existing rows and adding or removing the rest...
+        children = self._treevw.get_children()
+        if len(children) > nRows:
+            self._treevw.delete(*children[nRows:])
+        for idx in range(nRows):
+            values = self._store.row(self._top + idx)
+            if idx < len(children):
+                self._treevw.item(children[idx], values=values)
+            else:
+                self._treevw.insert(
+                    parent="",
+                    index="end",
+                    iid=str(idx),
+                    values=values)
+        # Restoring the selection...
+        if (self._selected is not None
+                and 0 <= self._selected - self._top < nRows):
+            iid = str(self._selected - self._top)
+            if self._treevw.selection() != (iid,):
+                self._treevw.selection_set(iid)
+            self._treevw.focus(iid)
+        elif self._treevw.selection():
+            self._treevw.selection_set(())
+        # Updating the scrollbar...
+        if nResults:
+            self._vsb.set(
+                self._top / nResults,
+                (self._top + nRows) / nResults)
+        else:
+            self._vsb.set(0.0, 1.0)
+
+    def _scrollTo(self, top: int) -> None:
+        top = max(0, min(top, len(self._store) - self._nVisible))
+        if top != self._top:
+            self._top = top
+            self._render()
+
+    def _onScroll(self, *args) -> None:
+        """Handles the commands of the vertical scrollbar."""
+        match args:
+            case ("moveto", fraction):
+                self._scrollTo(int(float(fraction) * len(self._store)))
+            case ("scroll", number, "units"):
+                self._scrollTo(self._top + int(number))
+            case ("scroll", number, "pages"):
+                self._scrollTo(self._top + int(number) * self._nVisible)
+
+    def _onMouseWheel(self, event: tk.Event) -> str:
+        if event.num == 4:
+            delta = -3
+        elif event.num == 5:
+            delta = 3
+        elif platform.system() == "Darwin":
+            delta = -event.delta
+        else:
+            delta = -3 * (event.delta // 120)
+        self._scrollTo(self._top + delta)
+        return "break"
+
+    def _onKey(self, delta: int | str) -> str:
+        """Moves the selection by keyboard, scrolling as needed."""
+        nResults = len(self._store)
+        if not nResults:
+            return "break"
+        current = self._selected if self._selected is not None else self._top
+        match delta:
+            case "page-up":
+                selected = current - self._nVisible
+            case "page-down":
+                selected = current + self._nVisible
+            case "home":
+                selected = 0
+            case "end":
+                selected = nResults - 1
+            case _:
+                selected = current + int(delta)
+        self._selected = max(0, min(selected, nResults - 1))
+        if self._selected < self._top:
+            self._top = self._selected
+        elif self._selected >= self._top + self._nVisible:
+            self._top = self._selected - self._nVisible + 1
+        self._render()
+        self._notifySelected()
+        return "break"
+
+    def _onConfigure(self, event: tk.Event) -> None:
+        nVisible = self._getVisibleCount()
+        if nVisible != self._nVisible:
+            self._nVisible = nVisible
+            self._render()
+
+    def _onSelect(self, event: tk.Event) -> None:
+        selection = self._treevw.selection()
+        if selection:
+            selected = self._top + int(selection[0])
+            if selected != self._selected:
+                self._selected = selected
+                self._notifySelected()
+
+    def _notifySelected(self) -> None:
+        if self._onItemSelected and self._selected is not None:
+            self._onItemSelected(
+                self._store.path(self._selected),
+                self._store.offset(self._selected))
+
+    def _onHeadingClicked(self, col: int) -> None:
+        """Sorts by the column, toggling the direction on re-clicks."""
+        sortCol, reverse = self._store.getSort()
+        self._store.sortBy(col, reverse=(sortCol == col and not reverse))
+        self._selected = None
+        self._updateHeadings()
+        self._render()
+
+    def _updateHeadings(self) -> None:
+        """Shows the sorting column and direction in the headings."""
+        sortCol, reverse = self._store.getSort()
+        for col, heading in enumerate(self._HEADINGS):
+            if col == sortCol:
+                heading = f"{heading} {'▼' if reverse else '▲'}"
+            self._treevw.heading(self._HEADINGS[col], text=heading)
 
     def setColumnsSize(
             self,
             item_width: int,
             path_width: int,
+            details_width: int,
             ) -> None:
         self._treevw.column("Item", width=item_width, stretch=tk.NO)
         self._treevw.column("Path", width=path_width, stretch=tk.NO)
-    
-    def getColumnsSize(self) -> tuple[int, int]:
+        self._treevw.column("Details", width=details_width, stretch=tk.NO)
+
+    def getColumnsSize(self) -> tuple[int, int, int]:
         """
-        Returns a 2-tuple of widths for the Item and Path columns
-        respectively. Raises `TypeError` if something goes wrong.
+        Returns a 3-tuple of widths for the Item, Path and Details
+        columns respectively. Raises `TypeError` if something goes wrong.
         """
         itemColWidth = self._treevw.column("Item")["width"] # type: ignore
         pathColWidth = self._treevw.column("Path")["width"] # type: ignore
-        return itemColWidth, pathColWidth
+        detailsColWidth = self._treevw.column("Details")["width"] # type: ignore
+        return itemColWidth, pathColWidth, detailsColWidth
 
     def _onDoubleClick(self, event: tk.Event) -> None:
         """Handles the double-click event on a Treeview item."""
         iid = self._treevw.identify_row(event.y)
         if iid and self._onItemDoubleClicked:
-            self._onItemDoubleClicked(self._mpIidPath[iid])
-
+            self._onItemDoubleClicked(self._store.path(self._top + int(iid)))
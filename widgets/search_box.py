@@ -7,19 +7,30 @@ from tkinter import ttk
 from tkinter.filedialog import askdirectory
 from typing import Callable
 
+from utils.matcher import MatchMode, joinPatterns, splitPatterns
+
 
 class SearchTerms:
     """Represents the search terms."""
 
     def __init__(
             self,
-            search: str,
+            search: str | list[str],
             folder: str,
             algorithm: str,
             match_case: bool,
             match_whole: bool,
             include_files: bool,
             include_dirs: bool,
+            mode: MatchMode = MatchMode.SUBSTRING,
+            export_only: bool = False,
+            extensions: str = "",
+            min_size: str = "",
+            max_size: str = "",
+            newer_than: str = "",
+            older_than: str = "",
+            resumable: bool = False,
+            ranked: bool = False,
             ) -> None:
         self.search = search
         self.folder = folder
@@ -28,27 +39,97 @@ class SearchTerms:
         self.matchWhole = match_whole
         self.includeFiles = include_files
         self.includeDirs = include_dirs
+        self.mode = mode
+        self.exportOnly = export_only
+        """
+        Whether to stream the results to an export file without listing
+        them, so their number is not bounded by memory.
+        """
+        self.extensions = extensions
+        """The extensions files must have, as typed; see `MetaFilter`."""
+        self.minSize = min_size
+        """The least size of files as typed, such as `100M`."""
+        self.maxSize = max_size
+        """The largest size of files as typed."""
+        self.newerThan = newer_than
+        """The age entries must be newer than as typed, such as `7d`."""
+        self.olderThan = older_than
+        """The age entries must be older than as typed."""
+        self.resumable = resumable
+        """
+        Whether to checkpoint the progress of the search and to resume
+        an interrupted search of the same terms.
+        """
+        self.ranked = ranked
+        """
+        Whether to keep only the best matches, ranked by how well they
+        match, how deep and how recent they are.
+        """
+
+    def getText(self) -> str:
+        """Returns the search text, the patterns of `ANY_OF` joined."""
+        if isinstance(self.search, list):
+            return joinPatterns(self.search)
+        return self.search
+
+    def getPatterns(self) -> tuple[str, ...]:
+        """Returns the patterns of an `ANY_OF` search, or the text alone."""
+        if isinstance(self.search, list):
+            return tuple(self.search)
+        return (self.search,)
+
+    def getFilterTexts(self) -> tuple[str, str, str, str, str]:
+        """Returns the metadata filters as typed, in `MetaFilter` order."""
+        return (
+            self.extensions,
+            self.minSize,
+            self.maxSize,
+            self.newerThan,
+            self.olderThan)
 
 
 class SearchBox(ttk.Frame):
+    _INTVL_DEBOUNCE = 150
+    """
+    The quiet time after the last edit of the search text before a live
+    search starts, in milliseconds.
+    """
+
     def __init__(
             self,
             parent,
             algorithms: list[str],
             on_search: Callable[[SearchTerms], None],
             on_stop: Callable[[], None],
+            on_export: Callable[[], None] | None = None,
             ) -> None:
         super().__init__(parent)
         self._onSearch = on_search
         self._onStop = on_stop
+        self._onExport = on_export
         # Declaring variables...
         self._bvar_matchCase = tk.BooleanVar(value=False)
         self._bvar_matchWhole = tk.BooleanVar(value=False)
         self._bvar_includeFiles = tk.BooleanVar(value=True)
         self._bvar_includeFolders = tk.BooleanVar(value=True)
+        self._bvar_live = tk.BooleanVar(value=False)
+        """Whether to search as the search text is typed."""
+        self._bvar_exportOnly = tk.BooleanVar(value=False)
+        """Whether to export the results instead of listing them."""
+        self._bvar_resumable = tk.BooleanVar(value=False)
+        """Whether to checkpoint the search for resuming it later."""
+        self._bvar_ranked = tk.BooleanVar(value=False)
+        """Whether to list the best matches only, ranked."""
         self._svar_search = tk.StringVar(value="")
         self._svar_folder = tk.StringVar(value="")
         self._svar_algorithm = tk.StringVar(value="BFS")
+        self._svar_mode = tk.StringVar(value=MatchMode.SUBSTRING.value)
+        self._svar_extensions = tk.StringVar(value="")
+        self._svar_minSize = tk.StringVar(value="")
+        self._svar_maxSize = tk.StringVar(value="")
+        self._svar_newerThan = tk.StringVar(value="")
+        self._svar_olderThan = tk.StringVar(value="")
+        self._afterId_debounce: str | None = None
         # Creating GUI...
         self._initGui()
         self._cmbx_algorithm.config(values=algorithms)
@@ -56,12 +137,22 @@ class SearchBox(ttk.Frame):
         # Setting event handlers...
         self._btn_browseDir.config(command=self._selectFolder)
         self._btn_searchStop.config(command=self._onSearchStopClicked)
+        self._btn_export.config(command=self._onExportClicked)
+        self._chbx_live.config(command=self._onLiveToggled)
+        self._svar_search.trace_add("write", self._onSearchEdited)
+        for svar in (
+                self._svar_extensions,
+                self._svar_minSize,
+                self._svar_maxSize,
+                self._svar_newerThan,
+                self._svar_olderThan):
+            svar.trace_add("write", self._onSearchEdited)
 
     def _initGui(self) -> None:
         # 
         self.columnconfigure(0, weight=1)
         self.columnconfigure(1, weight=0)
-        for i in range(11):
+        for i in range(18):
             self.rowconfigure(i, weight=0)
         # Search Label and Button
         self._lbl_search = ttk.Label(self, text="Search:")
@@ -174,10 +265,66 @@ class SearchBox(ttk.Frame):
             pady=(1, 7,),
             sticky=tk.W,
         )
+        # Match Mode Label
+        self._lbl_mode = ttk.Label(self, text="Match mode:")
+        self._lbl_mode.grid(
+            row=8,
+            column=0,
+            columnspan=2,
+            padx=4,
+            pady=(7, 1,),
+            sticky=tk.W)
+        # Match Mode Combobox
+        self._cmbx_mode = ttk.Combobox(
+            self,
+            state="readonly",
+            values=[mode.value for mode in MatchMode],
+            textvariable=self._svar_mode,)
+        self._cmbx_mode.grid(
+            row=9,
+            column=0,
+            columnspan=2,
+            padx=4,
+            pady=(1, 7,),
+            sticky=tk.NSEW,
+        )
+        # Filters Frame
+        self._frm_filters = ttk.LabelFrame(self, text="Filters")
+        self._frm_filters.columnconfigure(0, weight=0)
+        self._frm_filters.columnconfigure(1, weight=1)
+        self._frm_filters.grid(
+            row=10,
+            column=0,
+            columnspan=2,
+            padx=4,
+            pady=(7, 7,),
+            sticky=tk.NSEW,)
+        self._txbxs_filters: list[ttk.Entry] = []
+        """The entries of the metadata filters."""
+        for idx, (text, svar) in enumerate((
+                ("Extensions:", self._svar_extensions),
+                ("Min size:", self._svar_minSize),
+                ("Max size:", self._svar_maxSize),
+                ("Newer than:", self._svar_newerThan),
+                ("Older than:", self._svar_olderThan),)):
+            ttk.Label(self._frm_filters, text=text).grid(
+                row=idx,
+                column=0,
+                padx=4,
+                pady=(1, 1,),
+                sticky=tk.W,)
+            txbxFilter = ttk.Entry(self._frm_filters, textvariable=svar)
+            txbxFilter.grid(
+                row=idx,
+                column=1,
+                padx=4,
+                pady=(1, 1,),
+                sticky=tk.EW,)
+            self._txbxs_filters.append(txbxFilter)
         # Algorithm Label
         self._lbl_algorithm = ttk.Label(self, text="Algorithm:")
         self._lbl_algorithm.grid(
-            row=8,
+            row=11,
             column=0,
             columnspan=2,
             padx=4,
@@ -189,27 +336,105 @@ class SearchBox(ttk.Frame):
             state="readonly",
             textvariable=self._svar_algorithm,)
         self._cmbx_algorithm.grid(
-            row=9,
+            row=12,
             column=0,
             columnspan=2,
             padx=4,
             pady=(1, 7,),
             sticky=tk.NSEW,
         )
+        # Search As You Type Checkbox
+        self._chbx_live = ttk.Checkbutton(
+            self,
+            text="Search as you type",
+            variable=self._bvar_live,
+        )
+        self._chbx_live.grid(
+            row=13,
+            column=0,
+            columnspan=2,
+            padx=4,
+            pady=(1, 1,),
+            sticky=tk.W,
+        )
+        # Resumable Checkbox
+        self._chbx_resumable = ttk.Checkbutton(
+            self,
+            text="Resumable, with checkpoints",
+            variable=self._bvar_resumable,
+        )
+        self._chbx_resumable.grid(
+            row=14,
+            column=0,
+            columnspan=2,
+            padx=4,
+            pady=(1, 1,),
+            sticky=tk.W,
+        )
+        # Ranked Checkbox
+        self._chbx_ranked = ttk.Checkbutton(
+            self,
+            text="Ranked, best matches only",
+            variable=self._bvar_ranked,
+        )
+        self._chbx_ranked.grid(
+            row=15,
+            column=0,
+            columnspan=2,
+            padx=4,
+            pady=(1, 7,),
+            sticky=tk.W,
+        )
+        # Export Only Checkbox
+        self._chbx_exportOnly = ttk.Checkbutton(
+            self,
+            text="Export only, without listing",
+            variable=self._bvar_exportOnly,
+        )
+        self._chbx_exportOnly.grid(
+            row=16,
+            column=0,
+            columnspan=2,
+            padx=4,
+            pady=(7, 1,),
+            sticky=tk.W,
+        )
+        # Export Button
+        self._btn_export = ttk.Button(self, text="Export...")
+        self._btn_export.grid(
+            row=17,
+            column=0,
+            columnspan=2,
+            padx=4,
+            pady=(1, 7,),
+            sticky=tk.W,)
 
     def _getSearchTerms(self) -> SearchTerms:
         """
         Returns the user selected search terms in the GUI as a
         SearchTerms object.
         """
+        search: str | list[str] = self._svar_search.get()
+        mode = MatchMode(self._svar_mode.get())
+        if mode == MatchMode.ANY_OF:
+            search = splitPatterns(self._svar_search.get())
         return SearchTerms(
-            search=self._svar_search.get(),
+            search=search,
             folder=self._svar_folder.get(),
             algorithm=self._svar_algorithm.get(),
             match_case=self._bvar_matchCase.get(),
             match_whole=self._bvar_matchWhole.get(),
             include_files=self._bvar_includeFiles.get(),
             include_dirs=self._bvar_includeFolders.get(),
+            mode=mode,
+            export_only=self._bvar_exportOnly.get(),
+            extensions=self._svar_extensions.get(),
+            min_size=self._svar_minSize.get(),
+            max_size=self._svar_maxSize.get(),
+            newer_than=self._svar_newerThan.get(),
+            older_than=self._svar_olderThan.get(),
+            resumable=self._bvar_resumable.get(),
+            ranked=self._bvar_ranked.get(),
         )
 
     def _selectFolder(self, event=None):
@@ -228,6 +453,48 @@ class SearchBox(ttk.Frame):
             case "Stop":
                 self._onStop()
 
+    def _onExportClicked(self) -> None:
+        if self._onExport:
+            self._onExport()
+
+    def _onSearchEdited(self, *_) -> None:
+        """Debounces edits of the search text in live mode."""
+        if not self._bvar_live.get():
+            return
+        if self._afterId_debounce:
+            self.after_cancel(self._afterId_debounce)
+        self._afterId_debounce = self.after(
+            self._INTVL_DEBOUNCE,
+            self._onSearchDebounced)
+
+    def _onLiveToggled(self) -> None:
+        """
+        Turns exporting only and checkpoints off while searching live, as
+        every pause in typing restarts the search: each restart would ask
+        for an export file or leave a checkpoint never resumed.
+        """
+        live = self._bvar_live.get()
+        if live:
+            self._bvar_exportOnly.set(False)
+            self._bvar_resumable.set(False)
+        state = tk.DISABLED if live else tk.NORMAL
+        self._chbx_exportOnly.config(state=state)
+        self._chbx_resumable.config(state=state)
+
+    def _onSearchDebounced(self) -> None:
+        if self._btn_searchStop["text"] == "Stopping":
+            # Searching the latest text once the stop completes...
+            self._afterId_debounce = self.after(
+                self._INTVL_DEBOUNCE,
+                self._onSearchDebounced)
+            return
+        self._afterId_debounce = None
+        self._onSearch(self._getSearchTerms())
+
+    def isLive(self) -> bool:
+        """Determines whether searching as the text is typed is on."""
+        return self._bvar_live.get()
+
     def getFolder(self) -> str:
         return self._svar_folder.get()
 
@@ -246,26 +513,56 @@ class SearchBox(ttk.Frame):
         self._chbx_matchWhole.config(state=tk.NORMAL)
         self._chbx_includeFiles.config(state=tk.NORMAL)
         self._chbx_includeFolders.config(state=tk.NORMAL)
+        self._cmbx_mode.config(state="readonly")
         self._cmbx_algorithm.config(state="readonly")
+        self._chbx_live.config(state=tk.NORMAL)
+        # Not exporting only nor checkpointing searches restarted live...
+        self._chbx_exportOnly.config(
+            state=tk.DISABLED if self._bvar_live.get() else tk.NORMAL)
+        self._chbx_resumable.config(
+            state=tk.DISABLED if self._bvar_live.get() else tk.NORMAL)
+        self._chbx_ranked.config(state=tk.NORMAL)
+        for txbxFilter in self._txbxs_filters:
+            txbxFilter.config(state=tk.NORMAL)
 
     def updateGui_searching(self) -> None:
         """Updates the GUI to show the app is performing BFS search."""
         self._btn_searchStop.config(text="Stop", state=tk.NORMAL)
         self._btn_browseDir.configure(state=tk.DISABLED)
-        self._txbx_search.config(state=tk.DISABLED)
+        # Keeping the search text editable while searching live...
+        self._txbx_search.config(
+            state=tk.NORMAL if self._bvar_live.get() else tk.DISABLED)
         self._chbx_matchCase.config(state=tk.DISABLED)
         self._chbx_matchWhole.config(state=tk.DISABLED)
         self._chbx_includeFiles.config(state=tk.DISABLED)
         self._chbx_includeFolders.config(state=tk.DISABLED)
+        self._cmbx_mode.config(state=tk.DISABLED)
         self._cmbx_algorithm.config(state=tk.DISABLED)
+        self._chbx_live.config(state=tk.DISABLED)
+        self._chbx_exportOnly.config(state=tk.DISABLED)
+        self._chbx_resumable.config(state=tk.DISABLED)
+        self._chbx_ranked.config(state=tk.DISABLED)
+        for txbxFilter in self._txbxs_filters:
+            txbxFilter.config(
+                state=tk.NORMAL if self._bvar_live.get() else tk.DISABLED)
 
     def updateGui_stopping(self) -> None:
         """Updates the GUI to show the app is stopping BFS search."""
         self._btn_searchStop.config(text="Stopping", state=tk.DISABLED)
         self._btn_browseDir.configure(state=tk.DISABLED)
-        self._txbx_search.config(state=tk.DISABLED)
+        # Keeping the search text editable while searching live...
+        self._txbx_search.config(
+            state=tk.NORMAL if self._bvar_live.get() else tk.DISABLED)
         self._chbx_matchCase.config(state=tk.DISABLED)
         self._chbx_matchWhole.config(state=tk.DISABLED)
         self._chbx_includeFiles.config(state=tk.DISABLED)
         self._chbx_includeFolders.config(state=tk.DISABLED)
+        self._cmbx_mode.config(state=tk.DISABLED)
         self._cmbx_algorithm.config(state=tk.DISABLED)
+        self._chbx_live.config(state=tk.DISABLED)
+        self._chbx_exportOnly.config(state=tk.DISABLED)
+        self._chbx_resumable.config(state=tk.DISABLED)
+        self._chbx_ranked.config(state=tk.DISABLED)
+        for txbxFilter in self._txbxs_filters:
+            txbxFilter.config(
+                state=tk.NORMAL if self._bvar_live.get() else tk.DISABLED)
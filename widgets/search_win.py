@@ -3,19 +3,37 @@
 #
 
 import logging
+import re
 import tkinter as tk
 from tkinter import ttk
+from tkinter.filedialog import asksaveasfilename
 
+from collections.abc import Mapping
 from pathlib import Path
-from queue import Queue, Empty
+from queue import Empty
 import threading
 import platform
 import subprocess
+from time import monotonic
 
 from megacodist.fs import (
-    FsSearchOptions, FsSearchLocation, FsSearchMatch, IFsSearchable)
+    FsSearchOptions, FsSearchLocation, IFsSearchable)
 
+from utils.batching import BatchingQueue
+from utils.checkpoint import SearchCheckpoint
+from utils.export import EXPORT_FILE_TYPES, ResultSink, openSink
+from utils.listing_cache import LISTING_CACHE
+from utils.matcher import ContentMatcher, MatchMode, NameMatcher
+from utils.meta_filter import MetaFilter
+from utils.process_search import ProcessSearcher
+from utils.pruning import Pruner, PruneRules
+from utils.query_cache import (
+    CachingSearcher, QueryCache, isRefinable, isRefinement)
+from utils.ranking import RankedSearcher, TopK
+from utils.search_context import SearchContext, runSearch
+from utils.search_stats import InstrumentedSearcher, SearchStats, STATS_PATH
 from utils.settings import FsAppSettings
+from widgets.preview_pane import PreviewPane
 from widgets.results_view import ResultsView
 from widgets.search_box import SearchBox, SearchTerms
 
@@ -24,7 +42,7 @@ class SearchWin(tk.Tk):
     def __init__(
             self,
             settings: FsAppSettings,
-            searchers: dict[str, type[IFsSearchable]]):
+            searchers: Mapping[str, type[IFsSearchable]]):
         super().__init__()
         # Setting window properties...
         self.title("Megacodist FS Search")
@@ -41,12 +59,67 @@ class SearchWin(tk.Tk):
         """
         self._searcher: IFsSearchable | None = None
         """The FS searcher which is currently using."""
-        self._q: Queue[FsSearchLocation | FsSearchMatch]
-        """The BFS search object."""
+        self._q: BatchingQueue
+        """The queue batching the results of the current search."""
         self._searchThread: threading.Thread | None = None
+        self._queryCache = QueryCache(settings.query_cache_mb * 1024 * 1024)
+        """The results of recent searches, for repeated and narrowed ones."""
+        # Sharing directory listings between searches of other texts...
+        LISTING_CACHE.configure(
+            settings.listing_cache_mb * 1024 * 1024,
+            settings.listing_cache_ttl)
         self._INTVL_AFTER = 150
+        self._INTVL_POLL_MIN = 16
+        """The polling interval under load, in milliseconds."""
+        self._INTVL_POLL_MAX = 250
+        """The polling interval of an idle queue, in milliseconds."""
+        self._intvlPoll = self._INTVL_POLL_MIN
+        """The current polling interval, in milliseconds."""
+        self._POLL_BUDGET = 0.008
+        """The time a poll may spend draining the queue, in seconds."""
+        self._INTVL_STATUS = 0.25
+        """The least time between status label updates, in seconds."""
+        self._lastStatusUpdate = 0.0
+        self._location: FsSearchLocation | None = None
+        """The latest location not shown in the status label yet."""
+        self._lastSearch: tuple[SearchTerms, SearchContext] | None = None
+        """The terms and the context of the latest search started."""
+        self._namesOnly = True
+        """
+        Whether the results of the latest search can all be narrowed by
+        name; see `isRefinable`.
+        """
+        self._shown: set[str] = set()
+        """
+        The results kept in the view from a broader search, which the
+        current search skips as it finds them again.
+        """
+        self._sink: ResultSink | None = None
+        """The export file the results are streamed to, if any."""
+        self._exportOnly = False
+        """Whether the results go to the export file only, not the view."""
+        self._topK: TopK | None = None
+        """The best matches of the latest search if it is ranked."""
+        self._rankVersion = 0
+        """The version of `_topK` the view lists."""
+        self._lastRankUpdate = 0.0
+        self._CLOSE_TIMEOUT = 5.0
+        """
+        The time a resumable search is given to save its checkpoint when
+        the window closes, in seconds.
+        """
+        self._closeDeadline = 0.0
+        """The `monotonic` time the window closes at the latest."""
+        self._stoppingThread: threading.Thread | None = None
+        """
+        The thread of the search abandoned for a newer one, until it
+        stops. No other search is abandoned meanwhile.
+        """
+        self._pendingTerms: SearchTerms | None = None
+        """The latest terms searched while a search was stopping."""
         self._afterId_search: str | None = None
         self._afterId_stop: str | None = None
+        self._afterId_pending: str | None = None
         # Creating GUI...
         self._initGui()
         self.update()
@@ -67,20 +140,27 @@ class SearchWin(tk.Tk):
             self._pwin,
             list(self._searchers.keys()),
             self._startSearch,
-            self._stopSearch)
+            self._stopSearch,
+            self._exportResults)
         self._searchbx.pack(fill=tk.BOTH, expand=True)
         self._pwin.add(self._searchbx, weight=1)
         # Middle Pane (Results)
         self._frm_middle = ttk.Frame(self._pwin)
         self._pwin.add(self._frm_middle, weight=3)  # Allow resizing
-        # Right Pane (Empty for now)
+        # Right Pane (Preview)
         self._frm_right = ttk.Frame(self._pwin)
         self._pwin.add(self._frm_right, weight=3)  # Allow resizing
+        self._prvw = PreviewPane(self._frm_right)
+        self._prvw.pack(fill="both", expand=True)
         # Results View
-        self._resvw = ResultsView(self._frm_middle, self._revealInExplorer)
+        self._resvw = ResultsView(
+            self._frm_middle,
+            self._revealInExplorer,
+            self._prvw.showFile)
         self._resvw.setColumnsSize(
             self._settings.item_col_width,
-            self._settings.path_col_width)
+            self._settings.path_col_width,
+            self._settings.details_col_width)
         self._resvw.pack(fill="both", expand=True)
         # Status bar
         self._frm_statusBar = ttk.Frame(self)
@@ -108,7 +188,33 @@ class SearchWin(tk.Tk):
         colsWidths = self._resvw.getColumnsSize()
         self._settings.item_col_width = colsWidths[0]
         self._settings.path_col_width = colsWidths[1]
-        # Destroying the window...
+        self._settings.details_col_width = colsWidths[2]
+        # Stopping a resumable search, hiding the window while it saves
+        # its checkpoint...
+        if (self._searchThread is not None
+                and self._searchThread.is_alive()
+                and self._lastSearch is not None
+                and self._lastSearch[1].checkpoint):
+            self._searcher.stopSearch() # type: ignore
+            self._q.close()
+            self.withdraw()
+            self._closeDeadline = monotonic() + self._CLOSE_TIMEOUT
+            self.after(self._INTVL_AFTER, self._pollClosing)
+            return
+        self._closeSink()
+        self.destroy()
+
+    def _pollClosing(self) -> None:
+        """
+        Destroys the window once the stopped search has saved its
+        checkpoint, or once it has been given `_CLOSE_TIMEOUT` to.
+        """
+        if (self._searchThread is not None
+                and self._searchThread.is_alive()
+                and monotonic() < self._closeDeadline):
+            self.after(self._INTVL_AFTER, self._pollClosing)
+            return
+        self._closeSink()
         self.destroy()
     
     def _saveGeometry(self) -> None:
@@ -137,6 +243,7 @@ class SearchWin(tk.Tk):
 
     def _clearResultsVw(self) -> None:
         self._resvw.clear()
+        self._prvw.clear()
 
     def _termsToOptions(self, terms: SearchTerms) -> FsSearchOptions:
         """Converts the search terms to a search options object."""
@@ -152,6 +259,17 @@ class SearchWin(tk.Tk):
         return options
 
     def _startSearch(self, terms: SearchTerms) -> None:
+        # Deferring the search while an abandoned one is stopping, so
+        # that searches restarted live do not pile up...
+        if (self._stoppingThread is not None
+                and self._stoppingThread.is_alive()):
+            self._pendingTerms = terms
+            if not self._afterId_pending:
+                self._afterId_pending = self.after(
+                    self._INTVL_AFTER,
+                    self._startPending)
+            return
+        self._stoppingThread = None
         # Validating folder...
         folder = Path(terms.folder)
         if not (folder.exists() and folder.is_dir()):
@@ -159,31 +277,216 @@ class SearchWin(tk.Tk):
             return
         # Validating search text...
         if not terms.search:
+            if self._searchbx.isLive():
+                self._cancelSearch()
+                self._clearResultsVw()
+                self._lastSearch = None
+                self._searchbx.updateGui_ready()
             self._lbl_status.config(text="Search text is empty.")
             return
+        try:
+            filters = MetaFilter.fromText(*terms.getFilterTexts())
+        except ValueError as err:
+            self._lbl_status.config(text=f"Invalid filter: {err}")
+            return
+        options = self._termsToOptions(terms)
+        text = terms.getText()
+        patterns: tuple[str, ...] = ()
+        if terms.mode is MatchMode.ANY_OF:
+            patterns = terms.getPatterns()
+        try:
+            NameMatcher(text, options, terms.mode, patterns)
+            ContentMatcher(text, options, terms.mode, patterns)
+        except re.error as err:
+            self._lbl_status.config(text=f"Invalid regular expression: {err}")
+            return
+        # Loading the searcher, importing its module on first use...
+        try:
+            searcherCls = self._searchers[terms.algorithm]
+        except Exception as err:
+            logging.error(f"Cannot load '{terms.algorithm}' searcher: {err}")
+            self._lbl_status.config(text="Cannot load the searcher.")
+            return
+        pruneRules = PruneRules.fromSettings(self._settings)
+        # Checkpointing only searchers able to resume...
+        checkpoint = None
+        if terms.resumable and getattr(searcherCls, "resumable", False):
+            checkpoint = SearchCheckpoint(
+                (
+                    str(folder.resolve()),
+                    terms.algorithm,
+                    text,
+                    terms.mode.value,
+                    int(options),
+                    terms.getFilterTexts(),
+                    pruneRules,),
+                self._settings.checkpoint_interval)
+        context = SearchContext(
+            terms.mode,
+            patterns,
+            Pruner(pruneRules),
+            SearchStats(),
+            filters,
+            checkpoint)
+        # Choosing the export file of an export-only search...
+        sink = None
+        if terms.exportOnly:
+            sink = self._askSink()
+            if sink is None:
+                return
+        # Cancelling the search in flight, if any, and narrowing its
+        # results in place when the new search refines it...
+        refining = self._isRefining(terms)
+        self._cancelSearch()
+        self._lastSearch = terms, context
+        self._sink = sink
+        self._exportOnly = terms.exportOnly
+        if refining:
+            self._resvw.retain(
+                NameMatcher(text, options, terms.mode, patterns))
+            self._shown = set(self._resvw.getPathStrs())
+        else:
+            self._clearResultsVw()
+            self._shown = set()
+        self._namesOnly = True
         # Updating the GUI...
-        self._clearResultsVw()
         self._searchbx.updateGui_searching()
         self._lbl_status.config(text="Searching...")
         # Starting the search thread...
-        self._q = Queue[FsSearchLocation | FsSearchMatch]()
-        self._searcher = self._searchers[terms.algorithm]()
+        self._q = BatchingQueue()
+        self._intvlPoll = self._INTVL_POLL_MIN
+        self._location = None
+        # Running the searcher in a worker process if asked, so that it
+        # does not compete with the GUI for the GIL...
+        searcher: IFsSearchable
+        if self._settings.search_in_process:
+            searcher = ProcessSearcher(searcherCls)
+        else:
+            searcher = searcherCls()
+        # Not caching export-only searches, whose results may not fit
+        # in memory, nor ranked ones, which only ever show the best
+        # few, nor resumable ones, whose replayed results the cache
+        # cannot validate, nor those depending on what the mtimes of
+        # folders do not reflect: the contents, sizes and times of
+        # files...
+        if not (terms.exportOnly
+                or terms.ranked
+                or checkpoint is not None
+                or filters.needsStat()
+                or not getattr(searcherCls, "cacheable", True)):
+            searcher = CachingSearcher(
+                searcher,
+                terms.algorithm,
+                self._queryCache)
+        searcher = InstrumentedSearcher(
+            searcher,
+            STATS_PATH,
+            self._settings.profiler)
+        # Ranking outermost, so that every searcher below sees matches
+        # as usual and only the best ones reach the view...
+        self._topK = None
+        self._rankVersion = 0
+        if terms.ranked:
+            self._topK = TopK(self._settings.ranked_top_k)
+            searcher = RankedSearcher(searcher, self._topK)
+        self._searcher = searcher
         self._searchThread = threading.Thread(
             target=self._runSearch,
             args=(
+                self._searcher,
                 folder,
-                terms.search,
+                text,
                 self._q,
-                self._termsToOptions(terms),),
+                options,
+                context,),
             daemon=True,)
         self._searchThread.start()
         # Polling the results...
         self._afterId_search = self.after(
-            self._INTVL_AFTER,
+            self._intvlPoll,
             self._pollSearching)
     
+    def _isRefining(self, terms: SearchTerms) -> bool:
+        """
+        Determines whether, searching live, every match of the terms is
+        among the results of the latest search, so they can be narrowed
+        instead of cleared.
+        """
+        if not (self._searchbx.isLive()
+                and self._lastSearch is not None
+                and self._namesOnly):
+            return False
+        lastTerms = self._lastSearch[0]
+        return (
+            not (terms.exportOnly or lastTerms.exportOnly)
+            and not (terms.ranked or lastTerms.ranked)
+            and terms.mode in (MatchMode.SUBSTRING, MatchMode.FUZZY)
+            and terms.folder == lastTerms.folder
+            and terms.algorithm == lastTerms.algorithm
+            and getattr(self._searchers[terms.algorithm], "refinable", True)
+            and terms.mode == lastTerms.mode
+            and terms.getFilterTexts() == lastTerms.getFilterTexts()
+            and (terms.matchCase, terms.matchWhole, terms.includeFiles,
+                terms.includeDirs) == (lastTerms.matchCase,
+                lastTerms.matchWhole, lastTerms.includeFiles,
+                lastTerms.includeDirs)
+            and isRefinement(
+                terms.getPatterns(),
+                lastTerms.getPatterns(),
+                terms.mode,
+                terms.matchCase,
+                terms.matchWhole))
+
+    def _startPending(self) -> None:
+        """
+        Starts the search deferred by `_startSearch` once the abandoned
+        search has stopped.
+        """
+        self._afterId_pending = None
+        if (self._stoppingThread is not None
+                and self._stoppingThread.is_alive()):
+            self._afterId_pending = self.after(
+                self._INTVL_AFTER,
+                self._startPending)
+            return
+        terms = self._pendingTerms
+        self._pendingTerms = None
+        if terms is not None:
+            self._startSearch(terms)
+
+    def _cancelPending(self) -> None:
+        """Drops the search deferred by `_startSearch`, if any."""
+        if self._afterId_pending:
+            self.after_cancel(self._afterId_pending)
+        self._afterId_pending = None
+        self._pendingTerms = None
+
+    def _cancelSearch(self) -> None:
+        """
+        Abandons the search in flight, if any, without waiting for its
+        thread: it is asked to stop, its queue is closed so that it never
+        blocks, and whatever it still produces is discarded. Its thread
+        is kept in `_stoppingThread` until it stops.
+        """
+        if self._searcher is not None:
+            self._searcher.stopSearch()
+            self._q.close()
+        if self._searchThread is not None and self._searchThread.is_alive():
+            self._stoppingThread = self._searchThread
+        self._closeSink()
+        for afterId in (self._afterId_search, self._afterId_stop):
+            if afterId:
+                self.after_cancel(afterId)
+        self._afterId_search = None
+        self._afterId_stop = None
+        self._searchThread = None
+        self._searcher = None
+
     def _stopSearch(self) -> None:
+        self._cancelPending()
         self._searcher.stopSearch() # type: ignore
+        # Nobody drains the queue from now on, so unblocking the searcher...
+        self._q.close()
         self._searchbx.updateGui_stopping()
         self._lbl_status.config(text="Stopping...")
         if self._afterId_search:
@@ -195,46 +498,239 @@ class SearchWin(tk.Tk):
 
     def _runSearch(
             self,
+            searcher: IFsSearchable,
             root_dir: str,
             search: str,
-            q: Queue[FsSearchLocation | FsSearchMatch],
+            q: BatchingQueue,
             options: FsSearchOptions,
+            context: SearchContext,
             ) -> None:
+        # Using the searcher it was started with, as a live restart
+        # replaces `_searcher` before this thread may have run...
         try:
-            self._searcher.search(root_dir, search, q, options) # type: ignore
+            runSearch(
+                searcher,
+                root_dir,
+                search,
+                q, # type: ignore
+                options,
+                context)
         except RuntimeError as err:
             print(err)
+        finally:
+            q.flush()
 
     def _pollSearching(self):
-        # Reading search results...
+        # Checking if search finished before draining, so that nothing
+        # published in between is left behind...
+        finished = (
+            self._searchThread is None
+            or not self._searchThread.is_alive())
+        # Reading search results within the time budget...
+        deadline = monotonic() + self._POLL_BUDGET
+        drained = False
+        nBatches = 0
         try:
-            while True:
-                item = self._q.get_nowait()
-                if isinstance(item, FsSearchLocation):
-                    self._lbl_status.config(text=f"Searching in: {item.path}")
-                    print(f'<{len(item.path.parents)}> {item.path}')
-                elif isinstance(item, FsSearchMatch):
-                    self._resvw.add(item.path)
+            while monotonic() < deadline:
+                batch = self._q.get_nowait()
+                nBatches += 1
+                matches = batch.matches
+                if self._shown:
+                    matches = [
+                        match for match in matches
+                        if str(match.path) not in self._shown]
+                if self._sink:
+                    self._exportMatches(matches)
+                if not self._exportOnly:
+                    for match in matches:
+                        offset = getattr(match, "offset", -1)
+                        if self._namesOnly and not isRefinable(match):
+                            self._namesOnly = False
+                        self._resvw.add(
+                            match.path,
+                            getattr(match, "details", ""),
+                            offset)
+                self._location = batch.location or self._location
         except Empty:
-            pass
+            drained = True
+        self._updateRanking(finished and drained)
+        # Throttling status updates...
+        now = monotonic()
+        if (self._location
+                and now - self._lastStatusUpdate >= self._INTVL_STATUS):
+            self._lastStatusUpdate = now
+            location = self._location
+            self._location = None
+            status = f"Searching in: {location.path}"
+            stats = self._lastSearch and self._lastSearch[1].stats
+            if stats:
+                status = f"{status} | {stats.summary()}"
+            self._lbl_status.config(text=status)
+            print(f'<{len(location.path.parents)}> {location.path}')
         # Checking if search finished...
-        if self._searchThread is None or not self._searchThread.is_alive():
+        if finished and drained:
+            self._exportRanking()
             self._searchbx.updateGui_ready()
-            self._lbl_status.config(text="Ready")
+            text = self._getReadyText()
+            if note := self._closeSink():
+                text = f"{text} | {note}"
+            self._lbl_status.config(text=text)
             self._afterId_search = None
             self._searchThread = None
             self._searcher = None
             return
+        # Adapting the interval: poll again soon while the queue is
+        # busy and back off exponentially while it is idle...
+        if not drained:
+            self._intvlPoll = self._INTVL_POLL_MIN
+        elif nBatches:
+            self._intvlPoll = max(
+                self._INTVL_POLL_MIN,
+                self._intvlPoll // 2)
+        else:
+            self._intvlPoll = min(
+                self._INTVL_POLL_MAX,
+                self._intvlPoll * 2)
         # Scheduling next poll...
         self._afterId_search = self.after(
-            self._INTVL_AFTER,
+            self._intvlPoll,
             self._pollSearching,)
     
+    def _updateRanking(self, final: bool) -> None:
+        """
+        Lists the best matches of a ranked search anew if they changed,
+        at most every `_INTVL_STATUS` seconds unless it is the final
+        ranking. Matches without details show their score instead.
+        """
+        topK = self._topK
+        if topK is None or topK.version == self._rankVersion:
+            return
+        now = monotonic()
+        if not final and now - self._lastRankUpdate < self._INTVL_STATUS:
+            return
+        self._lastRankUpdate = now
+        self._rankVersion = topK.version
+        if self._exportOnly:
+            return
+        self._resvw.replace(
+            (
+                match.path,
+                getattr(match, "details", "") or f"Score {score:.1f}",
+                getattr(match, "offset", -1))
+            for score, match in topK.snapshot())
+
+    def _exportRanking(self) -> None:
+        """
+        Writes the best matches of an export-only ranked search, which
+        are only known once it ends, to the export file.
+        """
+        if self._topK is not None and self._sink and self._exportOnly:
+            self._exportMatches(
+                [match for _, match in self._topK.snapshot()])
+
+    def _getReadyText(self) -> str:
+        """
+        Returns the status text of a finished search, telling what its
+        pruning rules left out and what it counted.
+        """
+        if self._lastSearch is None:
+            return "Ready"
+        context = self._lastSearch[1]
+        text = "Ready"
+        if summary := context.pruner.summary():
+            text = f"{text} ({summary})"
+        if context.checkpoint and (summary := context.checkpoint.summary()):
+            text = f"{text} ({summary})"
+        for note in context.notes:
+            text = f"{text} ({note})"
+        return f"{text} | {context.stats.summary()}"
+
+    def _exportResults(self) -> None:
+        """
+        Exports the listed results to a file the user chooses. While a
+        search is running, its later results follow them into the file
+        until it ends.
+        """
+        sink = self._askSink()
+        if sink is None:
+            return
+        self._closeSink()
+        self._sink = sink
+        try:
+            sink.writeRows(self._resvw.store.iterRows())
+        except OSError as err:
+            self._abandonSink(err)
+            return
+        if self._afterId_search:
+            self._lbl_status.config(text=f"Exporting to: {sink.path}")
+        else:
+            self._lbl_status.config(text=self._closeSink())
+
+    def _askSink(self) -> ResultSink | None:
+        """
+        Asks the user for an export file and opens its sink. Returns
+        `None` if the user cancels or the file cannot be created.
+        """
+        pthFile = asksaveasfilename(
+            title="Export results",
+            filetypes=EXPORT_FILE_TYPES,
+            defaultextension=".csv")
+        if not pthFile:
+            return None
+        try:
+            return openSink(Path(pthFile))
+        except (ValueError, OSError) as err:
+            self._lbl_status.config(text=f"Cannot export: {err}")
+            return None
+
+    def _exportMatches(self, matches: list) -> None:
+        """Streams the matches to the export file."""
+        try:
+            self._sink.writeMatches(matches) # type: ignore
+        except OSError as err:
+            self._abandonSink(err)
+
+    def _abandonSink(self, err: OSError) -> None:
+        """Stops exporting after a write error, listing results again."""
+        logging.error(f"Cannot export the results: {err}")
+        sink = self._sink
+        self._sink = None
+        self._exportOnly = False
+        try:
+            sink.close() # type: ignore
+        except OSError:
+            pass
+        self._lbl_status.config(text=f"Cannot export the results: {err}")
+
+    def _closeSink(self) -> str:
+        """
+        Closes the export file, if any, and returns a note telling how
+        many results went into it, or an empty string if there was none.
+        """
+        if self._sink is None:
+            return ""
+        sink = self._sink
+        self._sink = None
+        self._exportOnly = False
+        try:
+            sink.close()
+        except OSError as err:
+            logging.error(f"Cannot export the results: {err}")
+            return f"Cannot export the results: {err}"
+        return f"Exported {sink.nRows:,} results to {sink.path}"
+
     def _pollStopping(self) -> None:
         # Checking if search finished...
         if self._searchThread is None or not self._searchThread.is_alive():
+            self._updateRanking(True)
+            self._exportRanking()
             self._searchbx.updateGui_ready()
-            self._lbl_status.config(text="Ready")
+            text = "Ready"
+            if self._lastSearch and self._lastSearch[1].checkpoint:
+                text = f"{text} | Progress saved; search again to resume"
+            if note := self._closeSink():
+                text = f"{text} | {note}"
+            self._lbl_status.config(text=text)
             self._afterId_stop = None
             self._searchThread = None
             return